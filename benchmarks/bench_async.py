@@ -0,0 +1,80 @@
+"""
+set() and get() latency of AsyncKVStore with thousands of concurrent
+coroutines, with every write fsynced (sync_mode="always")
+
+    python benchmarks/bench_async.py -c 1000 -c 5000
+
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.async_store import AsyncKVStore
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def timed(coro, samples: list[float]) -> None:
+    start = time.perf_counter()
+    await coro
+    samples.append(time.perf_counter() - start)
+
+
+async def run(filename: str, concurrency: int, value_size: int) -> None:
+    ds = await AsyncKVStore.open(filename, sync_mode="always")
+    keys = [f"key-{i:08d}" for i in range(concurrency)]
+    value = "x" * value_size
+
+    for op in ("set", "get"):
+        samples: list[float] = []
+        groups, syncs = ds.group_count, ds.store.syncer.sync_count
+        start = time.perf_counter()
+        if op == "set":
+            coros = [timed(ds.set(key, value), samples) for key in keys]
+        else:
+            coros = [timed(ds.get(random.choice(keys)), samples) for _ in keys]
+        await asyncio.gather(*coros)
+        elapsed = time.perf_counter() - start
+
+        samples.sort()
+        print(
+            f"{concurrency:>8}{op:>6}"
+            f"{concurrency / elapsed:>12,.0f}"
+            f"{percentile(samples, 0.5) * 1e3:>10.2f}"
+            f"{percentile(samples, 0.99) * 1e3:>10.2f}"
+            f"{ds.group_count - groups:>8}"
+            f"{ds.store.syncer.sync_count - syncs:>8}"
+        )
+    await ds.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-c", type=int, action="append", help="concurrent coroutines, can be repeated"
+    )
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    print(
+        f"{'coros':>8}{'op':>6}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'groups':>8}{'fsyncs':>8}"
+    )
+    for concurrency in args.c or [1000, 5000]:
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(
+                run(os.path.join(tmp, "bench.db"), concurrency, args.value_size)
+            )
+
+
+if __name__ == "__main__":
+    main()
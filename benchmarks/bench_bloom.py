@@ -0,0 +1,72 @@
+"""
+false positive rate, memory per key and lookup latency of the bloom filters
+of immutable data files, built from a scan of the data file and loaded with
+mmap
+
+    python benchmarks/bench_bloom.py -n 1000000 --lookups 200000
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.bloom import bloom_path, file_keys, load_bloom, write_bloom
+from src.disk_store import KVStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=1_000_000, help="number of keys")
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument(
+        "--fp-rate", type=float, action="append", help="can be repeated"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "000000000.data")
+        ds = KVStore(data_path, sync_mode="none")
+        for first in range(0, args.n, 10_000):
+            last = min(first + 10_000, args.n)
+            ds.set_many({f"key-{i:09d}": i for i in range(first, last)})
+        ds.close()
+
+        start = time.perf_counter()
+        keys = file_keys(data_path)
+        scan = time.perf_counter() - start
+        print(f"{len(keys):,} keys, scanned in {scan:.2f}s")
+
+        misses = [f"missing-{i:09d}".encode() for i in range(args.lookups)]
+        hits = [f"key-{i:09d}".encode() for i in range(min(args.lookups, args.n))]
+        print(
+            f"{'fp rate':>8}{'measured':>10}{'bytes/key':>11}{'build':>9}"
+            f"{'miss':>9}{'hit':>9}  (lookups in microseconds)"
+        )
+        for fp_rate in args.fp_rate or [0.01, 0.001]:
+            start = time.perf_counter()
+            write_bloom(data_path, keys, os.path.getsize(data_path), fp_rate)
+            build = time.perf_counter() - start
+            bloom = load_bloom(data_path)
+
+            start = time.perf_counter()
+            false_positives = sum(1 for key in misses if key in bloom)
+            miss = (time.perf_counter() - start) / len(misses)
+            start = time.perf_counter()
+            assert all(key in bloom for key in hits)
+            hit = (time.perf_counter() - start) / len(hits)
+
+            size = os.path.getsize(bloom_path(data_path))
+            print(
+                f"{fp_rate:>8}{false_positives / len(misses):>10.4f}"
+                f"{size / len(keys):>11.2f}{build:>8.2f}s"
+                f"{miss * 1e6:>9.2f}{hit * 1e6:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
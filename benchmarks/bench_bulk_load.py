@@ -0,0 +1,59 @@
+"""
+bulk load throughput of set_many() compared with looping set()
+
+    python benchmarks/bench_bulk_load.py -n 20000 --batch 1000
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+
+
+def load_loop(ds: KVStore, items: list[tuple[str, str]], batch: int) -> None:
+    for key, value in items:
+        ds.set(key, value)
+
+
+def load_batch(ds: KVStore, items: list[tuple[str, str]], batch: int) -> None:
+    for i in range(0, len(items), batch):
+        ds.set_many(items[i : i + batch])
+
+
+def run(loader, items: list[tuple[str, str]], batch: int, mode: str) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        ds = KVStore(os.path.join(tmp, "bench.db"), sync_mode=mode)
+        start = time.perf_counter()
+        loader(ds, items, batch)
+        ds.sync()
+        elapsed = time.perf_counter() - start
+        ds.close()
+    return len(items) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20000, help="number of keys")
+    parser.add_argument("--batch", type=int, default=1000, help="keys per batch")
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    value = "x" * args.value_size
+    items = [(f"key-{i:08d}", value) for i in range(args.n)]
+
+    print(f"{args.n:,} keys, {args.value_size}B values, batches of {args.batch}")
+    print(f"{'sync mode':<12}{'set() ops/sec':>16}{'set_many() ops/sec':>22}")
+    for mode in ("always", "none"):
+        loop = run(load_loop, items, args.batch, mode)
+        batch = run(load_batch, items, args.batch, mode)
+        print(f"{mode:<12}{loop:>16,.0f}{batch:>22,.0f}")
+
+
+if __name__ == "__main__":
+    main()
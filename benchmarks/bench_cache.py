@@ -0,0 +1,74 @@
+"""
+get() throughput and cache hit ratio on a skewed (zipf-like) read workload,
+without a cache and with the lru and tinylfu value caches
+
+    python benchmarks/bench_cache.py -n 100000 --reads 200000 --cache-mb 1
+
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+
+
+def zipf_reads(keys: list[str], count: int, s: float) -> list[str]:
+    weights = list(
+        itertools.accumulate(1 / (rank**s) for rank in range(1, len(keys) + 1))
+    )
+    return random.choices(keys, cum_weights=weights, k=count)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="number of keys")
+    parser.add_argument("--reads", type=int, default=200_000)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--cache-mb", type=float, default=1)
+    parser.add_argument("--skew", type=float, default=1.0, help="zipf exponent")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "bench.db")
+        ds = KVStore(filename, sync_mode="none")
+        keys = [f"key-{i:08d}" for i in range(args.n)]
+        random.shuffle(keys)
+        value = "x" * args.value_size
+        for i in range(0, args.n, 10000):
+            ds.set_many((k, value) for k in keys[i : i + 10000])
+        ds.close()
+
+        reads = zipf_reads(keys, args.reads, args.skew)
+        cache_size = int(args.cache_mb * 1024 * 1024)
+        print(f"{args.n:,} keys, {args.reads:,} reads, {args.cache_mb} MiB cache")
+        print(f"{'cache':<10}{'reads/s':>12}{'hit ratio':>12}{'evictions':>12}")
+        for policy in (None, "lru", "tinylfu"):
+            ds = KVStore(
+                filename,
+                cache_size=cache_size if policy else 0,
+                cache_policy=policy or "lru",
+            )
+            start = time.perf_counter()
+            for key in reads:
+                ds.get(key)
+            elapsed = time.perf_counter() - start
+
+            stats = ds.cache.stats() if ds.cache else None
+            print(
+                f"{policy or 'none':<10}"
+                f"{args.reads / elapsed:>12,.0f}"
+                f"{stats.hit_ratio if stats else 0:>12.3f}"
+                f"{stats.evictions if stats else 0:>12,}"
+            )
+            ds.close()
+
+
+if __name__ == "__main__":
+    main()
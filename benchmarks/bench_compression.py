@@ -0,0 +1,87 @@
+"""
+data file size, write and read throughput of JSON values for every
+available compression codec
+
+    python benchmarks/bench_compression.py -n 20000
+
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.codec import available_codecs
+from src.disk_store import KVStore
+
+
+def make_value(i: int) -> str:
+    """
+    a JSON document of a few KiB, repetitive the way real records are
+    """
+    rand = random.Random(i)
+    return json.dumps(
+        {
+            "id": i,
+            "name": f"user-{i}",
+            "email": f"user-{i}@example.com",
+            "active": rand.random() < 0.5,
+            "events": [
+                {
+                    "type": rand.choice(["login", "logout", "purchase", "view"]),
+                    "timestamp": 1700000000 + rand.randrange(10**6),
+                    "amount": round(rand.random() * 100, 2),
+                }
+                for _ in range(30)
+            ],
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20_000, help="number of values")
+    parser.add_argument("--reads", type=int, default=20_000)
+    args = parser.parse_args()
+
+    values = [make_value(i) for i in range(args.n)]
+    raw_mb = sum(len(v) for v in values) / (1 << 20)
+    print(f"{args.n:,} JSON values, {raw_mb:,.1f} MiB")
+    print(f"{'codec':<8}{'file MiB':>10}{'ratio':>8}{'writes/s':>12}{'reads/s':>12}")
+
+    for codec in [None] + available_codecs():
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "bench.db")
+            ds = KVStore(filename, sync_mode="none", compression=codec)
+
+            start = time.perf_counter()
+            for i in range(0, args.n, 1000):
+                ds.set_many(
+                    (f"key-{j}", values[j]) for j in range(i, min(i + 1000, args.n))
+                )
+            write_time = time.perf_counter() - start
+
+            keys = [f"key-{random.randrange(args.n)}" for _ in range(args.reads)]
+            start = time.perf_counter()
+            for key in keys:
+                ds.get(key)
+            read_time = time.perf_counter() - start
+            ds.close()
+
+            size_mb = os.path.getsize(filename) / (1 << 20)
+            print(
+                f"{codec or 'none':<8}"
+                f"{size_mb:>10.1f}"
+                f"{raw_mb / size_mb:>8.1f}"
+                f"{args.n / write_time:>12,.0f}"
+                f"{args.reads / read_time:>12,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
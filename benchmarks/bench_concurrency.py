@@ -0,0 +1,87 @@
+"""
+read throughput of one store shared by a growing number of reader threads,
+with and without a concurrent writer
+
+    python benchmarks/bench_concurrency.py -n 100000 --reads 20000 -t 1 -t 2 -t 4 -t 8
+
+reads release the GIL while they wait on the positional read, throughput
+scales with threads as long as reads wait on the disk rather than on the
+interpreter
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+
+
+def run(ds: KVStore, keys: list[str], threads: int, reads: int, write: bool) -> float:
+    stop = threading.Event()
+
+    def reader():
+        rand = random.Random()
+        for _ in range(reads):
+            ds.get(rand.choice(keys))
+
+    def writer():
+        rand = random.Random()
+        while not stop.is_set():
+            ds.set(rand.choice(keys), "y" * 100)
+
+    workers = [threading.Thread(target=reader) for _ in range(threads)]
+    background = threading.Thread(target=writer) if write else None
+    if background:
+        background.start()
+
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    if background:
+        background.join()
+    return threads * reads / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="number of keys")
+    parser.add_argument("--reads", type=int, default=20_000, help="reads per thread")
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument(
+        "-t", type=int, action="append", help="number of threads, can be repeated"
+    )
+    parser.add_argument("--mmap", action="store_true", help="use memory mapped reads")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "bench.db")
+        ds = KVStore(filename, sync_mode="none", use_mmap=args.mmap)
+        keys = [f"key-{i:08d}" for i in range(args.n)]
+        value = "x" * args.value_size
+        for i in range(0, args.n, 10000):
+            ds.set_many((k, value) for k in keys[i : i + 10000])
+
+        print(f"{args.n:,} keys, {args.reads:,} random reads per thread")
+        print(f"{'threads':>8}{'reads/s':>14}{'with writer':>14}")
+        for threads in args.t or [1, 2, 4, 8]:
+            print(
+                f"{threads:>8}"
+                f"{run(ds, keys, threads, args.reads, False):>14,.0f}"
+                f"{run(ds, keys, threads, args.reads, True):>14,.0f}"
+            )
+        ds.close()
+
+
+if __name__ == "__main__":
+    main()
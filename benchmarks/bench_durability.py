@@ -0,0 +1,60 @@
+"""
+write throughput of KVStore for each durability mode
+
+    python benchmarks/bench_durability.py -n 2000 --threads 4
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+from src.durability import SYNC_MODES
+
+
+def run(mode: str, n: int, threads: int, value: str) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        ds = KVStore(os.path.join(tmp, "bench.db"), sync_mode=mode)
+        per_thread = n // threads
+
+        def writer(t: int) -> None:
+            for i in range(per_thread):
+                ds.set(f"key-{t}-{i}", value)
+
+        workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        ds.sync()
+        elapsed = time.perf_counter() - start
+
+        syncs = ds.syncer.sync_count
+        ds.close()
+        return (per_thread * threads) / elapsed, syncs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=2000, help="number of writes")
+    parser.add_argument("--threads", type=int, default=1, help="writer threads")
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    value = "x" * args.value_size
+    print(f"{args.n} writes, {args.threads} thread(s), {args.value_size}B values")
+    print(f"{'mode':<10}{'ops/sec':>12}{'fsyncs':>10}")
+    for mode in SYNC_MODES:
+        ops, syncs = run(mode, args.n, args.threads, value)
+        print(f"{mode:<10}{ops:>12,.0f}{syncs:>10}")
+
+
+if __name__ == "__main__":
+    main()
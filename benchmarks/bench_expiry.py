@@ -0,0 +1,95 @@
+"""
+reaping millions of short-TTL keys with the expiry index, compared with
+finding them by scanning the whole key_dir
+
+    python benchmarks/bench_expiry.py -n 2000000 --persistent 1000000
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=2_000_000, help="short-TTL keys")
+    parser.add_argument(
+        "--persistent", type=int, default=1_000_000, help="keys without a TTL"
+    )
+    parser.add_argument("--ttl", type=int, default=1, help="TTL in seconds")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ds = KVStore(os.path.join(tmp, "bench.db"), sync_mode="none")
+
+        start = time.perf_counter()
+        for first in range(0, args.persistent, 10_000):
+            last = min(first + 10_000, args.persistent)
+            ds.set_many({f"persistent-{i}": i for i in range(first, last)})
+        for first in range(0, args.n, 10_000):
+            last = min(first + 10_000, args.n)
+            ds.set_many(
+                {f"session-{i}": i for i in range(first, last)}, expiry=args.ttl
+            )
+        print(
+            f"loaded {args.n:,} short-TTL and {args.persistent:,} persistent keys "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+        # wait until every short-TTL key has expired
+        time.sleep(args.ttl + 1)
+
+        start = time.perf_counter()
+        now = int(time.time())
+        found = sum(
+            1
+            for _, expiry, deleted, _, _, _ in ds.key_dir.records()
+            if not deleted and 0 < expiry <= now
+        )
+        scan = time.perf_counter() - start
+        print(f"full key_dir scan finds {found:,} expired keys in {scan:.3f}s")
+
+        # what reap_expired() does, timing the lookup in the expiry index apart
+        start = time.perf_counter()
+        reaped, batches, longest, lookup = 0, 0, 0.0, 0.0
+        while True:
+            batch_start = time.perf_counter()
+            expired = ds.key_dir.expiring.pop_expired(int(time.time()), args.batch_size)
+            lookup += time.perf_counter() - batch_start
+            if not expired:
+                break
+            reaped += ds._expire_keys([key for key, _ in expired])
+            longest = max(longest, time.perf_counter() - batch_start)
+            batches += 1
+        elapsed = time.perf_counter() - start
+        print(
+            f"reaped {reaped:,} keys in {elapsed:.2f}s "
+            f"({reaped / elapsed:,.0f} keys/s), {batches} batches of at most "
+            f"{args.batch_size:,}, longest batch {longest * 1000:.1f}ms"
+        )
+        print(
+            f"finding them in the expiry index took {lookup:.3f}s, "
+            f"{lookup / max(batches, 1) * 1000:.2f}ms per batch"
+        )
+
+        size = ds.write_pos
+        start = time.perf_counter()
+        ds.compact()
+        print(
+            f"compaction shrank the data file from {size / (1 << 20):,.1f} MiB "
+            f"to {ds.write_pos / (1 << 20):,.1f} MiB "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        ds.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+fan-out reads with get_many() compared with looping get(), on a cold and a
+warm page cache
+
+    python benchmarks/bench_get_many.py -n 100000 --fanout 200
+
+the cold page cache runs evict the data files from the page cache with
+posix_fadvise before every request, they are skipped where it is missing
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+
+
+def drop_cache(ds: KVStore) -> None:
+    for file_id in ds._list_file_ids():
+        fd = os.open(ds._data_path(file_id), os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def run(ds: KVStore, requests: list[list[str]], batched: bool, cold: bool) -> float:
+    elapsed = 0.0
+    for keys in requests:
+        if cold:
+            drop_cache(ds)
+        start = time.perf_counter()
+        if batched:
+            ds.get_many(keys)
+        else:
+            for key in keys:
+                ds.get(key)
+        elapsed += time.perf_counter() - start
+    return elapsed / len(requests)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="number of keys")
+    parser.add_argument("--fanout", type=int, default=200, help="keys per request")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ds = KVStore(os.path.join(tmp, "bench.db"), sync_mode="none")
+        keys = [f"key-{i:08d}" for i in range(args.n)]
+        value = "x" * args.value_size
+        for i in range(0, args.n, 10000):
+            ds.set_many((k, value) for k in keys[i : i + 10000])
+        ds.sync()
+
+        requests = [random.sample(keys, args.fanout) for _ in range(args.requests)]
+
+        print(f"{args.n:,} keys, {args.fanout} keys per request")
+        print(f"{'page cache':<12}{'get() loop':>14}{'get_many()':>14}")
+        caches = [False]
+        if hasattr(os, "posix_fadvise"):
+            caches.append(True)
+        for cold in caches:
+            loop = run(ds, requests, batched=False, cold=cold)
+            batch = run(ds, requests, batched=True, cold=cold)
+            print(
+                f"{'cold' if cold else 'warm':<12}"
+                f"{loop * 1000:>12.2f}ms{batch * 1000:>12.2f}ms"
+            )
+        ds.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+memory per key of the key_dir: a dict of KVEntry objects with an attribute
+dict (how key_dir used to be stored), a dict of KVEntry objects with
+__slots__, and the array backed KeyDir
+
+    python benchmarks/bench_keydir_memory.py -n 1000000 -n 10000000
+
+the keys themselves are created before measuring, the numbers are the cost
+of the index on top of the keys
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.format import KVEntry
+from src.keydir import KeyDir
+
+
+class DictKVEntry:
+    """
+    KVEntry as it was before __slots__
+    """
+
+    def __init__(self, timestamp, pos, size, expiry=0, deleted=0, file_id=0):
+        self.timestamp = timestamp
+        self.pos = pos
+        self.size = size
+        self.expiry = expiry
+        self.deleted = deleted
+        self.file_id = file_id
+
+
+def fill_dict(keys: list[str], entry_cls) -> dict:
+    key_dir = {}
+    tstamp = int(time.time())
+    for i, key in enumerate(keys):
+        key_dir[key] = entry_cls(tstamp + i % 1000, i * 130, 130 + i % 7, 0, 0, i >> 20)
+    return key_dir
+
+
+def fill_keydir(keys: list[str], entry_cls=None) -> KeyDir:
+    key_dir = KeyDir()
+    tstamp = int(time.time())
+    for i, key in enumerate(keys):
+        key_dir.put(key, tstamp + i % 1000, i * 130, 130 + i % 7, 0, 0, i >> 20)
+    return key_dir
+
+
+def measure(fill, keys: list[str], entry_cls=None) -> float:
+    gc.collect()
+    tracemalloc.start()
+    key_dir = fill(keys, entry_cls)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del key_dir
+    gc.collect()
+    return current / len(keys)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n", type=int, action="append", help="number of keys, can be repeated"
+    )
+    args = parser.parse_args()
+
+    print(f"{'keys':>12}{'dict+__dict__':>16}{'dict+__slots__':>16}{'KeyDir':>10}")
+    for n in args.n or [1_000_000]:
+        keys = [f"key-{i:012d}" for i in range(n)]
+        row = [
+            measure(fill_dict, keys, DictKVEntry),
+            measure(fill_dict, keys, KVEntry),
+            measure(fill_keydir, keys),
+        ]
+        print(f"{n:>12,}{row[0]:>15.1f}B{row[1]:>15.1f}B{row[2]:>9.1f}B")
+        del keys
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+get() latency of keys that have no value: never set, deleted and expired,
+compared with hits and with a miss-heavy mix of 90% misses
+
+    python benchmarks/bench_misses.py -n 100000 --reads 50000
+
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(ds: KVStore, reads: list[str]) -> list[float]:
+    samples = []
+    for key in reads:
+        start = time.perf_counter()
+        ds.get(key)
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="keys of each kind")
+    parser.add_argument("--reads", type=int, default=50_000)
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ds = KVStore(os.path.join(tmp, "bench.db"), sync_mode="none")
+        value = "x" * args.value_size
+        kinds = {
+            kind: [f"{kind}-{i:08d}" for i in range(args.n)]
+            for kind in ("hit", "deleted", "expired")
+        }
+        kinds["missing"] = [f"missing-{i:08d}" for i in range(args.n)]
+        for i in range(0, args.n, 10000):
+            ds.set_many((k, value) for k in kinds["hit"][i : i + 10000])
+            ds.set_many((k, value) for k in kinds["deleted"][i : i + 10000])
+            ds.delete_many(kinds["deleted"][i : i + 10000])
+            ds.set_many(((k, value) for k in kinds["expired"][i : i + 10000]), expiry=1)
+        time.sleep(2)
+
+        # the first read of an expired key deletes it, every key is read once
+        reads = {
+            kind: random.sample(keys, min(args.reads, len(keys)))
+            for kind, keys in kinds.items()
+        }
+        mix = [
+            random.choice(kinds["hit"] if random.random() < 0.1 else kinds["missing"])
+            for _ in range(args.reads)
+        ]
+
+        print(f"{args.n:,} keys of each kind, {args.reads:,} reads")
+        print(f"{'keys':<10}{'p50':>10}{'p99':>10}{'mean':>10}  (microseconds)")
+        for kind, keys in list(reads.items()) + [("90% miss", mix)]:
+            samples = run(ds, keys)
+            mean = sum(samples) / len(samples)
+            print(
+                f"{kind:<10}"
+                f"{percentile(samples, 0.5) * 1e6:>10.1f}"
+                f"{percentile(samples, 0.99) * 1e6:>10.1f}"
+                f"{mean * 1e6:>10.1f}"
+            )
+        ds.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+random get() latency with memory mapped reads compared with buffered reads
+
+    python benchmarks/bench_random_read.py -n 100000 --reads 50000
+
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(filename: str, reads: list[str], use_mmap: bool) -> list[float]:
+    ds = KVStore(filename, use_mmap=use_mmap)
+    # warm up the page cache and the maps
+    for key in reads[:1000]:
+        ds.get(key)
+
+    samples = []
+    for key in reads:
+        start = time.perf_counter()
+        ds.get(key)
+        samples.append(time.perf_counter() - start)
+    ds.close()
+    return sorted(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100_000, help="number of keys")
+    parser.add_argument("--reads", type=int, default=50_000)
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "bench.db")
+        ds = KVStore(filename, sync_mode="none")
+        keys = [f"key-{i:08d}" for i in range(args.n)]
+        value = "x" * args.value_size
+        for i in range(0, args.n, 10000):
+            ds.set_many((k, value) for k in keys[i : i + 10000])
+        ds.close()
+
+        reads = [random.choice(keys) for _ in range(args.reads)]
+        print(f"{args.n:,} keys, {args.reads:,} random reads")
+        print(f"{'reader':<10}{'p50':>10}{'p99':>10}{'mean':>10}  (microseconds)")
+        for use_mmap in (False, True):
+            samples = run(filename, reads, use_mmap)
+            mean = sum(samples) / len(samples)
+            print(
+                f"{'mmap' if use_mmap else 'buffered':<10}"
+                f"{percentile(samples, 0.5) * 1e6:>10.1f}"
+                f"{percentile(samples, 0.99) * 1e6:>10.1f}"
+                f"{mean * 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+startup time of a data directory without hint files, loaded by 1, 2, 4 and
+8 worker processes
+
+    python benchmarks/bench_recovery.py -n 2000000 --files 16
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench_startup import build_log
+
+from src.disk_store import KVStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=2_000_000, help="number of keys")
+    parser.add_argument("--files", type=int, default=16, help="number of data files")
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument(
+        "-w", type=int, action="append", help="number of workers, can be repeated"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        per_file = args.n // args.files
+        for file_id in range(args.files):
+            build_log(
+                os.path.join(tmp, f"{file_id:09d}.data"),
+                per_file,
+                "x" * args.value_size,
+                first=file_id * per_file,
+            )
+        size_mb = sum(
+            os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp)
+        ) / (1 << 20)
+        print(
+            f"{per_file * args.files:,} keys in {args.files} files, {size_mb:,.1f} MiB"
+        )
+        print(f"{'workers':>8}{'startup':>12}")
+
+        for workers in args.w or [1, 2, 4, 8]:
+            start = time.perf_counter()
+            ds = KVStore(tmp + os.sep, sync_mode="none", recovery_workers=workers)
+            elapsed = time.perf_counter() - start
+            assert len(ds.key_dir) == per_file * args.files
+
+            # leave the directory as it was, without hint files
+            ds.syncer.close()
+            ds.file.close()
+            print(f"{workers:>8}{elapsed:>11.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+load generator for the RESP server: ops/s and latency of gets and sets from
+many connections, with and without pipelining, against a server on
+localhost running in a process of its own. every set is fsynced
+(sync_mode="always"), concurrent sets share group commits
+
+    python benchmarks/bench_server.py -c 1 -c 16 -p 1 -p 32 --ops 20000
+
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.client import KVClient
+
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def serve(filename: str, port: int) -> None:
+    from src.server import serve
+
+    asyncio.run(serve(filename, port=port, sync_mode="always"))
+
+
+def start_server(filename: str, port: int) -> multiprocessing.Process:
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(filename, port), daemon=True
+    )
+    process.start()
+    deadline = time.time() + 30
+    while True:
+        try:
+            with KVClient(port=port, timeout=1) as kvc:
+                kvc.ping()
+            return process
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def run(
+    kvc: KVClient, op: str, connections: int, depth: int, ops: int, args
+) -> tuple[float, list[float]]:
+    """
+    runs ops commands from connections threads, depth commands per round
+    trip. every command of a round trip is given its latency
+    """
+    value = "x" * args.value_size
+    samples: list[float] = []
+    per_thread = ops // connections // depth
+
+    def worker() -> None:
+        latencies = []
+        for _ in range(per_thread):
+            pipe = kvc.pipeline()
+            for _ in range(depth):
+                key = f"key-{random.randrange(args.keys):08d}"
+                if op == "set":
+                    pipe.set(key, value)
+                else:
+                    pipe.get(key)
+            start = time.perf_counter()
+            pipe.execute()
+            latencies.extend([time.perf_counter() - start] * depth)
+        samples.extend(latencies)
+
+    threads = [threading.Thread(target=worker) for _ in range(connections)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(samples) / elapsed, sorted(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-c", type=int, action="append", help="connections, can be repeated"
+    )
+    parser.add_argument(
+        "-p", type=int, action="append", help="pipeline depth, can be repeated"
+    )
+    parser.add_argument("--ops", type=int, default=20_000, help="commands per run")
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--port", type=int, default=6391)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = start_server(os.path.join(tmp, "bench.db"), args.port)
+        try:
+            print(
+                f"{'conns':>6}{'depth':>7}{'op':>5}{'ops/s':>12}"
+                f"{'p50 ms':>10}{'p99 ms':>10}{'p99.9 ms':>10}"
+            )
+            for connections in args.c or [1, 16]:
+                kvc = KVClient(port=args.port, max_connections=connections)
+                for depth in args.p or [1, 32]:
+                    for op in ("set", "get"):
+                        ops_per_sec, samples = run(
+                            kvc, op, connections, depth, args.ops, args
+                        )
+                        print(
+                            f"{connections:>6}{depth:>7}{op:>5}{ops_per_sec:>12,.0f}"
+                            f"{percentile(samples, 0.5) * 1e3:>10.2f}"
+                            f"{percentile(samples, 0.99) * 1e3:>10.2f}"
+                            f"{percentile(samples, 0.999) * 1e3:>10.2f}"
+                        )
+                kvc.close()
+        finally:
+            process.terminate()
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+write throughput and startup time of a ShardedKVStore against the number of
+shards, with shards in the calling process and in worker processes
+
+    python benchmarks/bench_sharded.py -n 200000 --batch 1000 -s 1 -s 2 -s 4 -s 8
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.sharded import ShardedKVStore
+
+
+def run(args, shards: int, processes: bool) -> tuple[float, float, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        ds = ShardedKVStore(tmp, shards=shards, processes=processes)
+        value = "x" * args.value_size
+
+        # batches fanned out to the shards
+        start = time.perf_counter()
+        for first in range(0, args.n, args.batch):
+            ds.set_many(
+                (f"key-{i:09d}", value)
+                for i in range(first, min(first + args.batch, args.n))
+            )
+        batched = args.n / (time.perf_counter() - start)
+
+        # single sets from several threads, every set is fsynced
+        def writer(t: int) -> None:
+            for i in range(args.sets // args.threads):
+                ds.set(f"single-{t}-{i}", value)
+
+        threads = [
+            threading.Thread(target=writer, args=(t,)) for t in range(args.threads)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        single = args.sets / (time.perf_counter() - start)
+        ds.close()
+
+        # restart without hint files, every shard scans its data files
+        for root, _, names in os.walk(tmp):
+            for name in names:
+                if name.endswith(".hint"):
+                    os.remove(os.path.join(root, name))
+        start = time.perf_counter()
+        ds = ShardedKVStore(tmp, processes=processes)
+        startup = time.perf_counter() - start
+        ds.close()
+        return batched, single, startup
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200_000, help="keys set in batches")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--sets", type=int, default=4000, help="single sets")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument(
+        "-s", type=int, action="append", help="number of shards, can be repeated"
+    )
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores, {args.n:,} keys in batches of {args.batch:,}")
+    print(
+        f"{'shards':>7}{'mode':>11}{'batched':>14}{'single':>14}{'startup':>10}"
+        "  (keys/s)"
+    )
+    for shards in args.s or [1, 2, 4, 8]:
+        for processes in (False, True):
+            batched, single, startup = run(args, shards, processes)
+            print(
+                f"{shards:>7}{'processes' if processes else 'threads':>11}"
+                f"{batched:>14,.0f}{single:>14,.0f}{startup:>9.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+KVStore startup time with and without a hint file
+
+    python benchmarks/bench_startup.py -n 1000000
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+from src.format import KVData, KVHeader
+from src.hint import remove_hint
+
+
+def build_log(filename: str, n: int, value: str, first: int = 0) -> None:
+    """
+    writes n records straight to a data file, much faster than calling set()
+    keys are numbered from first onwards
+    """
+    tstamp = int(time.time())
+    crc = zlib.crc32(value.encode("utf-8"))
+    with open(filename, "wb") as f:
+        buf = []
+        for i in range(first, first + n):
+            key = f"key-{i:08d}"
+            hdr = KVHeader(
+                checksum=crc,
+                timestamp=tstamp,
+                key_sz=len(key),
+                value_sz=len(value),
+            )
+            buf.append(KVData(header=hdr, key=key, value=value).encode_kv()[1])
+            if len(buf) == 10000:
+                f.write(b"".join(buf))
+                buf.clear()
+        f.write(b"".join(buf))
+
+
+def open_store(filename: str) -> tuple[float, KVStore]:
+    start = time.perf_counter()
+    ds = KVStore(filename, sync_mode="none")
+    return time.perf_counter() - start, ds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=1_000_000, help="number of keys")
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "bench.db")
+        build_log(filename, args.n, "x" * args.value_size)
+        size_mb = os.path.getsize(filename) / (1 << 20)
+        print(f"{args.n:,} keys, {size_mb:,.1f} MiB log")
+
+        scan_time, ds = open_store(filename)
+        assert len(ds.key_dir) == args.n
+        ds._write_hint(ds.file_id)
+        ds.syncer.close()
+        ds.file.close()
+
+        hint_time, ds = open_store(filename)
+        assert len(ds.key_dir) == args.n
+        ds.syncer.close()
+        ds.file.close()
+        remove_hint(filename)
+
+    print(f"{'full scan':<12}{scan_time:>10.3f}s")
+    print(f"{'hint file':<12}{hint_time:>10.3f}s")
+
+
+if __name__ == "__main__":
+    main()
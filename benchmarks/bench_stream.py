@@ -0,0 +1,83 @@
+"""
+peak memory and throughput of a large value written with set() and with
+set_stream(), and read back with get() and with open_value(). every phase
+runs in a process of its own, so that its peak RSS is its own
+
+    python benchmarks/bench_stream.py --size 1073741824
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+from src.stream import STREAM_CHUNK_SIZE
+
+
+def run_phase(phase: str, tmp: str, source: str, chunk_size: int) -> tuple:
+    # a store each, the value written by set() must not rotate the other
+    path = os.path.join(tmp, "set.db" if phase in ("set", "get") else "stream.db")
+    start = time.perf_counter()
+    if phase == "set":
+        ds = KVStore(path, sync_mode="none")
+        with open(source, "rb") as f:
+            ds.set("set", f.read())
+    elif phase == "set_stream":
+        ds = KVStore(path, sync_mode="none")
+        with open(source, "rb") as f:
+            ds.set_stream("stream", f, chunk_size=chunk_size)
+    elif phase == "get":
+        ds = KVStore(path)
+        assert len(ds.get("set")) == os.path.getsize(source)
+    else:
+        # copied to a file, verified chunk by chunk or with sendfile
+        ds = KVStore(path, verify="always" if phase == "open_value" else "never")
+        with open(os.devnull, "wb") as out:
+            ds.open_value("stream").copy_to(out, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+    ds.close()
+    # kilobytes on linux
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1024 * 1024 * 1024)
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source")
+        with open(source, "wb") as f:
+            for done in range(0, args.size, STREAM_CHUNK_SIZE):
+                f.write(os.urandom(min(STREAM_CHUNK_SIZE, args.size - done)))
+
+        print(f"{args.size / 2**20:,.0f} MiB value, {args.chunk_size:,} byte chunks")
+        print(f"{'phase':>20}{'MiB/s':>10}{'peak RSS MiB':>15}")
+        phases = {
+            "set": "set()",
+            "set_stream": "set_stream()",
+            "get": "get()",
+            "open_value": "copy_to() verified",
+            "sendfile": "copy_to() sendfile",
+        }
+        for phase, label in phases.items():
+            with ctx.Pool(1) as pool:
+                elapsed, rss = pool.apply(
+                    run_phase, (phase, tmp, source, args.chunk_size)
+                )
+            print(
+                f"{label:>20}{args.size / elapsed / 2**20:>10,.0f}{rss / 2**20:>15,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
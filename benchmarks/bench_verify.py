@@ -0,0 +1,64 @@
+"""
+get() latency of values of growing size with every verify mode, and the
+throughput of an unthrottled scrub
+
+    python benchmarks/bench_verify.py -s 1024 -s 65536 -s 1048576 --reads 2000
+
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+from src.verify import VERIFY_MODES
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-s", type=int, action="append", help="value size, can be repeated"
+    )
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--sample", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'size':>9}" + "".join(f"{mode:>10}" for mode in VERIFY_MODES))
+    print(" " * 9 + f"{'(mean get in microseconds)':>40}")
+    for size in args.s or [1024, 64 * 1024, 1024 * 1024]:
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "bench.db")
+            ds = KVStore(filename, sync_mode="none")
+            value = os.urandom(size)
+            ds.set_many((f"key-{i}", value) for i in range(args.keys))
+            ds.close()
+
+            keys = [f"key-{random.randrange(args.keys)}" for _ in range(args.reads)]
+            row = f"{size:>9}"
+            for mode in VERIFY_MODES:
+                ds = KVStore(filename, verify=mode, verify_sample=args.sample)
+                start = time.perf_counter()
+                for key in keys:
+                    ds.get(key)
+                row += f"{(time.perf_counter() - start) / len(keys) * 1e6:>10.1f}"
+                ds.close()
+            print(row)
+
+            ds = KVStore(filename, scrub_rate=None)
+            start = time.perf_counter()
+            ds.scrub()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{'':>9}scrub {ds.scrubber.bytes_verified / elapsed / 2**20:,.0f} MiB/s"
+            )
+            ds.close()
+
+
+if __name__ == "__main__":
+    main()
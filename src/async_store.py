@@ -0,0 +1,252 @@
+import asyncio
+import typing
+from collections import deque
+from collections.abc import Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+from src.custom_types import TOMBSTONE, KeyType, ValueType
+from src.disk_store import KVStore
+from src.errors import UnsupportedTypeError
+from src.utils import encode_to_str
+
+"""
+asyncio front-end for KVStore.
+
+every call that touches the disk runs on a dedicated thread pool, so the
+event loop never blocks on a read or an fsync. concurrent get() calls are
+coalesced the same way, into a get_many() of every key queued meanwhile.
+
+writes are group committed: they are queued in call order, a single
+flusher encodes everything queued on the thread pool, appends it with one
+write and waits for one fsync, while the next group piles up behind it. a
+group is written as a batch, a crash never keeps half of it, and no caller
+was told its write was done before the whole group was durable.
+"""
+
+# the arguments of KVStore.encode_record() for every key of one call
+Write = list[tuple[KeyType, ValueType, int, bool]]
+
+
+class AsyncKVStore:
+    """
+    AsyncKVStore wraps a KVStore with awaitable methods, see
+    AsyncKVStore.open() to open a store without blocking the loop
+
+    args:
+        store             : the KVStore to wrap, closed by close()
+        max_workers       : threads of the executor running the disk I/O
+        max_group_records : records above which a write group is cut, the
+                            writes of one call are never split
+    """
+
+    def __init__(
+        self,
+        store: KVStore,
+        max_workers: int = 4,
+        max_group_records: int = 1024,
+    ):
+        self.store = store
+        self.max_group_records = max_group_records
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="pyk-io",
+        )
+
+        # queued writes: the keys of one call and the future to resolve
+        self._pending: deque[tuple[Write, asyncio.Future]] = deque()
+        self._flusher: typing.Optional[asyncio.Task] = None
+
+        # queued gets: the key and the future to resolve
+        self._reads: deque[tuple[KeyType, asyncio.Future]] = deque()
+        self._reader: typing.Optional[asyncio.Task] = None
+
+        # number of write groups flushed, useful to see group commit at work
+        self.group_count: int = 0
+
+    @classmethod
+    async def open(
+        cls,
+        filename: str = "file.db",
+        max_workers: int = 4,
+        max_group_records: int = 1024,
+        **kwargs,
+    ) -> "AsyncKVStore":
+        """
+        opens a KVStore on the executor, loading the key_dir of a large
+        store does not block the loop. kwargs are passed to KVStore
+        """
+        store = await asyncio.to_thread(KVStore, filename, **kwargs)
+        return cls(store, max_workers, max_group_records)
+
+    async def get(self, key: KeyType) -> str:
+        # an invalid key fails its own call rather than the whole group
+        try:
+            encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in get()") from e
+
+        fut = asyncio.get_running_loop().create_future()
+        self._reads.append((key, fut))
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read())
+        return await fut
+
+    async def get_many(self, keys: Iterable[KeyType]) -> dict[KeyType, str]:
+        return await self._run(self.store.get_many, list(keys))
+
+    async def set(self, key: KeyType, value: ValueType, expiry: int = 0) -> None:
+        await self._append([(key, value, expiry, False)])
+
+    async def delete(self, key: KeyType) -> None:
+        await self._append([(key, TOMBSTONE, 0, True)])
+
+    async def set_many(
+        self,
+        items: typing.Union[
+            Mapping[KeyType, ValueType], Iterable[tuple[KeyType, ValueType]]
+        ],
+        expiry: int = 0,
+    ) -> None:
+        """
+        stores many keys as a unit, recovered as a whole or not at all
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+        await self._append([(k, v, expiry, False) for k, v in items])
+
+    async def delete_many(self, keys: Iterable[KeyType]) -> None:
+        await self._append([(k, TOMBSTONE, 0, True) for k in keys])
+
+    async def exists(self, key: KeyType) -> bool:
+        return self.store.exists(key)
+
+    async def ttl(self, key: KeyType) -> int:
+        return self.store.ttl(key)
+
+    async def expire(self, key: KeyType, seconds: int) -> bool:
+        return await self._run(self.store.expire, key, seconds)
+
+    async def persist(self, key: KeyType) -> bool:
+        return await self._run(self.store.persist, key)
+
+    async def sync(self) -> None:
+        await self._run(self.store.sync)
+
+    async def close(self) -> None:
+        """
+        waits for the queued writes, closes the store and the executor
+        """
+        while self._flusher is not None or self._reader is not None:
+            await asyncio.shield(self._flusher or self._reader)
+        await self._run(self.store.close)
+        self._executor.shutdown()
+
+    async def __aenter__(self) -> "AsyncKVStore":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _append(self, write: Write) -> None:
+        """
+        queues a write and waits until the flusher persisted it according to
+        the store's sync mode. it is queued before the first await, writes
+        are applied in the order they were called
+        """
+        if not write:
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((write, fut))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush())
+        await fut
+
+    async def _flush(self) -> None:
+        """
+        writes the queued writes in groups until the queue is empty
+        """
+        try:
+            while self._pending:
+                group, count = [], 0
+                while self._pending and (
+                    not group
+                    or count + len(self._pending[0][0]) <= self.max_group_records
+                ):
+                    write, fut = self._pending.popleft()
+                    group.append((write, fut))
+                    count += len(write)
+
+                try:
+                    errors = await self._run(
+                        self._write_group, [write for write, _ in group]
+                    )
+                except asyncio.CancelledError:
+                    for _, fut in group:
+                        fut.cancel()
+                    raise
+                except Exception as e:
+                    for _, fut in group:
+                        if not fut.done():
+                            fut.set_exception(e)
+                else:
+                    for (_, fut), error in zip(group, errors):
+                        if fut.done():
+                            continue
+                        if error is None:
+                            fut.set_result(None)
+                        else:
+                            fut.set_exception(error)
+                self.group_count += 1
+        finally:
+            self._flusher = None
+
+    def _write_group(self, writes: list[Write]) -> list[typing.Optional[Exception]]:
+        """
+        encodes and writes a group, on the thread pool. a write that fails to
+        encode, an invalid key or value, fails its own call rather than the
+        whole group. returns the error of every write, None if it was written
+        """
+        records, errors = [], []
+        for write in writes:
+            try:
+                records.extend([self.store.encode_record(*args) for args in write])
+            except Exception as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+        self.store.write_records(records)
+        return errors
+
+    async def _read(self) -> None:
+        """
+        reads the queued keys with get_many() until the queue is empty
+        """
+        try:
+            while self._reads:
+                group = [
+                    self._reads.popleft()
+                    for _ in range(min(len(self._reads), self.max_group_records))
+                ]
+                try:
+                    values = await self._run(
+                        self.store.get_many, [key for key, _ in group]
+                    )
+                except asyncio.CancelledError:
+                    for _, fut in group:
+                        fut.cancel()
+                    raise
+                except Exception as e:
+                    for _, fut in group:
+                        if not fut.done():
+                            fut.set_exception(e)
+                else:
+                    for key, fut in group:
+                        if not fut.done():
+                            fut.set_result(values[key])
+        finally:
+            self._reader = None
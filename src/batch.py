@@ -0,0 +1,49 @@
+from src.custom_types import TOMBSTONE, KeyType, ValueType
+
+
+class WriteBatch:
+    """
+    WriteBatch collects writes and applies them to a KVStore as a unit: all
+    records are appended with a single write and a single durability barrier,
+    and recovery either loads all of them or none. used as a context manager
+    the batch is committed when the block exits without an exception.
+
+        with kvs.batch() as batch:
+            batch.set("foo", "bar")
+            batch.delete("baz")
+
+    args:
+        store : the KVStore to write to
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.records = []
+
+    def set(self, key: KeyType, value: ValueType, expiry: int = 0) -> None:
+        self.records.append(self.store.encode_record(key, value, expiry))
+
+    def delete(self, key: KeyType) -> None:
+        self.records.append(self.store.encode_record(key, TOMBSTONE, mark_delete=True))
+
+    def commit(self) -> None:
+        """
+        writes the collected records to the store and empties the batch
+        """
+        records, self.records = self.records, []
+        self.store.write_records(records)
+
+    def clear(self) -> None:
+        self.records = []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __enter__(self) -> "WriteBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.clear()
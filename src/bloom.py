@@ -0,0 +1,269 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import typing
+import zlib
+from os import fsync, path
+
+from src.scanner import scan_records
+
+"""
+ref: https://en.wikipedia.org/wiki/Bloom_filter
+
+A bloom filter file sits next to an immutable data file and holds a bloom
+filter of every key with a record in it, live or dead. It answers "may this
+data file hold a record of key" with no false negatives, in about 1.2 bytes
+per key for a 1% false positive rate.
+
+    | magic | version | hashes | bits | keys | data_sz | crc |  HEADER
+    | ................ bit array, bits / 8 bytes ...........|  BITS
+
+`data_sz` is the size of the data file the filter was built from, a filter
+is only used while the data file has that size. `crc` is the CRC32 checksum
+of the bit array. filters are loaded with mmap, the bit array stays in the
+page cache rather than on the python heap.
+
+the bit positions of a key are derived from a single 64 bit blake2b hash of
+it by double hashing, h1 + i * h2 for i in range(hashes).
+"""
+
+BLOOM_MAGIC: typing.Final[bytes] = b"PYKB"
+BLOOM_VERSION: typing.Final[int] = 1
+
+BLOOM_HEADER_FORMAT: typing.Final[str] = "<4sHHQQQL"
+BLOOM_HEADER_SIZE: typing.Final[int] = struct.calcsize(BLOOM_HEADER_FORMAT)
+
+# false positive rate filters are sized for
+DEFAULT_FP_RATE: typing.Final[float] = 0.01
+
+
+def bloom_hash(key: bytes) -> tuple[int, int]:
+    """
+    returns the two hashes the bit positions of key are derived from
+    """
+    h = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return h & 0xFFFFFFFF, (h >> 32) | 1
+
+
+class BloomFilter:
+    """
+    BloomFilter is a set of keys that can answer "maybe" for keys never
+    added to it, but never "no" for a key that was.
+
+    args:
+        num_bits   : size of the bit array
+        num_hashes : bits set per key
+        bits       : the bit array, a bytearray or a read-only mmap of a
+                     filter file
+        num_keys   : keys added to the filter
+    """
+
+    def __init__(
+        self,
+        num_bits: int,
+        num_hashes: int,
+        bits: typing.Union[bytearray, memoryview],
+        num_keys: int = 0,
+    ):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits
+        self.num_keys = num_keys
+
+    @classmethod
+    def create(cls, capacity: int, fp_rate: float = DEFAULT_FP_RATE) -> "BloomFilter":
+        """
+        returns an empty filter sized for capacity keys at fp_rate false
+        positives
+        """
+        capacity = max(capacity, 1)
+        num_bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        num_bits = (num_bits + 7) // 8 * 8
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes, bytearray(num_bits // 8))
+
+    def add(self, key: bytes) -> None:
+        h1, h2 = bloom_hash(key)
+        bits, m = self.bits, self.num_bits
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % m
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.num_keys += 1
+
+    def contains_hash(self, hashes: tuple[int, int]) -> bool:
+        """
+        checks a key hashed with bloom_hash() already, to check one key
+        against many filters with a single hash
+        """
+        h1, h2 = hashes
+        bits, m = self.bits, self.num_bits
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % m
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __contains__(self, key: bytes) -> bool:
+        return self.contains_hash(bloom_hash(key))
+
+    @property
+    def nbytes(self) -> int:
+        return self.num_bits // 8
+
+
+def bloom_path(data_path: str) -> str:
+    return data_path + ".bloom"
+
+
+def write_bloom(
+    data_path: str,
+    keys: typing.Iterable[bytes],
+    data_sz: int,
+    fp_rate: float = DEFAULT_FP_RATE,
+) -> None:
+    """
+    writes the bloom filter file of a data file. it is written to a
+    temporary file first and moved in place, so a crash never leaves a
+    partial filter
+
+    args:
+        data_path : path of the data file the filter describes
+        keys      : every distinct key with a record in the data file
+        data_sz   : size of the data file
+        fp_rate   : false positive rate to size the filter for
+    """
+    keys = keys if isinstance(keys, (set, frozenset, list)) else list(keys)
+    bloom = BloomFilter.create(len(keys), fp_rate)
+    for key in keys:
+        bloom.add(key)
+
+    hdr = struct.pack(
+        BLOOM_HEADER_FORMAT,
+        BLOOM_MAGIC,
+        BLOOM_VERSION,
+        bloom.num_hashes,
+        bloom.num_bits,
+        bloom.num_keys,
+        data_sz,
+        zlib.crc32(bloom.bits),
+    )
+
+    target = bloom_path(data_path)
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(hdr)
+        f.write(bloom.bits)
+        f.flush()
+        fsync(f.fileno())
+    os.replace(tmp, target)
+
+
+def load_bloom(data_path: str) -> typing.Optional[BloomFilter]:
+    """
+    maps the bloom filter file of a data file
+
+    returns the filter, or None if there is no filter file or it is not
+    valid for the data file
+    """
+    target = bloom_path(data_path)
+    if not path.exists(target) or not path.exists(data_path):
+        return None
+
+    with open(target, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can not be mapped
+            return None
+
+    if len(mapped) < BLOOM_HEADER_SIZE:
+        return None
+
+    magic, version, num_hashes, num_bits, num_keys, data_sz, crc = struct.unpack_from(
+        BLOOM_HEADER_FORMAT, mapped
+    )
+    if magic != BLOOM_MAGIC or version != BLOOM_VERSION:
+        return None
+
+    # a filter missing a key would hide its records, so it must match the
+    # data file exactly
+    bits = memoryview(mapped)[BLOOM_HEADER_SIZE:]
+    if (
+        len(bits) * 8 != num_bits
+        or zlib.crc32(bits) != crc
+        or path.getsize(data_path) != data_sz
+    ):
+        return None
+
+    return BloomFilter(num_bits, num_hashes, bits, num_keys)
+
+
+def remove_bloom(data_path: str) -> None:
+    """
+    removes the bloom filter file of a data file, called before the data
+    file is rewritten so that a stale filter is never used
+    """
+    try:
+        os.remove(bloom_path(data_path))
+    except FileNotFoundError:
+        pass
+
+
+def file_keys(data_path: str) -> set[bytes]:
+    """
+    returns every distinct key with a record in a data file, scanned from
+    start to end
+    """
+    return {bytes(key) for _, _, key, _ in scan_records(data_path)}
+
+
+class FilterBuilder:
+    """
+    FilterBuilder builds the bloom filters of the immutable data files of a
+    KVStore on a background thread, so that sealing a data file never waits
+    for a scan of it. see KVStore._build_filters()
+
+    args:
+        store : the KVStore to build filters for
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def trigger(self) -> None:
+        """
+        asks the background thread to build the missing filters
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="pyk-filters",
+                daemon=True,
+            )
+            self._thread.start()
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.store._build_filters(self._stop)
+            except Exception as e:
+                print(f"unexpected {e=}, {type(e)=} while building filters")
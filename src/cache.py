@@ -0,0 +1,422 @@
+import abc
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+"""
+an in-process cache of decoded values, in front of the data files. a hit
+skips the read, the decoding and the CRC check of the record.
+
+the cache is bounded by the bytes of the cached records and, optionally, by
+the number of cached entries. two eviction policies are available
+
+    lru     : evicts the least recently used value
+    tinylfu : W-TinyLFU, new values go through a small LRU window, and leave
+              it for the main segmented LRU only if they are requested more
+              often than the value they would evict. frequencies are
+              estimated with a count-min sketch that is halved periodically,
+              so a burst of one-off reads does not flush the hot values
+              ref: https://arxiv.org/abs/1512.00727
+
+KVStore invalidates the entry of a key on every write to it. values are
+cached together with their expiry time and an expired value is never served.
+"""
+
+CACHE_LRU = "lru"
+CACHE_TINYLFU = "tinylfu"
+
+CACHE_POLICIES = (CACHE_LRU, CACHE_TINYLFU)
+
+# a key that is not cached in get(), None is a value
+_NOT_CACHED = object()
+
+
+class CacheStats(typing.NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ValueCache(abc.ABC):
+    """
+    ValueCache maps keys to their decoded value and expiry time. it is safe
+    to use from several threads.
+
+    a reader that misses the cache reads the value from disk and then puts
+    it in the cache. a write may invalidate the key in between, the reader
+    takes a ticket() before looking the key up and put() drops the value if
+    an invalidation happened since.
+
+    subclasses implement the eviction policy, see the hooks below.
+
+    args:
+        max_bytes   : bytes of cached records the cache may hold
+        max_entries : number of values the cache may hold, None for no limit
+    """
+
+    def __init__(self, max_bytes: int, max_entries: typing.Optional[int] = None):
+        if max_bytes <= 0:
+            raise ValueError(f"invalid cache size: {max_bytes}")
+
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        self._lock = threading.Lock()
+        self._invalidations: int = 0
+
+        # key -> (value, expiry, size)
+        self._entries: dict[str, tuple[typing.Any, int, int]] = {}
+        self._size: int = 0
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        """
+        returns the cached value of key, or default if it is not cached or
+        has expired. values may be None, callers tell a miss apart with a
+        default of their own
+        """
+        with self._lock:
+            cached = self._entries.get(key, _NOT_CACHED)
+            if cached is not _NOT_CACHED and 0 < cached[1] <= int(time.time()):
+                self._remove(key)
+                cached = _NOT_CACHED
+
+            if cached is _NOT_CACHED:
+                self.misses += 1
+                self._record_miss(key)
+                return default
+
+            self.hits += 1
+            self._record_hit(key)
+            return cached[0]
+
+    def ticket(self) -> int:
+        """
+        returns a ticket to pass to put() for a value about to be read
+        """
+        return self._invalidations
+
+    def put(
+        self, key: str, value: typing.Any, expiry: int, size: int, ticket: int
+    ) -> None:
+        """
+        caches the value of key. the value is dropped if any key was
+        invalidated since the ticket was taken, or if it is larger than the
+        cache itself
+
+        args:
+            key    : the key
+            value  : decoded value of the key
+            expiry : expiry timestamp of the value, 0 for none
+            size   : bytes of the record on disk, counted against max_bytes
+            ticket : ticket() taken before the value was looked up
+        """
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if ticket != self._invalidations:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expiry, size)
+            self._size += size
+            self._insert(key, size)
+            self._evict()
+
+    def invalidate(self, key: str) -> None:
+        """
+        drops the cached value of key, called on every write to key
+        """
+        with self._lock:
+            self._invalidations += 1
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._invalidations += 1
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self.hits,
+                self.misses,
+                self.evictions,
+                len(self._entries),
+                self._size,
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+        self._unlink(key, size)
+
+    def _evict_one(self, key: str) -> None:
+        self.evictions += 1
+        self._remove(key)
+
+    # eviction policy hooks, called with the lock held
+
+    @abc.abstractmethod
+    def _record_hit(self, key: str) -> None:
+        """
+        key was found in the cache
+        """
+
+    def _record_miss(self, key: str) -> None:
+        """
+        key was looked up and not found
+        """
+
+    @abc.abstractmethod
+    def _insert(self, key: str, size: int) -> None:
+        """
+        key was added to _entries, with a record of size bytes
+        """
+
+    @abc.abstractmethod
+    def _unlink(self, key: str, size: int) -> None:
+        """
+        key was removed from _entries
+        """
+
+    @abc.abstractmethod
+    def _evict(self) -> None:
+        """
+        evicts values until the cache is within max_bytes and max_entries
+        """
+
+
+class LRUCache(ValueCache):
+    """
+    ValueCache that evicts the least recently used values
+    """
+
+    def __init__(self, max_bytes: int, max_entries: typing.Optional[int] = None):
+        super().__init__(max_bytes, max_entries)
+        self._order: OrderedDict[str, None] = OrderedDict()
+
+    def _record_hit(self, key: str) -> None:
+        self._order.move_to_end(key)
+
+    def _insert(self, key: str, size: int) -> None:
+        self._order[key] = None
+
+    def _unlink(self, key: str, size: int) -> None:
+        del self._order[key]
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes or (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+        ):
+            self._evict_one(next(iter(self._order)))
+
+
+class FrequencySketch:
+    """
+    count-min sketch estimating how often keys were seen, with 4 rows of
+    counters saturating at 15. all the counters are halved once sample_size
+    keys have been recorded, so that old popularity fades away
+
+    args:
+        width : number of counters per row, rounded up to a power of two
+    """
+
+    ROWS: typing.Final[int] = 4
+    MAX_COUNT: typing.Final[int] = 15
+
+    # translation table halving every counter
+    _HALVE: typing.Final[bytes] = bytes(c >> 1 for c in range(256))
+
+    def __init__(self, width: int):
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self._mask = self.width - 1
+        # the rows one after the other
+        self._counters = bytearray(self.ROWS * self.width)
+        self.sample_size = 10 * self.width
+        self._additions = 0
+
+    def _indexes(self, key: str) -> tuple[int, int, int, int]:
+        # row i takes the hash rotated by 16 * i bits
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        width, mask = self.width, self._mask
+        return (
+            h & mask,
+            width + (((h >> 16) | (h << 48)) & mask),
+            2 * width + (((h >> 32) | (h << 32)) & mask),
+            3 * width + (((h >> 48) | (h << 16)) & mask),
+        )
+
+    def add(self, key: str) -> None:
+        counters = self._counters
+        for i in self._indexes(key):
+            if counters[i] < self.MAX_COUNT:
+                counters[i] += 1
+
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._reset()
+
+    def frequency(self, key: str) -> int:
+        counters = self._counters
+        i0, i1, i2, i3 = self._indexes(key)
+        return min(counters[i0], counters[i1], counters[i2], counters[i3])
+
+    def _reset(self) -> None:
+        self._counters = self._counters.translate(self._HALVE)
+        self._additions //= 2
+
+
+class TinyLFUCache(ValueCache):
+    """
+    ValueCache with W-TinyLFU eviction. 1% of the cache is an LRU window,
+    the rest a segmented LRU where values requested again are protected
+    from eviction (80% of the main segment). a value evicted from the
+    window replaces the next victim of the main segment only if it is
+    estimated to be more frequent
+    """
+
+    WINDOW_RATIO: typing.Final[float] = 0.01
+    PROTECTED_RATIO: typing.Final[float] = 0.8
+
+    def __init__(self, max_bytes: int, max_entries: typing.Optional[int] = None):
+        super().__init__(max_bytes, max_entries)
+
+        self._window: OrderedDict[str, None] = OrderedDict()
+        self._probation: OrderedDict[str, None] = OrderedDict()
+        self._protected: OrderedDict[str, None] = OrderedDict()
+        self._window_size = 0
+        self._protected_size = 0
+
+        self._window_max = max(int(max_bytes * self.WINDOW_RATIO), 1)
+        self._protected_max = int((max_bytes - self._window_max) * self.PROTECTED_RATIO)
+        self._window_max_entries = None
+        self._protected_max_entries = None
+        if max_entries is not None:
+            self._window_max_entries = max(int(max_entries * self.WINDOW_RATIO), 1)
+            self._protected_max_entries = int(
+                (max_entries - self._window_max_entries) * self.PROTECTED_RATIO
+            )
+
+        self.sketch = FrequencySketch(max_entries or max(max_bytes // 256, 64))
+
+    def _record_hit(self, key: str) -> None:
+        self.sketch.add(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        else:
+            # requested again while on probation, protect it
+            size = self._entries[key][2]
+            del self._probation[key]
+            self._protected[key] = None
+            self._protected_size += size
+            self._demote()
+
+    def _record_miss(self, key: str) -> None:
+        self.sketch.add(key)
+
+    def _insert(self, key: str, size: int) -> None:
+        self._window[key] = None
+        self._window_size += size
+
+    def _unlink(self, key: str, size: int) -> None:
+        if key in self._window:
+            del self._window[key]
+            self._window_size -= size
+        elif key in self._protected:
+            del self._protected[key]
+            self._protected_size -= size
+        else:
+            del self._probation[key]
+
+    def _demote(self) -> None:
+        """
+        moves the least recently used protected values back to probation
+        while the protected segment is over its budget
+        """
+        while self._protected and (
+            self._protected_size > self._protected_max
+            or (
+                self._protected_max_entries is not None
+                and len(self._protected) > self._protected_max_entries
+            )
+        ):
+            key, _ = self._protected.popitem(last=False)
+            self._protected_size -= self._entries[key][2]
+            self._probation[key] = None
+
+    def _evict(self) -> None:
+        # values leaving the window become candidates for the main segment
+        while len(self._window) > 1 and (
+            self._window_size > self._window_max
+            or (
+                self._window_max_entries is not None
+                and len(self._window) > self._window_max_entries
+            )
+        ):
+            key, _ = self._window.popitem(last=False)
+            self._window_size -= self._entries[key][2]
+            self._probation[key] = None
+
+            # admit the candidate only if it beats the victim
+            while self._over_budget() and len(self._probation) > 1:
+                victim = next(iter(self._probation))
+                if victim == key:
+                    break
+                if self.sketch.frequency(key) > self.sketch.frequency(victim):
+                    self._evict_one(victim)
+                else:
+                    self._evict_one(key)
+                    break
+
+        # a single huge window value or an entry limit smaller than the
+        # segments can still leave the cache over budget
+        while self._over_budget():
+            for segment in (self._probation, self._protected, self._window):
+                if segment:
+                    self._evict_one(next(iter(segment)))
+                    break
+
+    def _over_budget(self) -> bool:
+        return self._size > self.max_bytes or (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+        )
+
+
+def make_cache(
+    policy: str,
+    max_bytes: int,
+    max_entries: typing.Optional[int] = None,
+) -> ValueCache:
+    """
+    returns a ValueCache with the given eviction policy, one of CACHE_POLICIES
+    """
+    if policy == CACHE_LRU:
+        return LRUCache(max_bytes, max_entries)
+    if policy == CACHE_TINYLFU:
+        return TinyLFUCache(max_bytes, max_entries)
+    raise ValueError(
+        f"invalid cache policy: {policy!r}, expected one of {CACHE_POLICIES}"
+    )
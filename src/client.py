@@ -0,0 +1,414 @@
+import socket
+import threading
+import typing
+from collections.abc import Iterable, Mapping
+
+from src.custom_types import KeyType, ValueType
+from src.errors import ProtocolError, ResponseError
+from src.resp import (
+    DEFAULT_PORT,
+    INCOMPLETE,
+    RespError,
+    RespParser,
+    encode_command,
+    to_bytes,
+)
+
+"""
+client of src/server.py.
+
+connections are kept open and reused from a pool, a call takes an idle
+connection, or opens one while fewer than max_connections are open, and
+gives it back once answered. a client can be shared by threads, every
+thread talks over a connection of its own.
+
+a pipeline sends many commands with one write and reads their replies with
+as few reads as they need, without a round trip per command
+
+    with KVClient(port=6380) as kvc:
+        kvc.set("foo", "bar")
+        with kvc.pipeline() as pipe:
+            for i in range(1000):
+                pipe.set(f"key-{i}", i)
+            pipe.get("foo")
+            results = pipe.execute()
+
+the server stores values as bytes, get() returns bytes, or None for a key
+without a value.
+"""
+
+# bytes read off a socket at a time
+READ_SIZE: typing.Final[int] = 64 * 1024
+
+
+class Connection:
+    """
+    Connection is a socket to the server and the parser of its replies
+
+    args:
+        address : unix socket path or (host, port)
+        timeout : seconds a send or a read may take, None to wait forever
+    """
+
+    def __init__(
+        self,
+        address: typing.Union[str, tuple[str, int]],
+        timeout: typing.Optional[float] = None,
+    ):
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(address, timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.parser = RespParser()
+
+    def send(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+    def read_replies(self, n: int) -> list:
+        """
+        returns the next n replies, reading as much as they need
+        """
+        replies: list = []
+        while len(replies) < n:
+            reply = self.parser.parse()
+            if reply is not INCOMPLETE:
+                replies.append(reply)
+                continue
+            data = self.sock.recv(READ_SIZE)
+            if not data:
+                raise ConnectionError("connection closed by the server")
+            self.parser.feed(data)
+        return replies
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class ConnectionPool:
+    """
+    ConnectionPool keeps the idle connections to a server, see the module
+    docstring
+
+    args:
+        address         : unix socket path or (host, port)
+        max_connections : connections open at most, a caller waits for one
+                          to be released beyond that
+        timeout         : passed to Connection
+    """
+
+    def __init__(
+        self,
+        address: typing.Union[str, tuple[str, int]],
+        max_connections: int = 16,
+        timeout: typing.Optional[float] = None,
+    ):
+        self.address = address
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle: list[Connection] = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def acquire(self) -> Connection:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionError("the client is closed")
+                if self._idle:
+                    # the most recently used connection, its buffers are warm
+                    return self._idle.pop()
+                if self._open < self.max_connections:
+                    self._open += 1
+                    break
+                self._cond.wait()
+
+        try:
+            return Connection(self.address, self.timeout)
+        except BaseException:
+            self._discard()
+            raise
+
+    def release(self, conn: Connection) -> None:
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+        conn.close()
+        self._discard()
+
+    def discard(self, conn: Connection) -> None:
+        """
+        closes a connection that failed, its replies may be out of step
+        """
+        conn.close()
+        self._discard()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def _discard(self) -> None:
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+
+# turns the reply of a command into what the client method returns
+def _bool(reply: int) -> bool:
+    return bool(reply)
+
+
+def _ok(reply: str) -> None:
+    return None
+
+
+class KVClient:
+    """
+    KVClient talks to a KVServer, see the module docstring
+
+    args:
+        host            : server address
+        port            : server TCP port
+        unix_path       : path of the server's unix socket, instead of TCP
+        max_connections : connections open at most, see ConnectionPool
+        timeout         : seconds a send or a read may take
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        unix_path: typing.Optional[str] = None,
+        max_connections: int = 16,
+        timeout: typing.Optional[float] = None,
+    ):
+        address = unix_path if unix_path is not None else (host, port)
+        self.pool = ConnectionPool(address, max_connections, timeout)
+
+    def ping(self) -> bool:
+        return self._call((b"PING",)) == "PONG"
+
+    def get(self, key: KeyType) -> typing.Optional[bytes]:
+        return self._call((b"GET", key))
+
+    def get_many(
+        self, keys: Iterable[KeyType]
+    ) -> dict[KeyType, typing.Optional[bytes]]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        return _mget(keys, self._call((b"MGET", *keys)))
+
+    def set(self, key: KeyType, value: ValueType, expiry: int = 0) -> None:
+        self._call(_set_command(key, value, expiry))
+
+    def set_many(
+        self,
+        items: typing.Union[
+            Mapping[KeyType, ValueType], Iterable[tuple[KeyType, ValueType]]
+        ],
+    ) -> None:
+        """
+        stores many keys with one MSET, written as a batch by the server
+        """
+        command = _mset_command(items)
+        if len(command) > 1:
+            self._call(command)
+
+    def delete(self, key: KeyType) -> bool:
+        """
+        returns whether key had a value
+        """
+        return _bool(self._call((b"DEL", key)))
+
+    def delete_many(self, keys: Iterable[KeyType]) -> int:
+        """
+        deletes many keys with one DEL, returns how many had a value
+        """
+        keys = list(keys)
+        return self._call((b"DEL", *keys)) if keys else 0
+
+    def exists(self, key: KeyType) -> bool:
+        return _bool(self._call((b"EXISTS", key)))
+
+    def ttl(self, key: KeyType) -> int:
+        return self._call((b"TTL", key))
+
+    def expire(self, key: KeyType, seconds: int) -> bool:
+        return _bool(self._call((b"EXPIRE", key, seconds)))
+
+    def persist(self, key: KeyType) -> bool:
+        return _bool(self._call((b"PERSIST", key)))
+
+    def __len__(self) -> int:
+        return self._call((b"DBSIZE",))
+
+    def pipeline(self) -> "Pipeline":
+        return Pipeline(self)
+
+    def execute(self, commands: list[tuple]) -> list:
+        """
+        sends commands, tuples of a name and arguments, with one write and
+        returns their replies in order. error replies are returned as
+        RespError rather than raised
+        """
+        if not commands:
+            return []
+        data = b"".join(encode_command(*command) for command in commands)
+        conn = self.pool.acquire()
+        try:
+            conn.send(data)
+            replies = conn.read_replies(len(commands))
+        except BaseException:
+            # unread replies would answer the next caller
+            self.pool.discard(conn)
+            raise
+        self.pool.release(conn)
+        return replies
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def __enter__(self) -> "KVClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _call(self, command: tuple) -> typing.Any:
+        (reply,) = self.execute([command])
+        return _check(reply)
+
+
+class Pipeline:
+    """
+    Pipeline queues commands and sends them together on execute(), it has
+    the methods of KVClient that write or read keys. execute() returns the
+    result of every queued command in order
+
+    args:
+        client : the client to send the commands with
+    """
+
+    def __init__(self, client: KVClient):
+        self.client = client
+        self._commands: list[tuple] = []
+        self._results: list[typing.Callable[[typing.Any], typing.Any]] = []
+
+    def get(self, key: KeyType) -> "Pipeline":
+        return self._queue((b"GET", key))
+
+    def get_many(self, keys: Iterable[KeyType]) -> "Pipeline":
+        keys = list(keys)
+        if not keys:
+            # MGET needs a key, nothing is sent and the result is empty
+            return self._queue(None, lambda reply: {})
+        return self._queue((b"MGET", *keys), lambda reply: _mget(keys, reply))
+
+    def set(self, key: KeyType, value: ValueType, expiry: int = 0) -> "Pipeline":
+        return self._queue(_set_command(key, value, expiry), _ok)
+
+    def set_many(
+        self,
+        items: typing.Union[
+            Mapping[KeyType, ValueType], Iterable[tuple[KeyType, ValueType]]
+        ],
+    ) -> "Pipeline":
+        command = _mset_command(items)
+        if len(command) == 1:
+            # MSET needs a key, nothing is sent
+            return self._queue(None, _ok)
+        return self._queue(command, _ok)
+
+    def delete(self, key: KeyType) -> "Pipeline":
+        return self._queue((b"DEL", key), _bool)
+
+    def delete_many(self, keys: Iterable[KeyType]) -> "Pipeline":
+        keys = list(keys)
+        if not keys:
+            # DEL needs a key, nothing is sent and the result is 0
+            return self._queue(None, lambda reply: 0)
+        return self._queue((b"DEL", *keys))
+
+    def exists(self, key: KeyType) -> "Pipeline":
+        return self._queue((b"EXISTS", key), _bool)
+
+    def ttl(self, key: KeyType) -> "Pipeline":
+        return self._queue((b"TTL", key))
+
+    def expire(self, key: KeyType, seconds: int) -> "Pipeline":
+        return self._queue((b"EXPIRE", key, seconds), _bool)
+
+    def persist(self, key: KeyType) -> "Pipeline":
+        return self._queue((b"PERSIST", key), _bool)
+
+    def execute(self) -> list:
+        """
+        sends the queued commands and returns their results. the first
+        error reply is raised as ResponseError, after every reply was read
+        """
+        commands, results = self._commands, self._results
+        self._commands, self._results = [], []
+        replies = iter(self.client.execute([c for c in commands if c is not None]))
+        replies = [None if c is None else _check(next(replies)) for c in commands]
+        return [result(reply) for result, reply in zip(results, replies)]
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._commands, self._results = [], []
+
+    def _queue(
+        self,
+        command: typing.Optional[tuple],
+        result: typing.Callable[[typing.Any], typing.Any] = lambda reply: reply,
+    ) -> "Pipeline":
+        """
+        queues command and the function turning its reply into a result. a
+        None command sends nothing, its result gets None
+        """
+        self._commands.append(command)
+        self._results.append(result)
+        return self
+
+
+def _check(reply: typing.Any) -> typing.Any:
+    if isinstance(reply, RespError):
+        raise ResponseError(reply.message)
+    return reply
+
+
+def _mget(keys: list, reply: list) -> dict:
+    if not isinstance(reply, list) or len(reply) != len(keys):
+        raise ProtocolError("MGET reply does not match its keys")
+    return dict(zip(keys, reply))
+
+
+def _set_command(key: KeyType, value: ValueType, expiry: int) -> tuple:
+    if expiry > 0:
+        return (b"SET", key, to_bytes(value), b"EX", expiry)
+    return (b"SET", key, to_bytes(value))
+
+
+def _mset_command(
+    items: typing.Union[
+        Mapping[KeyType, ValueType], Iterable[tuple[KeyType, ValueType]]
+    ],
+) -> tuple:
+    if isinstance(items, Mapping):
+        items = items.items()
+    return (b"MSET", *(arg for key, value in items for arg in (key, value)))
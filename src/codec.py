@@ -0,0 +1,114 @@
+import lzma
+import typing
+import zlib
+
+from src.errors import UnsupportedCodecError
+
+"""
+per record value compression.
+
+the codec a value was compressed with is recorded in bits 2-4 of the flags
+field of the record header (see src/format.py), 0 meaning not compressed.
+every record names its own codec, so a data file can mix compressed and
+plain records, written with different settings over time.
+
+    | id | codec | module                                  |
+    |  0 | none  |                                         |
+    |  1 | zlib  | stdlib                                  |
+    |  2 | lzma  | stdlib                                  |
+    |  3 | zstd  | zstandard, used only if it is installed |
+    |  4 | lz4   | lz4, used only if it is installed       |
+
+the CRC of a record covers the value bytes as stored, so corruption is caught
+before anything is decompressed.
+"""
+
+CODEC_NONE = "none"
+CODEC_ZLIB = "zlib"
+CODEC_LZMA = "lzma"
+CODEC_ZSTD = "zstd"
+CODEC_LZ4 = "lz4"
+
+# values shorter than this are stored as they are by default
+DEFAULT_COMPRESSION_THRESHOLD: typing.Final[int] = 1024
+
+
+class Codec(typing.NamedTuple):
+    name: str
+    id: int
+    compress: typing.Callable[[bytes], bytes]
+    decompress: typing.Callable[[bytes], bytes]
+
+
+CODECS: dict[str, Codec] = {
+    CODEC_ZLIB: Codec(CODEC_ZLIB, 1, zlib.compress, zlib.decompress),
+    CODEC_LZMA: Codec(CODEC_LZMA, 2, lzma.compress, lzma.decompress),
+}
+
+try:
+    import zstandard
+
+    CODECS[CODEC_ZSTD] = Codec(CODEC_ZSTD, 3, zstandard.compress, zstandard.decompress)
+except ImportError:
+    pass
+
+try:
+    import lz4.frame
+
+    CODECS[CODEC_LZ4] = Codec(CODEC_LZ4, 4, lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+
+# every id known to the format, installed or not, to report what is missing
+CODEC_IDS: dict[int, str] = {1: CODEC_ZLIB, 2: CODEC_LZMA, 3: CODEC_ZSTD, 4: CODEC_LZ4}
+_BY_ID: dict[int, Codec] = {codec.id: codec for codec in CODECS.values()}
+
+
+def available_codecs() -> list[str]:
+    """
+    returns the names of the codecs that can be used on this system
+    """
+    return list(CODECS)
+
+
+def get_codec(name: typing.Optional[str]) -> typing.Optional[Codec]:
+    """
+    returns the codec called name, None for no compression
+    """
+    if name is None or name == CODEC_NONE:
+        return None
+    if name not in CODECS:
+        raise UnsupportedCodecError(name)
+    return CODECS[name]
+
+
+def compress(
+    value: bytes, codec: typing.Optional[Codec], threshold: int
+) -> tuple[int, bytes]:
+    """
+    compresses value with codec if it is at least threshold bytes long and
+    compressing makes it smaller
+
+    returns the codec id to record in the header, 0 if the value was left as
+    it is, and the bytes to store
+    """
+    if codec is None or len(value) < threshold:
+        return 0, value
+
+    compressed = codec.compress(value)
+    if len(compressed) >= len(value):
+        return 0, value
+    return codec.id, compressed
+
+
+def decompress(codec_id: int, stored: typing.Union[bytes, memoryview]) -> bytes:
+    """
+    returns the value bytes of a record stored with the codec codec_id
+    """
+    if codec_id == 0:
+        return bytes(stored)
+
+    codec = _BY_ID.get(codec_id)
+    if codec is None:
+        raise UnsupportedCodecError(CODEC_IDS.get(codec_id, f"id {codec_id}"))
+    return codec.decompress(stored)
@@ -1,76 +1,273 @@
+import collections
+import contextlib
+import io
 import os
+import threading
 import time
 import sys
+import typing
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from os import fsync, path
+from src.bloom import remove_bloom
+from src.durability import fsync_dir
+from src.errors import CompactionAbortedError
 from src.format import (
+    FLAG_BATCH,
+    FLAG_DELETED,
+    FLAGS_OFFSET,
     HEADER_SIZE,
-    KVData,
-    KVEntry,
-    KVHeader,
 )
+from src.hint import HintEntry, remove_hint, write_hint
+from src.keydir import KeyDir
+from src.scanner import scan_records
+from src.verify import corrupt_in
 
+# size of the buffer used to write the compacted file, surviving records are
+# written in bulk and the file is fsynced once at the end
+COMPACTION_BUFFER_SIZE: typing.Final[int] = 4 * 1024 * 1024
 
-def shrink(filename: str):
-    if not path.exists(filename):
-        return
 
-    tombstones = set()
+class CompactionStats:
+    """
+    CompactionStats reports the outcome of compacting a data file
 
-    source_file = filename
-    target_file = filename + "_kompact"
+    args:
+        bytes_before : size of the data file before compaction
+        bytes_after  : size of the data file after compaction
+        records      : number of records kept in the compacted file
+        elapsed      : time taken in seconds
+    """
 
-    print("initializing compaction...")
-    try:
-        with open(
-            source_file,
-            "a+b",
-        ) as infile, open(
-            target_file,
-            "a+b",
-        ) as outfile:
-            # flushing buffers before load to persit leftover data in buffers
-            # and reset position back to zero
-            infile.flush()
-            fsync(infile.fileno())
-            infile.seek(0)
-
-            while hdr_bytes := infile.read(HEADER_SIZE):
-                chksm, tstamp, expiry, deleted, ksz, vsz = KVHeader.decode_hdr(
-                    hdr_bytes,
-                )
+    def __init__(
+        self,
+        bytes_before: int,
+        bytes_after: int,
+        records: int,
+        elapsed: float,
+    ):
+        self.bytes_before = bytes_before
+        self.bytes_after = bytes_after
+        self.records = records
+        self.elapsed = elapsed
 
-                # find deleted and expired keys
-                if deleted == 1 or (expiry > 0 and expiry <= int(time.time())):
-                    tombstones.add(infile.read(ksz).decode("utf-8"))
-                    infile.seek(vsz, os.SEEK_CUR)
-                else:
-                    infile.seek((ksz + vsz), os.SEEK_CUR)
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.bytes_before - self.bytes_after
 
-            if len(tombstones) < 1:
-                return
+    @property
+    def throughput(self) -> float:
+        """
+        bytes of the source file processed per second
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_before / self.elapsed
 
-            infile.seek(0)
-            while hdr_bytes := infile.read(HEADER_SIZE):
-                chksm, tstamp, expiry, deleted, ksz, vsz = KVHeader.decode_hdr(
-                    hdr_bytes,
-                )
-                key_bytes = infile.read(ksz)
-                key = key_bytes.decode("utf-8")
+    def __str__(self) -> str:
+        return (
+            f"reclaimed {self.bytes_reclaimed} bytes "
+            f"({self.bytes_before} -> {self.bytes_after}), "
+            f"{self.records} records kept, "
+            f"{self.elapsed:.3f}s, {self.throughput / (1 << 20):.1f} MiB/s"
+        )
+
+
+def latest_records(filename: str) -> list[HintEntry]:
+    """
+    scans a data file once, reading only headers and keys, and finds the
+    latest record of every key
+
+    returns (timestamp, expiry, deleted, pos, size, key) of the latest records
+    """
+    latest: dict[str, HintEntry] = {}
+    # records of a batch only count once the last record of the batch is read
+    batch: list[HintEntry] = []
+    for pos, hdr, key, _ in scan_records(filename):
+        _, tstamp, expiry, flags, ksz, vsz = hdr
+        size = HEADER_SIZE + ksz + vsz
+        batch.append(
+            (tstamp, expiry, flags & FLAG_DELETED, pos, size, str(key, "utf-8"))
+        )
+        if not flags & FLAG_BATCH:
+            for record in batch:
+                latest[record[5]] = record
+            batch.clear()
+
+    return list(latest.values())
+
+
+def copy_records(
+    source: str,
+    target: str,
+    records: list[HintEntry],
+    buffer_size: int = COMPACTION_BUFFER_SIZE,
+    cancel: typing.Optional[threading.Event] = None,
+    progress: typing.Optional[typing.Callable[[int], None]] = None,
+    corrupt: typing.Optional[list[int]] = None,
+) -> tuple[list[HintEntry], int]:
+    """
+    copies records from the source data file to the target file in offset
+    order. adjacent records are read together and everything is written
+    through a large buffer, the target is fsynced once at the end
+
+    args:
+        source   : data file to copy from
+        target   : file to write, truncated if it exists
+        records  : (timestamp, expiry, deleted, pos, size, key) to copy
+        cancel   : aborts the copy with CompactionAbortedError once set
+        progress : called with the number of bytes copied so far
+        corrupt  : when given, the CRC of every record is checked and the
+                   source offsets of corrupt records are appended to it.
+                   they are copied all the same
+
+    returns the records, in offset order, with their positions in the target
+    file, and the size of the target file
+    """
+    records = sorted(records, key=lambda r: r[3])
+    moved: list[HintEntry] = []
+    out_pos = 0
 
-                # skip if deleted or expired
-                if key in tombstones:
-                    infile.seek(vsz, os.SEEK_CUR)
-                    continue
+    with open(source, "rb") as infile, open(target, "wb", buffering=0) as raw:
+        outfile = io.BufferedWriter(raw, buffer_size=buffer_size)
 
-                outfile.write(hdr_bytes + key_bytes + infile.read(vsz))
-                outfile.flush()
-                fsync(outfile.fileno())
+        i = 0
+        while i < len(records):
+            # merge a run of adjacent records into a single read
+            start = records[i][3]
+            end = start
+            j = i
+            while (
+                j < len(records) and records[j][3] == end and end - start < buffer_size
+            ):
+                end += records[j][4]
+                j += 1
 
+            infile.seek(start)
+            run = bytearray(infile.read(end - start))
+            if corrupt is not None:
+                corrupt.extend(corrupt_in(run, start))
+
+            for tstamp, expiry, deleted, pos, size, key in records[i:j]:
+                # records are copied once their batch is complete, the batch
+                # flag must not make them look like a torn batch
+                flags_pos = pos - start + FLAGS_OFFSET
+                run[flags_pos] &= ~FLAG_BATCH & 0xFF
+
+                moved.append((tstamp, expiry, deleted, out_pos, size, key))
+                out_pos += size
+            outfile.write(run)
+            i = j
+
+            if progress is not None:
+                progress(out_pos)
+            if cancel is not None and cancel.is_set():
+                raise CompactionAbortedError(source)
+
+        outfile.flush()
+        fsync(raw.fileno())
+
+    return moved, out_pos
+
+
+def append_tail(
+    source: str,
+    target: str,
+    start: int,
+    end: int,
+    buffer_size: int = COMPACTION_BUFFER_SIZE,
+) -> list[tuple[str, int, int]]:
+    """
+    appends the records between offsets start and end of the source data
+    file to the target file as they are, and fsyncs the target. used to catch
+    up with the writes made to the active file while it was being compacted
+
+    returns (key, pos, size) of the appended records, pos being the offset in
+    the source file
+    """
+    records = [
+        (str(key, "utf-8"), pos, HEADER_SIZE + hdr[4] + hdr[5])
+        for pos, hdr, key, _ in scan_records(source, start, end)
+    ]
+    with open(source, "rb") as infile:
+        infile.seek(start)
+        with open(target, "ab") as outfile:
+            remaining = end - start
+            while remaining > 0:
+                chunk = infile.read(min(remaining, buffer_size))
+                outfile.write(chunk)
+                remaining -= len(chunk)
             outfile.flush()
             fsync(outfile.fileno())
 
+    return records
+
+
+def shrink(
+    filename: str,
+    key_dir: typing.Optional[KeyDir] = None,
+    file_id: int = 0,
+    keep_tombstones: bool = False,
+    buffer_size: int = COMPACTION_BUFFER_SIZE,
+    verify: bool = True,
+) -> typing.Optional[CompactionStats]:
+    """
+    compacts a data file so that it only holds the latest version of every
+    key. the compacted file is written next to the data file and swapped in
+    with os.replace and a fsync of the directory, so the data file is never
+    left half written.
+
+    args:
+        filename        : data file to compact
+        key_dir         : key_dir of the store, when given the latest records
+                          are taken from it instead of scanning the file
+        file_id         : id of the data file, to pick its entries in key_dir
+        keep_tombstones : keep deleted and expired records. needed when an
+                          older data file may still hold a value they shadow
+        verify          : check the CRC of the records copied, corrupt ones
+                          are reported and copied as they are
+
+    returns the compaction stats, or None if the file could not be compacted
+    """
+    if not path.exists(filename):
+        return None
+
+    source_file = filename
+    target_file = filename + "_kompact"
+
+    print("initializing compaction...")
+    start = time.perf_counter()
+    bytes_before = path.getsize(source_file)
+    try:
+        if key_dir is None:
+            records = latest_records(source_file)
+        else:
+            records = list(key_dir.records(file_id))
+
+        if not keep_tombstones:
+            now = int(time.time())
+            records = [r for r in records if not (r[2] or (r[1] > 0 and r[1] <= now))]
+
+        if sum(r[4] for r in records) == bytes_before:
+            print("nothing to compact...!")
+            return CompactionStats(
+                bytes_before,
+                bytes_before,
+                len(records),
+                time.perf_counter() - start,
+            )
+
+        corrupt: typing.Optional[list[int]] = [] if verify else None
+        moved, bytes_after = copy_records(
+            source_file,
+            target_file,
+            records,
+            buffer_size=buffer_size,
+            corrupt=corrupt,
+        )
+        for offset in corrupt or ():
+            print(f"corrupt record at offset {offset} of {source_file}")
+
     except Exception as e:
         print(f"unexpected {e=}, {type(e)=} druing compaction")
         print("aborting compaction process...!")
@@ -81,20 +278,212 @@ def shrink(filename: str):
                 os.remove(target_file)
             except OSError as err:
                 print(f"OSError: {err}")
-        return
+        return None
 
-    # Clean up the source file
-    try:
-        os.remove(source_file)
-    except OSError as err:
-        print(f"OSError when cleaning up: {err}")
-        return
+    # the hint and the filter of the source file are stale once the file is
+    # rewritten
+    remove_hint(source_file)
+    remove_bloom(source_file)
 
-    # rename the target file
+    # atomically replace the source file with the compacted file, fsynced
+    # by copy_records() already. the source is never removed before the
+    # swap, a crash leaves one file or the other whole
     try:
-        os.rename(target_file, filename)
+        os.replace(target_file, filename)
+        fsync_dir(path.dirname(filename))
     except OSError as err:
-        print(f"OSError when renaming the compact file: {err}")
-        return
+        print(f"OSError when replacing the data file: {err}")
+        return None
+
+    # no bloom filter, only the immutable files of a data directory have
+    # one and they are compacted by KVStore._compact_file()
+    write_hint(filename, moved, bytes_after)
+
+    stats = CompactionStats(
+        bytes_before,
+        bytes_after,
+        len(moved),
+        time.perf_counter() - start,
+    )
+    print(f"compaction finished, {stats}")
+    return stats
+
+
+class Compactor:
+    """
+    Compactor compacts the data files of a KVStore on a background thread
+    while the store keeps serving reads and writes. a data file is compacted
+    when its share of dead bytes reaches dead_ratio, every interval seconds,
+    or when requested with trigger().
+
+    args:
+        store          : the KVStore to compact
+        dead_ratio     : compact a data file once this fraction of it is dead,
+                         None to disable
+        interval       : compact every data file with dead bytes every
+                         interval seconds, None to disable
+        min_dead_bytes : data files with fewer dead bytes are left alone by
+                         the dead_ratio trigger
+        check_interval : how often, in seconds, the triggers are checked
+    """
+
+    def __init__(
+        self,
+        store,
+        dead_ratio: typing.Optional[float] = None,
+        interval: typing.Optional[float] = None,
+        min_dead_bytes: int = 0,
+        check_interval: float = 1.0,
+    ):
+        self.store = store
+        self.dead_ratio = dead_ratio
+        self.interval = interval
+        self.min_dead_bytes = min_dead_bytes
+        self.check_interval = check_interval
+
+        # progress of the compaction in flight
+        self.running: bool = False
+        self.current_file: typing.Optional[int] = None
+        self.bytes_total: int = 0
+        self.bytes_done: int = 0
 
-    print("compaction finished...!")
+        # outcome of past compactions
+        self.history: collections.deque[CompactionStats] = collections.deque(maxlen=100)
+        self.runs: int = 0
+        self.total_reclaimed: int = 0
+        self.last_run: typing.Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._wakeup = threading.Event()
+        self._requested: bool = False
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def progress(self) -> float:
+        """
+        fraction of the data file in flight that has been compacted
+        """
+        if not self.running or self.bytes_total == 0:
+            return 0.0
+        return min(self.bytes_done / self.bytes_total, 1.0)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._cancel.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="pyk-compactor",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        stops the background thread. a compaction in flight is aborted and
+        its partial output removed, the data file is left untouched
+        """
+        self._cancel.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def trigger(self) -> None:
+        """
+        asks the background thread to compact every data file with dead bytes
+        """
+        self._requested = True
+        self.start()
+        self._wakeup.set()
+
+    @contextlib.contextmanager
+    def paused(self) -> typing.Iterator[None]:
+        """
+        no compaction runs within the block, a compaction in flight is
+        waited for. for work that reads data files compaction rewrites
+        """
+        with self._lock:
+            yield
+
+    def candidates(self, force: bool = False) -> list[int]:
+        """
+        returns the ids of the data files due for compaction. with force,
+        every data file with dead bytes is due
+        """
+        due = []
+        for file_id, size in self.store._compactable_files():
+            dead = self.store.dead_bytes.get(file_id, 0)
+            if dead <= 0 or size <= 0:
+                continue
+            if force or (
+                self.dead_ratio is not None
+                and dead >= self.min_dead_bytes
+                and dead / size >= self.dead_ratio
+            ):
+                due.append(file_id)
+        return due
+
+    def run_once(self, force: bool = True) -> list[CompactionStats]:
+        """
+        compacts the data files due for compaction in the calling thread
+
+        returns the stats of every compacted data file
+        """
+        results = []
+        with self._lock:
+            sizes = dict(self.store._compactable_files())
+            for file_id in self.candidates(force=force):
+                if self._cancel.is_set():
+                    break
+
+                self.running = True
+                self.current_file = file_id
+                self.bytes_total = sizes[file_id] - self.store.dead_bytes.get(
+                    file_id, 0
+                )
+                self.bytes_done = 0
+                try:
+                    stats = self.store._compact_file(
+                        file_id,
+                        cancel=self._cancel,
+                        progress=self._progress,
+                    )
+                finally:
+                    self.running = False
+                    self.current_file = None
+
+                self.runs += 1
+                self.total_reclaimed += stats.bytes_reclaimed
+                self.history.append(stats)
+                results.append(stats)
+            self.last_run = time.time()
+        return results
+
+    def _progress(self, bytes_done: int) -> None:
+        self.bytes_done = bytes_done
+
+    def _run(self) -> None:
+        next_scheduled = (
+            time.monotonic() + self.interval if self.interval is not None else None
+        )
+        while not self._cancel.is_set():
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
+            if self._cancel.is_set():
+                break
+
+            force = self._requested
+            if next_scheduled is not None and time.monotonic() >= next_scheduled:
+                force = True
+                next_scheduled = time.monotonic() + self.interval
+            self._requested = False
+
+            try:
+                self.run_once(force=force)
+            except CompactionAbortedError:
+                break
+            except Exception as e:
+                print(f"unexpected {e=}, {type(e)=} druing compaction")
+                print("aborting compaction process...!")
@@ -1,30 +1,291 @@
+import io
+import itertools
 import os
+import threading
 import time
+import typing
 import zlib
+from collections.abc import Iterable, Mapping
 from os import fsync, path
 
-from src.compact import shrink
+from src.batch import WriteBatch
+from src.bloom import (
+    BloomFilter,
+    FilterBuilder,
+    bloom_hash,
+    file_keys,
+    load_bloom,
+    remove_bloom,
+    write_bloom,
+)
+from src.cache import CACHE_LRU, ValueCache, make_cache
+from src.codec import (
+    DEFAULT_COMPRESSION_THRESHOLD,
+    Codec,
+    compress,
+    decompress,
+    get_codec,
+)
+from src.compact import CompactionStats, Compactor, append_tail, copy_records, shrink
 from src.custom_types import TOMBSTONE, KeyType, ValueType
-from src.errors import UnsupportedTypeError
+from src.durability import SYNC_ALWAYS, Syncer, fsync_dir
+from src.errors import CorruptValueError, UnsupportedTypeError
+from src.expiry import Reaper
 from src.format import (
+    CODEC_SHIFT,
+    FLAG_BATCH,
+    FLAG_DELETED,
+    FLAG_STREAMING,
+    FLAGS_OFFSET,
     HEADER_SIZE,
     KVData,
     KVEntry,
     KVHeader,
+    TYPE_SHIFT,
+)
+from src.hint import hint_path, remove_hint, write_hint
+from src.index import prefix_end
+from src.keydir import KeyDir
+from src.mapped import MappedFile
+from src.recovery import DiscardedTail, load_data_files
+from src.serializer import VALUE_BYTES, Serializer, encode_value
+from src.stream import (
+    MAX_VALUE_SIZE,
+    STREAM_CHUNK_SIZE,
+    ValueReader,
+    iter_chunks,
 )
 from src.utils import encode_to_str
+from src.verify import (
+    VERIFY_ALWAYS,
+    VERIFY_NEVER,
+    CorruptRecord,
+    Scrubber,
+    read_check_interval,
+)
+
+# default of ValueCache.get(), cached values may be None
+_NOT_CACHED = object()
+
+# data files in a data directory are named after their file id
+DATA_FILE_SUFFIX: typing.Final[str] = ".data"
+
+# the active data file is rotated once it grows past this size
+DEFAULT_MAX_FILE_SIZE: typing.Final[int] = 64 * 1024 * 1024
+
+# get_many() reads records that are at most READ_MERGE_GAP bytes apart with
+# a single read, as long as the read stays under READ_MERGE_LIMIT bytes
+READ_MERGE_GAP: typing.Final[int] = 4096
+READ_MERGE_LIMIT: typing.Final[int] = 1024 * 1024
+
+# scan() reads the values of this many keys at a time with get_many()
+SCAN_PAGE_SIZE: typing.Final[int] = 1000
 
 
 class KVStore:
-    def __init__(self, filename: str = "file.db"):
+    """
+    KVStore is a bitcask style key value store backed by append-only files
+
+    when filename is a directory (or ends with a path separator) the store
+    keeps multiple data files in it. writes go to the active data file, which
+    is rotated once it reaches max_file_size, older data files are immutable.
+    otherwise all the data lives in a single data file.
+
+    a store can be shared by any number of threads. writes are serialised
+    by a single write lock, reads never take it: they look keys up without
+    locking (see _locate()) and read the data files with positional reads.
+
+    values too large to hold in memory are written with set_stream() and
+    read with open_value(), a chunk at a time. see src/stream.py
+
+    args:
+        filename           : path of the data file or the data directory
+        max_file_size      : size at which the active data file is rotated,
+                             only used with a data directory
+        sync_mode          : durability policy for writes, one of "always",
+                             "interval", "batch" or "none". see
+                             src/durability.py
+        sync_interval_ms   : fsync interval for the "interval" mode
+        sync_batch_records : writes between fsyncs for the "batch" mode
+        sync_batch_bytes   : bytes between fsyncs for the "batch" mode
+        compaction_ratio   : compact a data file in the background once
+                             this fraction of it is dead, None to disable
+        compaction_interval: compact data files with dead bytes in the
+                             background every compaction_interval seconds,
+                             None to disable
+        compact_on_close   : compact a single data file when the store is
+                             closed, close() blocks until it is done
+        reap_interval      : delete expired keys in the background every
+                             reap_interval seconds, None to leave them to
+                             get() and reap_expired(). see src/expiry.py
+        reap_batch_size    : expired keys deleted with a single write
+        use_mmap           : serve reads from memory maps of the data files
+                             instead of buffered file reads
+        recovery_workers   : processes loading the data files in parallel
+                             at startup, with a data directory
+        ordered_index      : keep the keys sorted for keys(), scan() and
+                             prefix_scan(), otherwise they sort all the
+                             keys on every call
+        serializer         : turns values of other types than str, bytes,
+                             int, float and bool into bytes and back, e.g.
+                             JSONSerializer(). see src/serializer.py
+        compression        : codec to compress values with, "zlib",
+                             "lzma", or "zstd" and "lz4" if installed. None
+                             to store values as they are. see src/codec.py
+        compression_threshold: values shorter than this many bytes are not
+                             compressed
+        cache_size         : bytes of records to keep decoded in an
+                             in-process value cache, 0 to disable. see
+                             src/cache.py
+        cache_max_entries  : number of values the cache may hold, None for
+                             no limit
+        cache_policy       : eviction policy of the cache, "lru" or
+                             "tinylfu"
+        verify             : which reads check the CRC of their record,
+                             "always", "sampled", "scrub" (only compaction
+                             and the scrubber check it) or "never". see
+                             src/verify.py
+        verify_sample      : one read in verify_sample is checked in the
+                             "sampled" mode
+        scrub_interval     : verify every record of the data files in the
+                             background every scrub_interval seconds, None
+                             to disable
+        scrub_rate         : bytes per second the scrubber reads at most,
+                             None for no limit
+    """
+
+    def __init__(
+        self,
+        filename: str = "file.db",
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+        sync_mode: str = SYNC_ALWAYS,
+        sync_interval_ms: int = 1000,
+        sync_batch_records: int = 1000,
+        sync_batch_bytes: int = 1 << 20,
+        compaction_ratio: typing.Optional[float] = None,
+        compaction_interval: typing.Optional[float] = None,
+        compact_on_close: bool = False,
+        reap_interval: typing.Optional[float] = None,
+        reap_batch_size: int = 1000,
+        use_mmap: bool = False,
+        recovery_workers: int = 1,
+        ordered_index: bool = False,
+        serializer: typing.Optional[Serializer] = None,
+        compression: typing.Optional[str] = None,
+        compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        cache_size: int = 0,
+        cache_max_entries: typing.Optional[int] = None,
+        cache_policy: str = CACHE_LRU,
+        verify: str = VERIFY_ALWAYS,
+        verify_sample: int = 100,
+        scrub_interval: typing.Optional[float] = None,
+        scrub_rate: typing.Optional[int] = 16 * 1024 * 1024,
+    ):
         self.filename: str = filename
+        self.data_dir: typing.Optional[str] = None
+        if path.isdir(filename) or filename.endswith(os.sep):
+            self.data_dir = filename
+            os.makedirs(filename, exist_ok=True)
+
+        self.max_file_size: int = max_file_size
+        self.compact_on_close: bool = compact_on_close
+        self.codec: typing.Optional[Codec] = get_codec(compression)
+        self.compression_threshold: int = compression_threshold
+        self.serializer: typing.Optional[Serializer] = serializer
+        self.verify: str = verify
+        # every how many reads the CRC is checked, 0 for never
+        self._verify_every: int = read_check_interval(verify, verify_sample)
+        self._reads = itertools.count()
+        # corrupt records found by compaction and the scrubber
+        self.corrupt: list[CorruptRecord] = []
+        self.file_id: int = 0
         self.write_pos: int = 0
-        self.key_dir: dict[str, KVEntry] = {}
+        # tombstones are only kept in memory when they can shadow a value in
+        # an older data file
+        self.key_dir: KeyDir = KeyDir(
+            ordered=ordered_index,
+            keep_tombstones=self.data_dir is not None,
+        )
+
+        # bytes taken by overwritten, deleted and tombstone records, per file
+        self.dead_bytes: dict[int, int] = {}
+
+        # read-only handles of the data files, read with positional reads
+        # only so that any number of threads can share them
+        self.readers: dict[int, typing.BinaryIO] = {}
+
+        # memory maps of the data files, used instead of the file handles
+        # when use_mmap is set
+        self.use_mmap: bool = use_mmap
+        self.maps: dict[int, MappedFile] = {}
+
+        # hot values, invalidated on every write to their key
+        self.cache: typing.Optional[ValueCache] = None
+        if cache_size > 0:
+            self.cache = make_cache(cache_policy, cache_size, cache_max_entries)
 
-        if path.exists(filename):
-            self._init_key_dir()
+        # bumped before and after data files or a set of key_dir entries are
+        # swapped, odd while a swap is in progress. see _locate()
+        self._swap_seq: int = 0
 
-        self.file = open(filename, "a+b")
+        self.recovery_workers: int = recovery_workers
+        # the torn or corrupt tails recovery cut off the data files
+        self.discarded: list[DiscardedTail] = []
+        file_ids = self._list_file_ids()
+        if file_ids:
+            self._init_key_dir(file_ids)
+
+        self.file = open(self._data_path(self.file_id), "ab")
+        if not file_ids:
+            fsync_dir(path.dirname(self._data_path(self.file_id)))
+
+        # bloom filters of the immutable data files of a data directory,
+        # None while a filter is not built yet. a tombstone is only kept
+        # while an older data file may hold a record of its key
+        self.filters: dict[int, typing.Optional[BloomFilter]] = {}
+        if self.data_dir is not None:
+            for file_id in file_ids:
+                if file_id != self.file_id:
+                    self.filters[file_id] = load_bloom(self._data_path(file_id))
+        self.filter_builder = FilterBuilder(self)
+
+        # serialises appends to the data file, write_pos and key_dir updates.
+        # readers never take it
+        self._write_lock = threading.Lock()
+        self.syncer = Syncer(
+            self.file,
+            mode=sync_mode,
+            interval_ms=sync_interval_ms,
+            batch_records=sync_batch_records,
+            batch_bytes=sync_batch_bytes,
+        )
+
+        self.compactor = Compactor(
+            self,
+            dead_ratio=compaction_ratio,
+            interval=compaction_interval,
+        )
+        if compaction_ratio is not None or compaction_interval is not None:
+            self.compactor.start()
+
+        self.reaper = Reaper(
+            self,
+            interval=reap_interval if reap_interval is not None else 1.0,
+            batch_size=reap_batch_size,
+        )
+        if reap_interval is not None:
+            self.reaper.start()
+
+        self.scrubber = Scrubber(
+            self,
+            rate=scrub_rate,
+            interval=scrub_interval if scrub_interval is not None else 3600.0,
+        )
+        if scrub_interval is not None:
+            self.scrubber.start()
+
+        if None in self.filters.values() or self.key_dir.tombstone_count():
+            self.filter_builder.trigger()
 
     def set(self, key: KeyType, value: ValueType, expiry: int = 0) -> None:
         """
@@ -40,46 +301,401 @@ class KVStore:
             expiry=expiry,
         )
 
-    def get(self, key: KeyType) -> str:
+    def get(self, key: KeyType) -> typing.Any:
         """
         retrive value corresponding to a given key
-            1. move the file pointer to the approprate postion
-            2. read the exact number of bytes starting from the position set
-               by the file pointer
-            3. decode the bytes and return value
+            1. look up the key in key_dir, missing, deleted and expired keys
+               are answered from there without reading the disk
+            2. read the record with a positional read at its offset
+            3. decode the bytes and return value, of the type it was set with
         args:
             key : the key to be retrived from the disk
 
-        return value corresponding to given key if it exists, else empty string
+        return value corresponding to given key if it exists, else "Key Not Found"
         """
         try:
             key: str = encode_to_str(key)
         except UnsupportedTypeError as e:
             raise UnsupportedTypeError(e.value_type, "for key in get()") from e
 
-        kv_entry = self.key_dir.get(key, None)
-        if not kv_entry:
+        ticket = None
+        if self.cache is not None:
+            value = self.cache.get(key, _NOT_CACHED)
+            if value is not _NOT_CACHED:
+                return value
+            ticket = self.cache.ticket()
+
+        kv_entry, f = self._locate(key)
+        if not kv_entry or kv_entry.deleted:
+            return "Key Not Found"
+        if kv_entry.expiry and kv_entry.expiry <= time.time():
+            # deleted, unless it was set again meanwhile
+            self._expire_keys([key])
             return "Key Not Found"
 
-        self.file.seek(kv_entry.pos, os.SEEK_SET)
-        data: bytes = self.file.read(kv_entry.size)
-        _, hdr, _, value = KVData.decode_kv(data)
+        data = self._read_at(f, kv_entry.pos, kv_entry.size)
+        return self._decode_value(key, data, ticket)
 
-        # check for TTL expirey
-        # if expired, delete it
-        if hdr.is_expired():
+    def get_many(self, keys: Iterable[KeyType]) -> dict[KeyType, typing.Any]:
+        """
+        retrive values for many keys at once
+            1. look up every key in key_dir, missing, deleted and expired
+               keys are answered from there
+            2. sort the entries by data file and position, and merge entries
+               close to each other into a single positional read
+            3. decode every value, the same way get() does
+        args:
+            keys : the keys to be retrived from the disk
+
+        returns a dict of every key and the value get() would return for it
+        """
+        result: dict[KeyType, typing.Any] = {}
+        lookups: list[tuple[KeyType, str]] = []
+        for key in keys:
+            try:
+                str_key = encode_to_str(key)
+            except UnsupportedTypeError as e:
+                raise UnsupportedTypeError(
+                    e.value_type,
+                    "for key in get_many()",
+                ) from e
+
+            if self.cache is not None:
+                value = self.cache.get(str_key, _NOT_CACHED)
+                if value is not _NOT_CACHED:
+                    result[key] = value
+                    continue
+            lookups.append((key, str_key))
+
+        ticket = self.cache.ticket() if self.cache is not None else None
+        located = self._locate_many([k for _, k in lookups])
+        found, expired = [], []
+        now = time.time()
+        for (key, str_key), (kv_entry, f) in zip(lookups, located):
+            if kv_entry is None or kv_entry.deleted:
+                result[key] = "Key Not Found"
+            elif kv_entry.expiry and kv_entry.expiry <= now:
+                result[key] = "Key Not Found"
+                expired.append(str_key)
+            else:
+                found.append((f.fileno(), kv_entry.pos, kv_entry.size, key, str_key, f))
+        self._expire_keys(expired)
+
+        # reads in offset order, neighbouring records share a read
+        found.sort(key=lambda r: (r[0], r[1]))
+        if self.use_mmap:
+            for _, pos, size, key, str_key, f in found:
+                result[key] = self._decode_value(str_key, f.view(pos, size), ticket)
+            return result
+
+        i = 0
+        while i < len(found):
+            fd, start, size = found[i][:3]
+            end = start + size
+            j = i + 1
+            while (
+                j < len(found)
+                and found[j][0] == fd
+                and found[j][1] - end <= READ_MERGE_GAP
+                and found[j][1] + found[j][2] - start <= READ_MERGE_LIMIT
+            ):
+                end = max(end, found[j][1] + found[j][2])
+                j += 1
+
+            buf = memoryview(os.pread(fd, end - start, start))
+            for _, pos, size, key, str_key, _ in found[i:j]:
+                offset = pos - start
+                result[key] = self._decode_value(
+                    str_key,
+                    buf[offset : offset + size],
+                    ticket,
+                )
+            i = j
+
+        return result
+
+    def set_stream(
+        self,
+        key: KeyType,
+        data: typing.Union[typing.BinaryIO, Iterable[bytes], bytes],
+        expiry: int = 0,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+    ) -> int:
+        """
+        stores a value read a chunk at a time, never holding more than a
+        chunk of it in memory. it is stored as bytes, as they are, and is
+        read back as bytes. see src/stream.py
+            steps involved
+            1. append the header, flagged as streaming, and the key
+            2. append the value chunk by chunk, computing its CRC
+            3. write the header again in place with the CRC and the size of
+               the value, and point key_dir to the record
+        writers wait for the whole value to be written, readers do not
+        args:
+            key        : the key
+            data       : a binary file object, an iterable of bytes-like
+                         chunks or a bytes-like object
+            expiry     : key value expiry time in seconds
+            chunk_size : bytes read from a file object at once
+
+        returns the size of the value
+        """
+        try:
+            key: str = encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in set_stream()") from e
+
+        key_bytes = key.encode("utf-8")
+        tstamp: int = int(time.time())
+        kv_header = KVHeader(
+            checksum=0,
+            timestamp=tstamp,
+            expiry=(tstamp + expiry) if expiry > 0 else expiry,
+            deleted=FLAG_STREAMING | VALUE_BYTES << TYPE_SHIFT,
+            key_sz=len(key_bytes),
+            value_sz=0,
+        )
+
+        with self._write_lock:
+            if self._needs_rotation(HEADER_SIZE + len(key_bytes)):
+                self._rotate()
+
+            start = self.write_pos
+            crc, size = 0, 0
+            try:
+                self.file.write(kv_header.encode_hdr() + key_bytes)
+                for chunk in iter_chunks(data, chunk_size):
+                    size += len(chunk)
+                    if size > MAX_VALUE_SIZE:
+                        raise ValueError(
+                            f"values are at most {MAX_VALUE_SIZE} bytes, "
+                            "in set_stream()"
+                        )
+                    crc = zlib.crc32(chunk, crc)
+                    self.file.write(chunk)
+                self.file.flush()
+
+                kv_header.checksum = crc
+                kv_header.value_sz = size
+                kv_header.deleted &= ~FLAG_STREAMING
+                fd = os.open(self._data_path(self.file_id), os.O_WRONLY)
+                try:
+                    os.pwrite(fd, kv_header.encode_hdr(), start)
+                finally:
+                    os.close(fd)
+            except BaseException:
+                # the record never made it to key_dir, cut it off again
+                self.file.truncate(start)
+                raise
+
+            sz = HEADER_SIZE + len(key_bytes) + size
+            seq = self.syncer.appended(sz)
+            self._swap_seq += 1
+            try:
+                self._point_key(key, kv_header, sz)
+            finally:
+                self._swap_seq += 1
+            if self.cache is not None:
+                self.cache.invalidate(key)
+
+        self.syncer.commit(seq)
+        return size
+
+    def open_value(
+        self, key: KeyType
+    ) -> typing.Optional[typing.Union[ValueReader, io.BytesIO]]:
+        """
+        returns a seekable binary file object over the value of key, reading
+        it from disk as it is read, or None if key has no value. the value
+        is in the bytes it is stored as: str as UTF-8, bytes as they are.
+        compressed values are decompressed into memory, set_stream() never
+        compresses. see src/stream.py
+        args:
+            key : the key
+        """
+        try:
+            key: str = encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in open_value()") from e
+
+        kv_entry, f = self._locate(key)
+        if not kv_entry or kv_entry.deleted:
+            return None
+        if kv_entry.expiry and kv_entry.expiry <= time.time():
+            self._expire_keys([key])
+            return None
+
+        hdr = KVHeader.decode(self._read_at(f, kv_entry.pos, HEADER_SIZE))
+        start = kv_entry.pos + HEADER_SIZE + hdr.key_sz
+        checksum = hdr.checksum if self._should_verify() else None
+        if hdr.codec_id():
+            stored = self._read_at(f, start, hdr.value_sz)
+            if checksum is not None and not hdr.is_valid_bytes(stored):
+                raise CorruptValueError(key)
+            return io.BytesIO(decompress(hdr.codec_id(), stored))
+        return ValueReader(key, f, start, hdr.value_sz, checksum)
+
+    def keys(self) -> list[str]:
+        """
+        returns every key with a value in sorted order. deleted and expired
+        keys are left out without reading their values
+        """
+        return list(self._live_keys(self.key_dir.sorted_keys()))
+
+    def items(self) -> typing.Iterator[tuple[str, typing.Any]]:
+        """
+        yields (key, value) of every key with a value in sorted order, see
+        scan()
+        """
+        return self.scan()
+
+    def scan(
+        self,
+        start: typing.Optional[KeyType] = None,
+        end: typing.Optional[KeyType] = None,
+    ) -> typing.Iterator[tuple[str, typing.Any]]:
+        """
+        yields (key, value) of the keys in [start, end) in sorted order
+            1. take the keys in the range from the sorted index, and leave
+               out deleted and expired keys using key_dir alone
+            2. read the values lazily, a page of keys at a time with
+               get_many(), in offset order
+        args:
+            start : first key of the range, None to start at the first key
+            end   : key the range stops before, None to go to the last key
+        """
+        try:
+            start = None if start is None else encode_to_str(start)
+            end = None if end is None else encode_to_str(end)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in scan()") from e
+
+        page: list[str] = []
+        for key in self._live_keys(self.key_dir.sorted_keys(start, end)):
+            page.append(key)
+            if len(page) == SCAN_PAGE_SIZE:
+                yield from self._read_page(page)
+                page = []
+        yield from self._read_page(page)
+
+    def prefix_scan(self, prefix: KeyType) -> typing.Iterator[tuple[str, typing.Any]]:
+        """
+        yields (key, value) of the keys starting with prefix in sorted order,
+        see scan()
+        """
+        try:
+            prefix = encode_to_str(prefix)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for prefix_scan()") from e
+        return self.scan(prefix, prefix_end(prefix))
+
+    def exists(self, key: KeyType) -> bool:
+        """
+        returns whether key has a value, from key_dir alone
+        args:
+            key : the key
+        """
+        try:
+            key: str = encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in exists()") from e
+
+        entry = self.key_dir.get(key)
+        return (
+            entry is not None
+            and not entry.deleted
+            and not 0 < entry.expiry <= time.time()
+        )
+
+    def __len__(self) -> int:
+        """
+        returns the number of keys with a value. expired keys not reaped yet
+        are counted in the expiry index, key_dir is not scanned
+        """
+        return len(self.key_dir) - self.key_dir.expiring.count_expired(int(time.time()))
+
+    def ttl(self, key: KeyType) -> int:
+        """
+        returns the seconds left before key expires, -1 if it does not
+        expire and -2 if it has no value. only key_dir is looked at
+        args:
+            key : the key
+        """
+        try:
+            key: str = encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in ttl()") from e
+
+        entry = self.key_dir.get(key)
+        now = int(time.time())
+        if entry is None or entry.deleted or 0 < entry.expiry <= now:
+            return -2
+        if entry.expiry == 0:
+            return -1
+        return entry.expiry - now
+
+    def expire(self, key: KeyType, seconds: int) -> bool:
+        """
+        sets key to expire in seconds from now, a key expiring in 0 seconds
+        or less is deleted right away. the record of key is written again
+        with the new expiry, its value is copied as stored
+        args:
+            key     : the key
+            seconds : TTL of key in seconds
+
+        returns whether key has a value
+        """
+        try:
+            key: str = encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in expire()") from e
+
+        if seconds <= 0:
+            if self.ttl(key) == -2:
+                return False
             self.delete(key)
-            return "Key Not Found"
+            return True
+        return self._set_expiry(key, int(time.time()) + seconds)
 
-        # check for deleted key:
-        if hdr.is_deleted():
-            return "Key Not Found"
+    def persist(self, key: KeyType) -> bool:
+        """
+        removes the expiry of key, see expire()
+        args:
+            key : the key
 
-        # verify CRC checksum
-        if not hdr.is_valid(value):
-            return "Invalid/corrupted"
+        returns whether key had an expiry
+        """
+        try:
+            key: str = encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, "for key in persist()") from e
 
-        return value
+        if self.ttl(key) < 0:
+            return False
+        return self._set_expiry(key, 0)
+
+    def reap_expired(self, limit: typing.Optional[int] = None) -> int:
+        """
+        deletes the keys that have expired, without reading them. they are
+        taken from the expiry index of key_dir, earliest first
+        args:
+            limit : most keys to delete, None for all of them
+
+        returns the number of keys deleted
+        """
+        now = int(time.time())
+        expired = self.key_dir.expiring.pop_expired(now, limit)
+        return self._expire_keys([key for key, _ in expired])
+
+    def scrub(self) -> list[CorruptRecord]:
+        """
+        verifies the CRC of every record of every data file, at scrub_rate
+        bytes per second at most. see src/verify.py
+
+        returns the corrupt records found, they are added to self.corrupt
+        as well
+        """
+        return self.scrubber.run_once()
 
     def delete(self, key: str) -> None:
         """
@@ -95,13 +711,128 @@ class KVStore:
             mark_delete=True,
         )
 
+    def set_many(
+        self,
+        items: typing.Union[
+            Mapping[KeyType, ValueType], Iterable[tuple[KeyType, ValueType]]
+        ],
+        expiry: int = 0,
+    ) -> None:
+        """
+        store many keys and values on disk as a single batch, with one write
+        and one fsync
+        args:
+            items  : mapping or iterable of (key, value) pairs
+            expiry : key value expiry time in seconds, for every key
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+
+        batch = self.batch()
+        for key, value in items:
+            batch.set(key, value, expiry)
+        batch.commit()
+
+    def delete_many(self, keys: Iterable[KeyType]) -> None:
+        """
+        deletes many keys as a single batch, with one write and one fsync
+        args:
+            keys : keys to be deleted
+        """
+        batch = self.batch()
+        for key in keys:
+            batch.delete(key)
+        batch.commit()
+
+    def batch(self) -> WriteBatch:
+        """
+        returns a WriteBatch to apply several sets and deletes as a unit
+        """
+        return WriteBatch(self)
+
+    def sync(self) -> None:
+        """
+        persists every write made so far to the disk, regardless of the
+        sync mode
+        """
+        self.syncer.sync()
+
+    def compact(self, wait: bool = True) -> list[CompactionStats]:
+        """
+        compacts every data file with dead bytes while the store keeps
+        serving reads and writes. with a data directory only the immutable
+        data files are compacted.
+        args:
+            wait : compact in the calling thread, otherwise hand it over to
+                   the background compactor and return right away
+
+        returns the stats of every compacted data file, empty if not waiting
+        """
+        if not wait:
+            self.compactor.trigger()
+            return []
+        return self.compactor.run_once(force=True)
+
     def close(self) -> None:
+        # a compaction in flight is aborted, the data files are left as
+        # they were before it started
+        self.compactor.stop()
+        self.reaper.stop()
+        self.scrubber.stop()
+        self.filter_builder.stop()
+
         self.file.flush()
-        fsync(self.file.fileno())
+        self.syncer.close()
         self.file.close()
 
-        # run compaction to remove deleted/expired keys
-        shrink(self.filename)
+        for reader in self.readers.values():
+            reader.close()
+        self.readers.clear()
+        for m in self.maps.values():
+            m.close()
+        self.maps.clear()
+
+        # a clean shutdown leaves hint files behind for a fast restart,
+        # immutable data files already got theirs when they were rotated
+        for file_id in self._list_file_ids():
+            if file_id == self.file_id or not path.exists(
+                hint_path(self._data_path(file_id))
+            ):
+                self._write_hint(file_id)
+
+        # run compaction to remove deleted/expired keys. a tombstone can
+        # shadow a value in an older data file, so data directories are left
+        # to the background compactor
+        if self.compact_on_close and self.data_dir is None:
+            shrink(
+                self.filename,
+                key_dir=self.key_dir,
+                verify=self.verify != VERIFY_NEVER,
+            )
+
+    def _live_keys(self, keys: Iterable[str]) -> typing.Iterator[str]:
+        """
+        yields the keys that have a value, according to their key_dir entry
+        """
+        now = int(time.time())
+        for key in keys:
+            entry = self.key_dir.get(key)
+            if entry is not None and not entry.deleted and not 0 < entry.expiry <= now:
+                yield key
+
+    def _read_page(self, keys: list[str]) -> typing.Iterator[tuple[str, typing.Any]]:
+        """
+        reads the values of keys with get_many() and yields them in the
+        order of keys. keys deleted since they were listed are left out
+        """
+        if not keys:
+            return
+        values = self.get_many(keys)
+        for key in keys:
+            value = values[key]
+            if value == "Key Not Found" and next(self._live_keys([key]), None) is None:
+                continue
+            yield key, value
 
     def _set_key(
         self,
@@ -114,6 +845,23 @@ class KVStore:
         set a value for key, persist to disk. when a key is deleted,
         a tombstone value is written by calling this function
         """
+        self.write_records([self.encode_record(key, val, expiry, mark_delete)])
+
+    def encode_record(
+        self,
+        key: KeyType,
+        val: ValueType,
+        expiry: int = 0,
+        mark_delete: bool = False,
+    ) -> tuple[str, KVHeader, int, bytes]:
+        """
+        encodes a key and value into a record ready to be written with
+        write_records(). it takes no lock and writes nothing, wrappers
+        encode records where they like and write them later, see
+        src/batch.py and src/async_store.py
+
+        returns a tuple of key, header, size of the record and the record
+        """
         try:
             key: str = encode_to_str(key)
         except UnsupportedTypeError as e:
@@ -122,8 +870,9 @@ class KVStore:
                 "for key in _set_key()",
             ) from e
 
+        # the value is encoded once, into bytes tagged with its type
         try:
-            val: str = encode_to_str(val)
+            type_tag, stored = encode_value(val, self.serializer)
         except UnsupportedTypeError as e:
             raise UnsupportedTypeError(
                 e.value_type,
@@ -132,68 +881,634 @@ class KVStore:
 
         tstamp: int = int(time.time())
         expiry_tstmap: int = (tstamp + expiry) if expiry > 0 else expiry
-        crc32_checksum: int = zlib.crc32(str(val).encode("utf-8"))
 
+        # values are compressed as configured, tombstones never are. the CRC
+        # covers the value bytes as stored
+        flags = (FLAG_DELETED if mark_delete else 0) | type_tag << TYPE_SHIFT
+        if not mark_delete:
+            codec_id, stored = compress(stored, self.codec, self.compression_threshold)
+            flags |= codec_id << CODEC_SHIFT
+        crc32_checksum: int = zlib.crc32(stored)
+
+        key_bytes = key.encode("utf-8")
         kv_header = KVHeader(
             checksum=crc32_checksum,
             timestamp=tstamp,
             expiry=expiry_tstmap,
-            deleted=1 if mark_delete else 0,
-            key_sz=len(str(key)),
-            value_sz=len(str(val)),
+            deleted=flags,
+            key_sz=len(key_bytes),
+            value_sz=len(stored),
         )
 
-        sz, data = KVData(header=kv_header, key=key, value=val).encode_kv()
-        self._write(data)
-        kv_entry: KVEntry = KVEntry(
-            timestamp=tstamp,
+        sz, data = KVData(header=kv_header, key=key_bytes, value=stored).encode_kv()
+        return key, kv_header, sz, data
+
+    def write_records(
+        self,
+        records: list[tuple[str, KVHeader, int, bytes]],
+        guard: typing.Optional[
+            typing.Callable[[typing.Optional[KVEntry]], bool]
+        ] = None,
+    ) -> int:
+        """
+        appends encoded records to the active data file with a single write
+        and a single durability barrier, and points key_dir to them. more
+        than one record are written as a batch: every record but the last is
+        flagged, so that recovery applies the batch as a unit.
+
+        with a guard, a record is only written if guard() accepts the
+        key_dir entry of its key, checked with the write lock held
+
+        returns the number of records written
+        """
+        if not records:
+            return 0
+
+        if guard is None:
+            data = self._join_records(records)
+
+        with self._write_lock:
+            if guard is not None:
+                records = [r for r in records if guard(self.key_dir.get(r[0]))]
+                if not records:
+                    return 0
+                data = self._join_records(records)
+
+            if self._needs_rotation(len(data)):
+                self._rotate()
+
+            seq = self._write(data)
+
+            # readers retry lookups while a batch is applied, see _locate()
+            self._swap_seq += 1
+            try:
+                for key, kv_header, sz, _ in records:
+                    self._point_key(key, kv_header, sz)
+            finally:
+                self._swap_seq += 1
+
+            # only once key_dir points to the new records, so that a reader
+            # caching the old value is either refused or invalidated
+            if self.cache is not None:
+                for key, _, _, _ in records:
+                    self.cache.invalidate(key)
+
+        # wait for durability outside the lock so that concurrent writers
+        # can share a single fsync
+        self.syncer.commit(seq)
+        return len(records)
+
+    def _point_key(self, key: str, kv_header: KVHeader, sz: int) -> None:
+        """
+        points the key_dir entry of key to the record of sz bytes just
+        written at write_pos, and moves write_pos past it. the caller must
+        hold the write lock
+        """
+        deleted = kv_header.is_deleted()
+        self._track_dead(self.key_dir.get(key), sz if deleted else 0)
+        self.key_dir.put(
+            key,
+            timestamp=kv_header.timestamp,
             pos=self.write_pos,
             size=sz,
+            expiry=kv_header.expiry,
+            deleted=int(deleted),
+            file_id=self.file_id,
         )
-        self.key_dir[key] = kv_entry
+        if (
+            deleted
+            and self.key_dir.keep_tombstones
+            and not self._shadows(key, self.file_id)
+        ):
+            self.key_dir.pop(key)
         self.write_pos += sz
 
-    def _write(self, data: bytes) -> None:
+    def _join_records(
+        self, records: list[tuple[str, KVHeader, int, bytes]]
+    ) -> typing.Union[bytes, bytearray]:
+        """
+        returns the bytes of records written one after the other, flagged as
+        a batch if there are more than one
+        """
+        if len(records) == 1:
+            return records[0][3]
+
+        data = bytearray(b"".join(r[3] for r in records))
+        offset = 0
+        for _, _, sz, _ in records[:-1]:
+            data[offset + FLAGS_OFFSET] |= FLAG_BATCH
+            offset += sz
+        return data
+
+    def _expire_keys(self, keys: list[str]) -> int:
         """
-        writes bytes of data to the file and flush it to os buffer
-        call fsync to persist the data to the disk
+        writes tombstones for keys whose value has expired. a key set again
+        meanwhile is left alone
+
+        returns the number of keys deleted
+        """
+        if not keys:
+            return 0
+
+        now = int(time.time())
+        records = [self.encode_record(key, TOMBSTONE, mark_delete=True) for key in keys]
+        return self.write_records(
+            records,
+            guard=lambda e: e is not None and not e.deleted and 0 < e.expiry <= now,
+        )
+
+    def _set_expiry(self, key: str, expiry: int) -> bool:
+        """
+        writes the record of key again with a new expiry timestamp, the
+        value bytes are copied as they are stored
+
+        returns whether key has a value
+        """
+        while True:
+            kv_entry, f = self._locate(key)
+            now = int(time.time())
+            if kv_entry is None or kv_entry.deleted or 0 < kv_entry.expiry <= now:
+                return False
+
+            data = bytes(self._read_at(f, kv_entry.pos, kv_entry.size))
+            hdr = KVHeader.decode(data)
+            hdr.timestamp = now
+            hdr.expiry = expiry
+            hdr.deleted &= ~FLAG_BATCH
+            record = (key, hdr, kv_entry.size, hdr.encode_hdr() + data[HEADER_SIZE:])
+
+            # retried if the key was written or its record moved meanwhile
+            file_id, pos = kv_entry.file_id, kv_entry.pos
+            if self.write_records(
+                [record],
+                guard=lambda e: e is not None and e.file_id == file_id and e.pos == pos,
+            ):
+                return True
+
+    def _write(self, data: bytes) -> int:
+        """
+        writes bytes of data to the file and flush it to os buffer. the
+        syncer decides when the data is persisted to the disk
+
+        returns the sequence number of the write, see Syncer.commit()
         """
         self.file.write(data)
         self.file.flush()
-        fsync(self.file.fileno())
+        return self.syncer.appended(len(data))
 
-    def _init_key_dir(self) -> None:
+    def _track_dead(self, old: typing.Optional[KVEntry], tombstone_sz: int) -> None:
+        """
+        accounts for the record a write makes dead, and for the tombstone
+        written by a delete. the caller must hold the write lock
+        """
+        if old is not None and not old.deleted:
+            self.dead_bytes[old.file_id] = (
+                self.dead_bytes.get(old.file_id, 0) + old.size
+            )
+        if tombstone_sz:
+            self.dead_bytes[self.file_id] = (
+                self.dead_bytes.get(self.file_id, 0) + tombstone_sz
+            )
+
+    def _decode_value(
+        self, key: str, data: bytes, cache_ticket: typing.Optional[int] = None
+    ) -> typing.Any:
+        """
+        decodes a record read from disk and returns the value of key, or why
+        there is no value. a valid value is put in the cache when a cache
+        ticket is given
+        """
+        data = memoryview(data)
+        hdr = KVHeader.decode(data)
+
+        # check for TTL expirey
+        # if expired, delete it, unless it was set again meanwhile
+        if hdr.is_expired():
+            self._expire_keys([key])
+            return "Key Not Found"
+
+        # check for deleted key:
+        if hdr.is_deleted():
+            return "Key Not Found"
+
+        # verify CRC checksum against the value bytes read from disk, before
+        # they are decompressed, on the reads the verify mode asks for
+        stored = data[HEADER_SIZE + hdr.key_sz :]
+        if self._should_verify() and not hdr.is_valid_bytes(stored):
+            return "Invalid/corrupted"
+
+        value = KVData.decode_value(hdr, stored, self.serializer)
+        if cache_ticket is not None:
+            self.cache.put(key, value, hdr.expiry, len(data), cache_ticket)
+        return value
+
+    def _should_verify(self) -> bool:
+        """
+        whether the read being served checks the CRC, see src/verify.py
+        """
+        every = self._verify_every
+        return every == 1 or every > 1 and next(self._reads) % every == 0
+
+    def _locate_many(
+        self, keys: list[str]
+    ) -> list[tuple[typing.Optional[KVEntry], typing.Optional[typing.BinaryIO]]]:
+        """
+        looks up many keys at once, see _locate(). all the entries come from
+        the same key_dir state, a batch is either seen as a whole or not at all
         """
-        loads the key_dir by reading the data files
+        while True:
+            seq = self._swap_seq
+            if seq & 1:
+                time.sleep(0)
+                continue
+
+            located = []
+            for key in keys:
+                kv_entry = self.key_dir.get(key, None)
+                f = self._handle(kv_entry.file_id) if kv_entry else None
+                located.append((kv_entry, f))
+            if seq == self._swap_seq:
+                return located
+
+    def _locate(
+        self, key: str
+    ) -> tuple[typing.Optional[KVEntry], typing.Optional[typing.BinaryIO]]:
+        """
+        looks up a key and the handle of the data file holding it. the pair
+        is consistent even if a compaction or a rotation swaps the data file
+        at the same time: the lookup is retried if a swap happened meanwhile.
+        replaced handles are not closed, so a handle returned here stays
+        readable after a swap.
+        """
+        while True:
+            seq = self._swap_seq
+            if seq & 1:
+                time.sleep(0)
+                continue
+
+            kv_entry = self.key_dir.get(key, None)
+            f = self._handle(kv_entry.file_id) if kv_entry else None
+            if seq == self._swap_seq:
+                return kv_entry, f
+
+    def _read_at(
+        self,
+        f: typing.Union[typing.BinaryIO, MappedFile],
+        pos: int,
+        size: int,
+    ) -> typing.Union[bytes, memoryview]:
+        """
+        reads size bytes at offset pos through a handle from _handle(). a
+        positional read does not move a shared file offset, concurrent reads
+        of the same handle do not interfere
+        """
+        if self.use_mmap:
+            return f.view(pos, size)
+        return os.pread(f.fileno(), size, pos)
+
+    def _handle(self, file_id: int) -> typing.Union[typing.BinaryIO, MappedFile]:
+        """
+        returns the handle to read a data file with. with use_mmap that is
+        the memory map of the data file, otherwise a read-only handle of its
+        own, the active file included. the append handle is only used by the
+        writer
+        """
+        if self.use_mmap:
+            m = self.maps.get(file_id)
+            if m is None:
+                m = self.maps.setdefault(
+                    file_id,
+                    MappedFile(self._data_path(file_id)),
+                )
+            return m
+
+        f = self.readers.get(file_id)
+        if f is None:
+            f = self.readers.setdefault(file_id, self._open_reader(file_id))
+        return f
+
+    def _open_reader(self, file_id: int) -> typing.BinaryIO:
+        # unbuffered, every read is a pread of the descriptor
+        return open(self._data_path(file_id), "rb", buffering=0)
+
+    def _compactable_files(self) -> list[tuple[int, int]]:
+        """
+        returns (file id, size) of the data files that can be compacted. with
+        a data directory the active file is left alone
+        """
+        if self.data_dir is None:
+            return [(self.file_id, self.write_pos)]
+        return [
+            (file_id, path.getsize(self._data_path(file_id)))
+            for file_id in self._list_file_ids()
+            if file_id != self.file_id
+        ]
+
+    def _compact_file(
+        self,
+        file_id: int,
+        cancel: typing.Optional[threading.Event] = None,
+        progress: typing.Optional[typing.Callable[[int], None]] = None,
+    ) -> CompactionStats:
+        """
+        compacts a data file while the store stays online
             steps involved
-            1. flush to persist leftover data in buffers
-            2. Load key_dir
+            1. take a snapshot of the key_dir entries living in the file
+            2. copy them to a new file without holding the write lock
+            3. with the write lock held, copy the records appended to the
+               active file in the meantime, swap the new file in and point
+               the key_dir entries that did not change to their new position
+
+        tombstones and expired records are dropped only from the oldest data
+        file, elsewhere they may shadow a value in an older data file.
         """
-        print("initialing database...")
+        start = time.perf_counter()
+        data_path = self._data_path(file_id)
+        target = data_path + "_kompact"
 
-        with open(self.filename, "a+b") as f:
-            # flushing buffers before reload to persit leftover data in buffers
-            f.flush()
-            fsync(f.fileno())
-            # reset position back to zero
-            f.seek(0)
+        with self._write_lock:
+            active = file_id == self.file_id
+            end = self.write_pos if active else path.getsize(data_path)
+            oldest = file_id == self._list_file_ids()[0]
+            dead_at_snapshot = self.dead_bytes.get(file_id, 0)
+            records = list(self.key_dir.records(file_id))
+
+        dropped = []
+        if oldest:
+            now = int(time.time())
+            dropped = [r for r in records if r[2] or 0 < r[1] <= now]
+            records = [r for r in records if not (r[2] or 0 < r[1] <= now)]
+        records.sort(key=lambda r: r[3])
+        kept_dead = sum(r[4] for r in records if r[2])
+
+        corrupt: typing.Optional[list[int]] = None
+        if self.verify != VERIFY_NEVER:
+            corrupt = []
+        try:
+            moved, bytes_after = copy_records(
+                data_path,
+                target,
+                records,
+                cancel=cancel,
+                progress=progress,
+                corrupt=corrupt,
+            )
+        except BaseException:
+            if path.exists(target):
+                os.remove(target)
+            raise
+        if corrupt:
+            keys = {r[3]: r[5] for r in records}
+            for offset in corrupt:
+                print(f"corrupt record at offset {offset} of {data_path}")
+                self.corrupt.append(
+                    CorruptRecord(data_path, offset, keys[offset].encode("utf-8"))
+                )
+
+        with self._write_lock:
+            self._swap_seq += 1
+            try:
+                tail = []
+                if active:
+                    tail = append_tail(data_path, target, end, self.write_pos)
+
+                # the hint and the filter of the data file are stale once it
+                # is rewritten
+                remove_hint(data_path)
+                remove_bloom(data_path)
+                os.replace(target, data_path)
+                fsync_dir(path.dirname(data_path))
+
+                # replaced handles are left for the garbage collector, a
+                # reader may still hold them
+                if active:
+                    new_file = open(data_path, "ab")
+                    self.syncer.rotate(new_file)
+                    self.file = new_file
+                    self.write_pos = bytes_after + (self.write_pos - end)
+                self.readers[file_id] = self._open_reader(file_id)
+                if self.use_mmap:
+                    self.maps[file_id] = MappedFile(data_path)
 
-            while hdr_bytes := f.read(HEADER_SIZE):
-                chksm, tstamp, expiry, deleted, ksz, vsz = KVHeader.decode_hdr(
-                    hdr_bytes,
+                for old, new in zip(records, moved):
+                    self._rebase(old[5], file_id, old[3], new[3])
+                for _, _, _, pos, _, key in dropped:
+                    e = self.key_dir.find(key)
+                    if e is not None and e.file_id == file_id and e.pos == pos:
+                        del self.key_dir[key]
+                        if self.cache is not None:
+                            self.cache.invalidate(key)
+                for key, pos, _ in tail:
+                    self._rebase(key, file_id, pos, pos - end + bytes_after)
+
+                self.dead_bytes[file_id] = (
+                    self.dead_bytes.get(file_id, 0) - dead_at_snapshot + kept_dead
                 )
+            finally:
+                self._swap_seq += 1
 
-                key_bytes = f.read(ksz)
-                key = key_bytes.decode("utf-8")
+        if not active:
+            write_hint(data_path, moved, bytes_after)
+            if file_id in self.filters:
+                write_bloom(
+                    data_path,
+                    [r[5].encode("utf-8") for r in moved],
+                    bytes_after,
+                )
+                self.filters[file_id] = load_bloom(data_path)
 
-                # advance seek position by vsz position so that we are reading
-                # the next correct KV entry
-                f.seek(vsz, os.SEEK_CUR)
+        return CompactionStats(
+            end,
+            bytes_after,
+            len(moved),
+            time.perf_counter() - start,
+        )
+
+    def _rebase(self, key: str, file_id: int, old_pos: int, new_pos: int) -> None:
+        """
+        points the key_dir entry of key to new_pos, unless it was updated
+        since it was found at old_pos. the caller must hold the write lock
+        """
+        e = self.key_dir.find(key)
+        if e is not None and e.file_id == file_id and e.pos == old_pos:
+            self.key_dir.put(
+                key, e.timestamp, new_pos, e.size, e.expiry, e.deleted, file_id
+            )
 
-                total_size = HEADER_SIZE + ksz + vsz
-                kv_entry = KVEntry(tstamp, self.write_pos, total_size)
+    def _shadows(self, key: str, file_id: int) -> bool:
+        """
+        returns whether a data file older than file_id may hold a record of
+        key, which a tombstone of key in file_id has to shadow
+        """
+        hashes = bloom_hash(key.encode("utf-8"))
+        for other, bloom in list(self.filters.items()):
+            if other < file_id and (bloom is None or bloom.contains_hash(hashes)):
+                return True
+        return False
+
+    def _build_filters(self, stop: threading.Event) -> None:
+        """
+        builds the missing bloom filters of the immutable data files, then
+        drops the tombstones that no older data file needs. runs on the
+        filter builder thread, see src/bloom.py
+        """
+        for file_id, bloom in list(self.filters.items()):
+            if stop.is_set():
+                return
+            if bloom is not None:
+                continue
+
+            # a compaction rewrites the data file and writes its filter
+            with self.compactor.paused():
+                data_path = self._data_path(file_id)
+                write_bloom(data_path, file_keys(data_path), path.getsize(data_path))
+                self.filters[file_id] = load_bloom(data_path)
+
+        with self._write_lock:
+            tombstones = self.key_dir.tombstones()
+        unneeded = [t for t in tombstones if not self._shadows(t[0], t[1])]
+
+        # a tombstone is only dropped if it was not replaced meanwhile
+        with self._write_lock:
+            self._swap_seq += 1
+            try:
+                for key, file_id, pos in unneeded:
+                    e = self.key_dir.find(key)
+                    if (
+                        e is not None
+                        and e.deleted
+                        and (e.file_id, e.pos) == (file_id, pos)
+                    ):
+                        self.key_dir.pop(key)
+            finally:
+                self._swap_seq += 1
+
+    def _scrub_targets(self) -> typing.Iterator[tuple[str, typing.Optional[int]]]:
+        """
+        yields the data files to scrub and where to stop in each, the write
+        position for the active file and the end of the file for the others
+        """
+        for file_id in self._list_file_ids():
+            with self._write_lock:
+                end = self.write_pos if file_id == self.file_id else None
+            yield self._data_path(file_id), end
+
+    def _data_path(self, file_id: int) -> str:
+        if self.data_dir is None:
+            return self.filename
+        return path.join(self.data_dir, f"{file_id:09d}{DATA_FILE_SUFFIX}")
+
+    def _list_file_ids(self) -> list[int]:
+        """
+        returns the ids of the existing data files in ascending order
+        """
+        if self.data_dir is None:
+            return [0] if path.exists(self.filename) else []
+
+        file_ids = []
+        for name in os.listdir(self.data_dir):
+            stem, ext = path.splitext(name)
+            if ext == DATA_FILE_SUFFIX and stem.isdigit():
+                file_ids.append(int(stem))
+        return sorted(file_ids)
+
+    def _needs_rotation(self, sz: int) -> bool:
+        return (
+            self.data_dir is not None
+            and self.write_pos > 0
+            and self.write_pos + sz > self.max_file_size
+        )
+
+    def _rotate(self) -> None:
+        """
+        seals the active data file and starts a new one. the sealed file is
+        never written to again, it gets its hint file right away.
+        the caller must hold the write lock
+        """
+        new_file = open(self._data_path(self.file_id + 1), "ab")
+        # the records written to the new file are lost in a crash unless
+        # the directory entry of the file is durable
+        fsync_dir(self.data_dir)
+        self.syncer.rotate(new_file)
+
+        # the old append handle is left for the garbage collector, a reader
+        # may still hold it
+        old_id = self.file_id
+        self._swap_seq += 1
+        self.file, self.file_id, self.write_pos = new_file, self.file_id + 1, 0
+        self._swap_seq += 1
+
+        self._write_hint(old_id)
+
+        # the sealed file is scanned for its filter in the background
+        self.filters[old_id] = None
+        self.filter_builder.trigger()
+
+    def _write_hint(self, file_id: int) -> None:
+        """
+        writes a hint file describing every key in key_dir that lives in the
+        given data file
+        """
+        data_path = self._data_path(file_id)
+        write_hint(
+            data_path,
+            self.key_dir.records(file_id),
+            self.write_pos if file_id == self.file_id else path.getsize(data_path),
+        )
+
+    def _init_key_dir(self, file_ids: list[int]) -> None:
+        """
+        loads the key_dir from the data files, see src/recovery.py
+            steps involved
+            1. load every data file, from its hint file if there is a valid
+               one and by scanning the rest of it. with recovery_workers > 1
+               the files are loaded in parallel by a pool of processes
+            2. merge the entries oldest file first, so that newer entries
+               replace older ones
+            3. truncate a write cut short by a crash, or a corrupt record,
+               and everything after it from the end of a data file. a batch
+               cut short is discarded as a whole
+
+        the newest data file becomes the active file
+        """
+        print("initialing database...")
+
+        sizes = {}
+        loaded = load_data_files(
+            [self._data_path(file_id) for file_id in file_ids],
+            workers=self.recovery_workers,
+        )
+        for file_id, (entries, size, valid_sz, reason) in zip(file_ids, loaded):
+            put = self.key_dir.put
+            for tstamp, expiry, deleted, pos, sz, key in entries:
+                put(key, tstamp, pos, sz, expiry, deleted, file_id)
+
+            if valid_sz < size:
+                self._truncate(file_id, size, valid_sz, reason)
+            self.file_id = file_id
+            self.write_pos = sizes[file_id] = valid_sz
+
+        # everything not pointed to by a live key_dir entry is dead
+        live = self.key_dir.live_bytes()
+        self.dead_bytes = {
+            file_id: sizes[file_id] - live.get(file_id, 0) for file_id in file_ids
+        }
 
-                self.key_dir[key] = kv_entry
-                self.write_pos += total_size
-                # print(f"kv init for key-{key} complete..")
         print("db initialization comeplete, ready to use!\n")
+
+    def _truncate(self, file_id: int, size: int, valid_sz: int, reason: str) -> None:
+        """
+        discards a torn or corrupt tail from the end of a data file, and
+        records it in self.discarded
+        """
+        data_path = self._data_path(file_id)
+        print(
+            f"discarding {size - valid_sz} bytes at offset {valid_sz} "
+            f"of {data_path}, {reason}"
+        )
+        with open(data_path, "r+b") as f:
+            f.truncate(valid_sz)
+            fsync(f.fileno())
+        self.discarded.append(
+            DiscardedTail(data_path, valid_sz, size - valid_sz, reason)
+        )
@@ -0,0 +1,189 @@
+import os
+import threading
+from os import fsync
+
+"""
+durability policies for the append-only data file.
+
+every write is handed to the os (flushed out of python's buffers) right away
+so that it is visible to readers, but when the data actually reaches the disk
+is decided by the sync mode
+
+    always   : every write waits for an fsync before returning. concurrent
+               writers waiting at the same time share a single fsync
+               (group commit)
+    interval : a background thread fsyncs every `interval_ms` milliseconds
+    batch    : fsync once every `batch_records` writes or `batch_bytes` bytes
+    none     : never fsync explicitly, the os decides when to write back
+
+"""
+
+SYNC_ALWAYS = "always"
+SYNC_INTERVAL = "interval"
+SYNC_BATCH = "batch"
+SYNC_NONE = "none"
+
+SYNC_MODES = (SYNC_ALWAYS, SYNC_INTERVAL, SYNC_BATCH, SYNC_NONE)
+
+
+class Syncer:
+    """
+    Syncer keeps track of what has been written to the data file and what has
+    been persisted to the disk, and issues fsync calls according to the
+    sync mode.
+
+    writes are numbered with a sequence number, `appended()` is called right
+    after the bytes are handed to the os and `commit()` is called once the
+    writer is ready to wait for durability.
+
+    args:
+        file          : file object of the active data file
+        mode          : one of SYNC_MODES
+        interval_ms   : fsync interval for SYNC_INTERVAL
+        batch_records : number of writes between fsyncs for SYNC_BATCH
+        batch_bytes   : number of bytes between fsyncs for SYNC_BATCH
+    """
+
+    def __init__(
+        self,
+        file,
+        mode: str = SYNC_ALWAYS,
+        interval_ms: int = 1000,
+        batch_records: int = 1000,
+        batch_bytes: int = 1 << 20,
+    ):
+        if mode not in SYNC_MODES:
+            raise ValueError(
+                f"invalid sync mode: {mode!r}, expected one of {SYNC_MODES}"
+            )
+
+        self.file = file
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.batch_records = batch_records
+        self.batch_bytes = batch_bytes
+
+        # number of fsync calls issued, useful to see group commit at work
+        self.sync_count: int = 0
+
+        self._cond = threading.Condition()
+        self._syncing: bool = False
+        self._written: int = 0
+        self._written_bytes: int = 0
+        self._synced: int = 0
+        self._synced_bytes: int = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+        if mode == SYNC_INTERVAL:
+            self._thread = threading.Thread(
+                target=self._run_interval,
+                name="pyk-syncer",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def appended(self, nbytes: int) -> int:
+        """
+        registers a write of nbytes that has already been handed to the os
+
+        returns the sequence number of the write, to be passed to commit()
+        """
+        with self._cond:
+            self._written += 1
+            self._written_bytes += nbytes
+            return self._written
+
+    def commit(self, seq: int) -> None:
+        """
+        applies the sync mode for the write with sequence number seq. blocks
+        until the write is on disk if the mode requires it
+        """
+        if self.mode == SYNC_ALWAYS:
+            self._sync_upto(seq)
+        elif self.mode == SYNC_BATCH:
+            with self._cond:
+                due = (
+                    self._written - self._synced >= self.batch_records
+                    or self._written_bytes - self._synced_bytes >= self.batch_bytes
+                )
+            if due:
+                self._sync_upto(seq)
+
+    def sync(self) -> None:
+        """
+        persists every write registered so far, regardless of the sync mode
+        """
+        with self._cond:
+            seq = self._written
+        self._sync_upto(seq)
+
+    def rotate(self, file) -> None:
+        """
+        persists every write to the current file and switches to a new
+        active file. the caller must hold the store's write lock
+        """
+        self.sync()
+        with self._cond:
+            self.file = file
+
+    def close(self) -> None:
+        """
+        stops the background thread, if any, and persists pending writes
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sync()
+
+    def _sync_upto(self, seq: int) -> None:
+        """
+        group commit: blocks until every write up to seq is on disk. only one
+        thread runs fsync at a time, the others wait for it and return
+        without an fsync of their own if it covered their write.
+        """
+        with self._cond:
+            while self._synced < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+
+                self._syncing = True
+                target, target_bytes = self._written, self._written_bytes
+                fileno = self.file.fileno()
+
+                self._cond.release()
+                try:
+                    fsync(fileno)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+
+                self.sync_count += 1
+                self._synced = max(self._synced, target)
+                self._synced_bytes = max(self._synced_bytes, target_bytes)
+
+    def _run_interval(self) -> None:
+        while not self._stop.wait(self.interval_ms / 1000):
+            with self._cond:
+                seq = self._written
+            if seq > self._synced:
+                self._sync_upto(seq)
+
+
+def fsync_dir(dirname: str) -> None:
+    """
+    fsyncs a directory, so that files created, renamed or replaced in it
+    survive a crash. os.replace() alone is atomic but not durable, after a
+    power loss the directory may still name the old file
+    """
+    if os.name == "nt":
+        # directories can not be opened, NTFS journals renames itself
+        return
+    fd = os.open(dirname or ".", os.O_RDONLY)
+    try:
+        fsync(fd)
+    finally:
+        os.close(fd)
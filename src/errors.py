@@ -10,3 +10,77 @@ class UnsupportedTypeError(ValueError):
             message += f" {self.context}"
 
         return message
+
+    def __reduce__(self):
+        # errors cross process boundaries, see src/sharded.py
+        return type(self), (self.value_type, self.context)
+
+
+class CompactionAbortedError(Exception):
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        super().__init__(self.__str__())
+
+    def __str__(self) -> str:
+        return f"compaction of {self.filename} was aborted"
+
+    def __reduce__(self):
+        return type(self), (self.filename,)
+
+
+class UnsupportedCodecError(ValueError):
+    def __init__(self, codec: str) -> None:
+        self.codec = codec
+        super().__init__(self.__str__())
+
+    def __str__(self) -> str:
+        return f"unsupported compression codec: {self.codec}"
+
+    def __reduce__(self):
+        return type(self), (self.codec,)
+
+
+class MissingSerializerError(ValueError):
+    def __str__(self) -> str:
+        return "the value was written with a serializer, none is configured"
+
+
+class ShardCountError(ValueError):
+    def __init__(self, directory: str, found: int, requested: int) -> None:
+        self.directory = directory
+        self.found = found
+        self.requested = requested
+        super().__init__(self.__str__())
+
+    def __str__(self) -> str:
+        return (
+            f"{self.directory} holds {self.found} shards, it can not be opened "
+            f"with {self.requested}"
+        )
+
+    def __reduce__(self):
+        return type(self), (self.directory, self.found, self.requested)
+
+
+class ProtocolError(ValueError):
+    """
+    raised for bytes that are not a valid RESP message, see src/resp.py
+    """
+
+
+class ResponseError(Exception):
+    """
+    raised by KVClient for an error reply of the server
+    """
+
+
+class CorruptValueError(ValueError):
+    def __init__(self, key: str) -> None:
+        self.key = key
+        super().__init__(self.__str__())
+
+    def __str__(self) -> str:
+        return f"the value of {self.key} does not match its CRC"
+
+    def __reduce__(self):
+        return type(self), (self.key,)
@@ -0,0 +1,199 @@
+import heapq
+import threading
+import time
+import typing
+
+"""
+expiry of keys set with a TTL.
+
+the expiry of a key is the expiry timestamp of its record header, a get()
+of an expired key finds out on its own. keys nobody reads would stay in
+key_dir and on disk until the next compaction, so key_dir also keeps an
+ExpiryIndex: a min-heap of (expiry, key) of the keys that expire. the keys
+due at any time are at the top of the heap, the Reaper pops them in bounded
+batches and writes their tombstones, no scan of key_dir is needed.
+
+a key updated or deleted before it expires leaves a stale heap entry
+behind. the current expiry of every key is kept in a dict as well, stale
+entries are skipped when they reach the top of the heap and the heap is
+rebuilt once they outnumber the live ones.
+"""
+
+# the heap is rebuilt once it holds this many stale entries more than live
+# ones
+_REBUILD_SLACK: typing.Final[int] = 1024
+
+
+class ExpiryIndex:
+    """
+    ExpiryIndex orders the keys that expire by their expiry timestamp. it is
+    safe to use from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: list[tuple[int, str]] = []
+        # current expiry of every key in the index
+        self._deadlines: dict[str, int] = {}
+
+    def add(self, key: str, expiry: int) -> None:
+        """
+        sets the expiry timestamp of key
+        """
+        with self._lock:
+            if self._deadlines.get(key) == expiry:
+                return
+            self._deadlines[key] = expiry
+            heapq.heappush(self._heap, (expiry, key))
+            self._maybe_rebuild()
+
+    def discard(self, key: str) -> None:
+        """
+        removes key from the index, if it is there
+        """
+        # most keys never expire, they skip the lock
+        if key not in self._deadlines:
+            return
+        with self._lock:
+            self._deadlines.pop(key, None)
+            self._maybe_rebuild()
+
+    def deadline(self, key: str) -> typing.Optional[int]:
+        """
+        returns the expiry timestamp of key, None if it does not expire
+        """
+        return self._deadlines.get(key)
+
+    def next_expiry(self) -> typing.Optional[int]:
+        """
+        returns the earliest expiry timestamp in the index, None if it is
+        empty
+        """
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_expired(
+        self, now: int, limit: typing.Optional[int] = None
+    ) -> list[tuple[str, int]]:
+        """
+        removes the keys expiring at or before now from the index, at most
+        limit of them, earliest first
+
+        returns (key, expiry) of every removed key
+        """
+        expired = []
+        with self._lock:
+            heap, deadlines = self._heap, self._deadlines
+            while heap and heap[0][0] <= now:
+                if limit is not None and len(expired) >= limit:
+                    break
+                expiry, key = heapq.heappop(heap)
+                if deadlines.get(key) == expiry:
+                    del deadlines[key]
+                    expired.append((key, expiry))
+        return expired
+
+    def count_expired(self, now: int) -> int:
+        """
+        returns the number of keys expiring at or before now, without
+        removing them. only the part of the heap holding them is visited
+        """
+        counted: set[str] = set()
+        with self._lock:
+            heap, deadlines = self._heap, self._deadlines
+            stack = [0] if heap else []
+            while stack:
+                i = stack.pop()
+                expiry, key = heap[i]
+                if expiry > now:
+                    continue
+                if deadlines.get(key) == expiry:
+                    counted.add(key)
+                stack.extend(c for c in (2 * i + 1, 2 * i + 2) if c < len(heap))
+        return len(counted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap, self._deadlines = [], {}
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._deadlines
+
+    def _drop_stale(self) -> None:
+        heap, deadlines = self._heap, self._deadlines
+        while heap and deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def _maybe_rebuild(self) -> None:
+        if len(self._heap) > 2 * len(self._deadlines) + _REBUILD_SLACK:
+            self._heap = [(expiry, key) for key, expiry in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+
+class Reaper:
+    """
+    Reaper deletes expired keys of a KVStore on a background thread. every
+    interval seconds it reaps the keys expired by then, batch_size keys at a
+    time so that writers are never held up for long.
+
+    args:
+        store      : the KVStore to reap
+        interval   : seconds between two rounds of reaping
+        batch_size : keys deleted with a single write
+    """
+
+    def __init__(self, store, interval: float = 1.0, batch_size: int = 1000):
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+
+        # keys reaped so far
+        self.reaped: int = 0
+
+        self._stop = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="pyk-reaper",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> int:
+        """
+        reaps every key expired by now in the calling thread, a batch at a
+        time
+
+        returns the number of keys reaped
+        """
+        total = 0
+        expiring = self.store.key_dir.expiring
+        while not self._stop.is_set():
+            total += self.store.reap_expired(self.batch_size)
+            next_expiry = expiring.next_expiry()
+            if next_expiry is None or next_expiry > int(time.time()):
+                break
+        self.reaped += total
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"unexpected {e=}, {type(e)=} during expiry reaping")
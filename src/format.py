@@ -3,7 +3,9 @@ import time
 import typing
 import zlib
 
+from src.codec import decompress
 from src.custom_types import KeyType, ValueType
+from src.serializer import Serializer, decode_value
 
 """
 ref: https://riak.com/assets/bitcask-intro.pdf
@@ -30,6 +32,34 @@ HEADER_ENCODING_FORAMT: typing.Final[str] = "<LLLLLL"
 # size of the HEADER. Five values, each of size 4 bytes, totaling 20 bytes.
 HEADER_SIZE: typing.Final[int] = 24
 
+# the deleted field of the header holds bit flags, older data files only ever
+# set it to 0 or 1
+# the record is a tombstone
+FLAG_DELETED: typing.Final[int] = 0x1
+# the record is part of a batch and more records of the batch follow it. the
+# last record of a batch does not have the flag, so a batch cut short by a
+# crash can be told apart from a complete one
+FLAG_BATCH: typing.Final[int] = 0x2
+# bits 2-4 hold the id of the codec the value is compressed with, 0 if it is
+# not compressed. see src/codec.py
+CODEC_SHIFT: typing.Final[int] = 2
+CODEC_MASK: typing.Final[int] = 0x7 << CODEC_SHIFT
+# bits 5-7 hold the type tag of the value, 0 (str) in older data files. see
+# src/serializer.py
+TYPE_SHIFT: typing.Final[int] = 5
+TYPE_MASK: typing.Final[int] = 0x7 << TYPE_SHIFT
+
+# set in the header of a record written by KVStore.set_stream() until its
+# value is complete and the header is written again with the CRC and size of
+# the value. a record still carrying it was cut short by a crash. see
+# src/stream.py
+FLAG_STREAMING: typing.Final[int] = 0x100
+
+# byte offset of the deleted field within the header
+FLAGS_OFFSET: typing.Final[int] = 12
+
+HEADER_STRUCT: typing.Final[struct.Struct] = struct.Struct(HEADER_ENCODING_FORAMT)
+
 
 class KVHeader:
     """
@@ -90,16 +120,61 @@ class KVHeader:
         # print(len(data), data)
         return struct.unpack(HEADER_ENCODING_FORAMT, data)
 
+    @classmethod
+    def decode_hdr_from(
+        cls,
+        data: typing.Union[bytes, memoryview],
+        offset: int = 0,
+    ) -> tuple[int, int, int, int, int, int]:
+        """
+        decode the header starting at offset of a larger buffer, without
+        copying it out of the buffer first
+
+        returns the same tuple as decode_hdr()
+        """
+        return HEADER_STRUCT.unpack_from(data, offset)
+
+    @classmethod
+    def decode(
+        cls,
+        data: typing.Union[bytes, memoryview],
+        offset: int = 0,
+    ) -> "KVHeader":
+        """
+        decode the header starting at offset of a buffer into a KVHeader
+        """
+        chksm, timestamp, expiry, deleted, key_sz, value_sz = HEADER_STRUCT.unpack_from(
+            data, offset
+        )
+        return cls(
+            checksum=chksm,
+            timestamp=timestamp,
+            expiry=expiry,
+            key_sz=key_sz,
+            value_sz=value_sz,
+            deleted=deleted,
+        )
+
     def is_expired(self) -> bool:
         if self.expiry == 0:
             return False
         return self.expiry <= int(time.time())
 
     def is_deleted(self) -> bool:
-        return self.deleted
+        return bool(self.deleted & FLAG_DELETED)
+
+    def codec_id(self) -> int:
+        return (self.deleted & CODEC_MASK) >> CODEC_SHIFT
 
-    def is_valid(self, value: ValueType) -> bool:
-        return self.checksum == zlib.crc32(str(value).encode("utf-8"))
+    def type_tag(self) -> int:
+        return (self.deleted & TYPE_MASK) >> TYPE_SHIFT
+
+    def is_valid_bytes(self, value: typing.Union[bytes, memoryview]) -> bool:
+        """
+        checks the CRC against the value bytes as stored on disk, saves
+        encoding the decoded value again
+        """
+        return self.checksum == zlib.crc32(value)
 
 
 class KVData:
@@ -120,18 +195,26 @@ class KVData:
         returns a tuple of size of encoded bytes and byte object
         """
         hdr: bytes = self.header.encode_hdr()
+        # the key and value may already be encoded
+        key, value = self.key, self.value
+        if not isinstance(key, bytes):
+            key = str.encode(key)
+        if not isinstance(value, bytes):
+            value = str.encode(value)
         data: bytes = b"".join(
-            [str.encode(self.key), str.encode(self.value)],
+            [key, value],
         )
         return HEADER_SIZE + len(data), hdr + data
 
     @classmethod
     def decode_kv(
         cls,
-        data: bytes,
+        data: typing.Union[bytes, memoryview],
     ) -> tuple[int, KVHeader, KeyType, ValueType]:
         """
-        decode byte object into timestamp, key and value
+        decode byte object into timestamp, key and value. data can be a
+        memoryview, e.g. of a memory mapped file, the header is decoded in
+        place and only the key and value are copied out
 
         args:
             data : byte object containing KV pair data
@@ -139,35 +222,58 @@ class KVData:
         returns a tuple of checksum, timestamp, expirey, deleted, key size,
         value size.
         """
-        chksm, timestamp, expiry, deleted, key_sz, value_sz = KVHeader.decode_hdr(
-            data[:HEADER_SIZE],
-        )
-        hdr = KVHeader(
-            checksum=chksm,
-            timestamp=timestamp,
-            expiry=expiry,
-            key_sz=key_sz,
-            value_sz=value_sz,
-            deleted=deleted,
-        )
-        key = data[HEADER_SIZE : HEADER_SIZE + key_sz].decode("utf-8")
-        value = data[HEADER_SIZE + key_sz :].decode("utf-8")
-        return timestamp, hdr, key, value
+        data = memoryview(data)
+        hdr = KVHeader.decode(data)
+        key = str(data[HEADER_SIZE : HEADER_SIZE + hdr.key_sz], "utf-8")
+        value = cls.decode_value(hdr, data[HEADER_SIZE + hdr.key_sz :])
+        return hdr.timestamp, hdr, key, value
+
+    @classmethod
+    def decode_value(
+        cls,
+        hdr: KVHeader,
+        stored: typing.Union[bytes, memoryview],
+        serializer: typing.Optional[Serializer] = None,
+    ) -> typing.Any:
+        """
+        decodes the value bytes of a record as stored on disk back into the
+        type it was written with, decompressing them if the header says so
+        """
+        codec_id = hdr.codec_id()
+        if codec_id:
+            stored = decompress(codec_id, stored)
+        return decode_value(hdr.type_tag(), stored, serializer)
 
 
 class KVEntry:
     """
-    KVEntry stores the metadat about KV pairs - timestampm of the entry, size
-    and position of the byte offset in the file.
+    KVEntry stores the metadat about KV pairs - timestampm of the entry, size,
+    data file and position of the byte offset in the file.
     A new entry is made whenever a key is inerted or updated
 
     args:
         timestamp : timestamp at which key value pair is written to the disk
         pos       : byte offset in the file
         size      : size of an entry in the file
+        expiry    : expiry timestamp from the header, 0 if the key never expires
+        deleted   : deleted flag from the header
+        file_id   : id of the data file holding the entry
     """
 
-    def __init__(self, timestamp: int, pos: int, size: int):
+    __slots__ = ("timestamp", "pos", "size", "expiry", "deleted", "file_id")
+
+    def __init__(
+        self,
+        timestamp: int,
+        pos: int,
+        size: int,
+        expiry: int = 0,
+        deleted: int = 0,
+        file_id: int = 0,
+    ):
         self.timestamp = timestamp
         self.pos = pos
         self.size = size
+        self.expiry = expiry
+        self.deleted = deleted
+        self.file_id = file_id
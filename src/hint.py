@@ -0,0 +1,134 @@
+import os
+import struct
+import typing
+import zlib
+from os import fsync, path
+
+"""
+ref: https://riak.com/assets/bitcask-intro.pdf
+
+A hint file sits next to a data file and holds just enough information to
+rebuild the key_dir without reading the data file. It is written by shrink()
+and by a clean close().
+
+    | magic | version | data_sz | count | crc |                  HEADER
+    | timestamp | expiry | deleted | ksz | pos | size |..key..|  ENTRY
+    | timestamp | expiry | deleted | ksz | pos | size |..key..|  ENTRY
+    ...
+
+`data_sz` is the size of the data file when the hint was written, the hint
+covers the data file up to that offset. Records appended after it are found
+by scanning the data file from `data_sz` onwards. `crc` is the CRC32 checksum
+of all the entries, a hint file that fails the check is ignored.
+"""
+
+HINT_MAGIC: typing.Final[bytes] = b"PYKH"
+HINT_VERSION: typing.Final[int] = 1
+
+HINT_HEADER_FORMAT: typing.Final[str] = "<4sLQQL"
+HINT_HEADER_SIZE: typing.Final[int] = struct.calcsize(HINT_HEADER_FORMAT)
+
+HINT_ENTRY_FORMAT: typing.Final[str] = "<LLLLQL"
+HINT_ENTRY_SIZE: typing.Final[int] = struct.calcsize(HINT_ENTRY_FORMAT)
+
+# timestamp, expiry, deleted, position, record size, key
+HintEntry = tuple[int, int, int, int, int, str]
+
+
+def hint_path(data_path: str) -> str:
+    return data_path + ".hint"
+
+
+def write_hint(
+    data_path: str,
+    entries: typing.Iterable[HintEntry],
+    data_sz: int,
+) -> None:
+    """
+    writes the hint file for a data file. the hint is written to a temporary
+    file first and moved in place, so a crash never leaves a partial hint
+
+    args:
+        data_path : path of the data file the hint describes
+        entries   : (timestamp, expiry, deleted, pos, size, key) per key
+        data_sz   : number of bytes of the data file covered by the hint
+    """
+    pack = struct.Struct(HINT_ENTRY_FORMAT).pack
+    body = bytearray()
+    count = 0
+    for tstamp, expiry, deleted, pos, size, key in entries:
+        key_bytes = key.encode("utf-8")
+        body += pack(tstamp, expiry, deleted, len(key_bytes), pos, size)
+        body += key_bytes
+        count += 1
+
+    hdr = struct.pack(
+        HINT_HEADER_FORMAT,
+        HINT_MAGIC,
+        HINT_VERSION,
+        data_sz,
+        count,
+        zlib.crc32(body),
+    )
+
+    target = hint_path(data_path)
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(hdr)
+        f.write(body)
+        f.flush()
+        fsync(f.fileno())
+    os.replace(tmp, target)
+
+
+def load_hint(data_path: str) -> typing.Optional[tuple[list[HintEntry], int]]:
+    """
+    loads the hint file of a data file
+
+    returns a tuple of entries and the number of data file bytes they cover,
+    or None if there is no hint file or it is not valid for the data file
+    """
+    target = hint_path(data_path)
+    if not path.exists(target) or not path.exists(data_path):
+        return None
+
+    with open(target, "rb") as f:
+        data = f.read()
+
+    if len(data) < HINT_HEADER_SIZE:
+        return None
+
+    magic, version, data_sz, count, crc = struct.unpack_from(HINT_HEADER_FORMAT, data)
+    if magic != HINT_MAGIC or version != HINT_VERSION:
+        return None
+
+    body = memoryview(data)[HINT_HEADER_SIZE:]
+    if zlib.crc32(body) != crc:
+        return None
+
+    # the data file must still contain everything the hint points to
+    if path.getsize(data_path) < data_sz:
+        return None
+
+    unpack_from = struct.Struct(HINT_ENTRY_FORMAT).unpack_from
+    entries: list[HintEntry] = []
+    offset = HINT_HEADER_SIZE
+    for _ in range(count):
+        tstamp, expiry, deleted, ksz, pos, size = unpack_from(data, offset)
+        offset += HINT_ENTRY_SIZE
+        key = data[offset : offset + ksz].decode("utf-8")
+        offset += ksz
+        entries.append((tstamp, expiry, deleted, pos, size, key))
+
+    return entries, data_sz
+
+
+def remove_hint(data_path: str) -> None:
+    """
+    removes the hint file of a data file, called before the data file is
+    rewritten so that a stale hint is never used
+    """
+    try:
+        os.remove(hint_path(data_path))
+    except FileNotFoundError:
+        pass
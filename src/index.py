@@ -0,0 +1,109 @@
+import threading
+import typing
+from bisect import bisect_left
+
+"""
+sorted index of the keys in key_dir, for ordered iteration and range scans.
+
+keys are kept in a sorted list searched with bisect. inserting in the middle
+of a large list on every new key would cost O(n) per write, so new and
+removed keys are parked in sets and merged into the list by the next range
+query. a merge sorts only the new keys and merges two sorted runs, writes
+stay O(1) and queries pay O(n) once per batch of writes.
+"""
+
+
+class SortedKeys:
+    """
+    SortedKeys is a set of keys that can be iterated in sorted order from
+    any key onwards. it is safe to use from several threads.
+    """
+
+    def __init__(self, keys: typing.Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self._sorted: list[str] = sorted(keys)
+        # keys added to or removed from _sorted since the last merge
+        self._added: set[str] = set()
+        self._removed: set[str] = set()
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            if key in self._removed:
+                self._removed.discard(key)
+            elif not self._in_sorted(key):
+                self._added.add(key)
+
+    def discard(self, key: str) -> None:
+        """
+        removes key, if it is held
+        """
+        with self._lock:
+            if key in self._added:
+                self._added.discard(key)
+            elif self._in_sorted(key):
+                self._removed.add(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sorted, self._added, self._removed = [], set(), set()
+
+    def range(
+        self,
+        start: typing.Optional[str] = None,
+        end: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+    ) -> list[str]:
+        """
+        returns the keys in [start, end) in sorted order, at most limit of
+        them. None leaves the range open on that side
+        """
+        with self._lock:
+            self._merge()
+            keys = self._sorted
+            i = 0 if start is None else bisect_left(keys, start)
+            j = len(keys) if end is None else bisect_left(keys, end, lo=i)
+            if limit is not None:
+                j = min(j, i + limit)
+            return keys[i:j]
+
+    def prefix(self, prefix: str, limit: typing.Optional[int] = None) -> list[str]:
+        """
+        returns the keys starting with prefix in sorted order
+        """
+        return self.range(prefix, prefix_end(prefix), limit)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sorted) + len(self._added) - len(self._removed)
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self.range())
+
+    def _in_sorted(self, key: str) -> bool:
+        keys = self._sorted
+        i = bisect_left(keys, key)
+        return i < len(keys) and keys[i] == key
+
+    def _merge(self) -> None:
+        if self._removed:
+            removed = self._removed
+            self._sorted = [k for k in self._sorted if k not in removed]
+            self._removed = set()
+        if self._added:
+            # timsort merges the two sorted runs in linear time
+            self._sorted += sorted(self._added)
+            self._sorted.sort()
+            self._added = set()
+
+
+def prefix_end(prefix: str) -> typing.Optional[str]:
+    """
+    returns the smallest string greater than every string starting with
+    prefix, or None if there is none
+    """
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
@@ -0,0 +1,335 @@
+import typing
+from array import array
+
+from src.expiry import ExpiryIndex
+from src.format import KVEntry
+from src.index import SortedKeys
+
+"""
+key_dir holds an entry for every key in the store, so its size per key
+decides how many keys fit in memory. A dict of KVEntry objects costs several
+hundred bytes per key: the object, its attribute dict and an int object per
+field.
+
+KeyDir keeps the fields of all entries in parallel typed arrays instead, and
+maps every key to its slot in the arrays
+
+    key ---> slot
+             timestamp[slot]  expiry[slot]  deleted[slot]
+             file_id[slot]    pos[slot]     size[slot]
+
+an entry costs a dict slot, an int for the slot number and 29 bytes in the
+arrays. KVEntry objects are only built when an entry is looked up.
+
+the keys of live entries with an expiry are also kept in an ExpiryIndex,
+see src/expiry.py
+
+tombstones are not live keys: lookups, len() and iteration only see keys
+with a value, a miss is answered without reading the disk. with several data
+files a tombstone still has to be written to hint files and kept by
+compaction, it may shadow a value in an older data file, so tombstones keep
+a slot of their own unless keep_tombstones is off.
+"""
+
+
+class KeyDir:
+    """
+    KeyDir is a compact mapping of keys to KVEntry, with the same O(1)
+    lookups as a dict. entries are copied in and out of the arrays, changing
+    a KVEntry returned by a lookup does not change the key_dir.
+
+    args:
+        ordered         : keep a sorted index of the keys, see src/index.py.
+                          without it sorted_keys() sorts all the keys on
+                          every call
+        keep_tombstones : keep the entries of deleted keys for records(),
+                          otherwise a delete simply removes the key
+    """
+
+    def __init__(self, ordered: bool = False, keep_tombstones: bool = True):
+        self.ordered = ordered
+        self.keep_tombstones = keep_tombstones
+        self.index: typing.Optional[SortedKeys] = SortedKeys() if ordered else None
+        self.expiring: ExpiryIndex = ExpiryIndex()
+        # slots of the live keys and of the tombstones
+        self._slots: dict[str, int] = {}
+        self._tombstones: dict[str, int] = {}
+        self._timestamp = array("I")
+        self._expiry = array("I")
+        self._deleted = array("B")
+        self._file_id = array("I")
+        self._pos = array("Q")
+        self._size = array("Q")
+
+        # slots of removed keys, reused by new keys
+        self._free: list[int] = []
+
+    def put(
+        self,
+        key: str,
+        timestamp: int,
+        pos: int,
+        size: int,
+        expiry: int = 0,
+        deleted: int = 0,
+        file_id: int = 0,
+    ) -> None:
+        """
+        sets the entry of key from its fields, without building a KVEntry.
+        a tombstone takes key out of the live keys
+        """
+        if deleted:
+            self._put_tombstone(key, timestamp, pos, size, expiry, deleted, file_id)
+            return
+
+        slot = self._slots.get(key)
+        new_key = slot is None
+        if new_key:
+            slot = self._tombstones.pop(key, None)
+
+        # a slot is filled before the key points to it
+        if slot is None and not self._free:
+            slot = self._append(timestamp, pos, size, expiry, deleted, file_id)
+        else:
+            if slot is None:
+                slot = self._free.pop()
+            self._fill(slot, timestamp, pos, size, expiry, deleted, file_id)
+
+        if new_key:
+            self._slots[key] = slot
+            if self.index is not None:
+                self.index.add(key)
+        if expiry:
+            self.expiring.add(key, expiry)
+        elif not new_key:
+            self.expiring.discard(key)
+
+    def get(
+        self, key: str, default: typing.Optional[KVEntry] = None
+    ) -> typing.Optional[KVEntry]:
+        """
+        returns the entry of key if it is live, default otherwise
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return default
+        return self._entry(slot)
+
+    def find(self, key: str) -> typing.Optional[KVEntry]:
+        """
+        returns the entry of key, live or tombstone, None if there is none
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._tombstones.get(key)
+            if slot is None:
+                return None
+        return self._entry(slot)
+
+    def tombstone_count(self) -> int:
+        return len(self._tombstones)
+
+    def tombstones(self) -> list[tuple[str, int, int]]:
+        """
+        returns (key, file_id, pos) of every tombstone
+        """
+        file_ids, pos = self._file_id, self._pos
+        return [
+            (key, file_ids[slot], pos[slot]) for key, slot in self._tombstones.items()
+        ]
+
+    def records(
+        self, file_id: typing.Optional[int] = None
+    ) -> typing.Iterator[tuple[int, int, int, int, int, str]]:
+        """
+        yields (timestamp, expiry, deleted, pos, size, key) of every entry,
+        tombstones included, or of the entries living in file_id. the format
+        of hint file entries
+        """
+        timestamp, expiry, deleted = self._timestamp, self._expiry, self._deleted
+        file_ids, pos, size = self._file_id, self._pos, self._size
+        for slots in (self._slots, self._tombstones):
+            for key, slot in slots.items():
+                if file_id is None or file_ids[slot] == file_id:
+                    yield (
+                        timestamp[slot],
+                        expiry[slot],
+                        deleted[slot],
+                        pos[slot],
+                        size[slot],
+                        key,
+                    )
+
+    def live_bytes(self) -> dict[int, int]:
+        """
+        returns the bytes taken by live records, tombstones excluded, per
+        data file
+        """
+        live: dict[int, int] = {}
+        deleted, file_ids, size = self._deleted, self._file_id, self._size
+        for slot in self._slots.values():
+            if not deleted[slot]:
+                file_id = file_ids[slot]
+                live[file_id] = live.get(file_id, 0) + size[slot]
+        return live
+
+    def pop(
+        self, key: str, default: typing.Optional[KVEntry] = None
+    ) -> typing.Optional[KVEntry]:
+        """
+        removes the entry of key, live or tombstone, and returns it
+        """
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            if self.index is not None:
+                self.index.discard(key)
+            self.expiring.discard(key)
+        else:
+            # tombstones are neither indexed nor expiring, see _put_tombstone()
+            slot = self._tombstones.pop(key, None)
+            if slot is None:
+                return default
+        entry = self._entry(slot)
+        self._free.append(slot)
+        return entry
+
+    def update(self, entries: typing.Iterable[tuple[str, KVEntry]]) -> None:
+        for key, entry in entries:
+            self[key] = entry
+
+    def keys(self) -> typing.KeysView[str]:
+        return self._slots.keys()
+
+    def values(self) -> typing.Iterator[KVEntry]:
+        for slot in self._slots.values():
+            yield self._entry(slot)
+
+    def items(self) -> typing.Iterator[tuple[str, KVEntry]]:
+        for key, slot in self._slots.items():
+            yield key, self._entry(slot)
+
+    def sorted_keys(
+        self,
+        start: typing.Optional[str] = None,
+        end: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+    ) -> list[str]:
+        """
+        returns the keys in [start, end) in sorted order, at most limit of
+        them. None leaves the range open on that side
+        """
+        if self.index is not None:
+            return self.index.range(start, end, limit)
+        return SortedKeys(
+            k
+            for k in list(self._slots)
+            if (start is None or k >= start) and (end is None or k < end)
+        ).range(limit=limit)
+
+    def clear(self) -> None:
+        self.__init__(self.ordered, self.keep_tombstones)
+
+    def __getitem__(self, key: str) -> KVEntry:
+        return self._entry(self._slots[key])
+
+    def __setitem__(self, key: str, entry: KVEntry) -> None:
+        self.put(
+            key,
+            entry.timestamp,
+            entry.pos,
+            entry.size,
+            entry.expiry,
+            entry.deleted,
+            entry.file_id,
+        )
+
+    def __delitem__(self, key: str) -> None:
+        if self.pop(key) is None:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._slots
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._slots)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _put_tombstone(
+        self,
+        key: str,
+        timestamp: int,
+        pos: int,
+        size: int,
+        expiry: int,
+        deleted: int,
+        file_id: int,
+    ) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            if self.index is not None:
+                self.index.discard(key)
+            self.expiring.discard(key)
+        else:
+            slot = self._tombstones.get(key)
+
+        if not self.keep_tombstones:
+            if slot is not None:
+                self._free.append(slot)
+            return
+
+        if slot is None and not self._free:
+            slot = self._append(timestamp, pos, size, expiry, deleted, file_id)
+        else:
+            if slot is None:
+                slot = self._free.pop()
+            self._fill(slot, timestamp, pos, size, expiry, deleted, file_id)
+        self._tombstones[key] = slot
+
+    def _append(
+        self,
+        timestamp: int,
+        pos: int,
+        size: int,
+        expiry: int,
+        deleted: int,
+        file_id: int,
+    ) -> int:
+        """
+        fills a new slot at the end of the arrays and returns it
+        """
+        self._timestamp.append(timestamp)
+        self._expiry.append(expiry)
+        self._deleted.append(deleted)
+        self._file_id.append(file_id)
+        self._pos.append(pos)
+        self._size.append(size)
+        return len(self._pos) - 1
+
+    def _fill(
+        self,
+        slot: int,
+        timestamp: int,
+        pos: int,
+        size: int,
+        expiry: int,
+        deleted: int,
+        file_id: int,
+    ) -> None:
+        self._timestamp[slot] = timestamp
+        self._expiry[slot] = expiry
+        self._deleted[slot] = deleted
+        self._file_id[slot] = file_id
+        self._pos[slot] = pos
+        self._size[slot] = size
+
+    def _entry(self, slot: int) -> KVEntry:
+        return KVEntry(
+            self._timestamp[slot],
+            self._pos[slot],
+            self._size[slot],
+            self._expiry[slot],
+            self._deleted[slot],
+            self._file_id[slot],
+        )
@@ -0,0 +1,71 @@
+import mmap
+import os
+import threading
+
+
+class MappedFile:
+    """
+    MappedFile serves reads of a data file from a read-only memory map.
+    reads return memoryview slices of the map, nothing is copied.
+
+    the active data file keeps growing, the file is mapped again when a read
+    goes past the end of the map. a replaced map is not closed explicitly,
+    it is unmapped once the last memoryview of it is released.
+
+    args:
+        filename : path of the data file
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._fd = os.open(filename, os.O_RDONLY)
+        self._lock = threading.Lock()
+        self._map = None
+        self._remap()
+
+    def view(self, pos: int, size: int) -> memoryview:
+        """
+        returns a memoryview of size bytes at offset pos of the data file
+        """
+        mapped = self._map
+        if mapped is None or pos + size > len(mapped):
+            mapped = self._remap(pos + size)
+        return memoryview(mapped)[pos : pos + size]
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def close(self) -> None:
+        if self._fd < 0:
+            return
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # a memoryview of the map is still alive, it is unmapped
+                # once the view is released
+                pass
+            self._map = None
+        os.close(self._fd)
+        self._fd = -1
+
+    def __del__(self) -> None:
+        # replaced maps are dropped rather than closed, see KVStore._locate()
+        if getattr(self, "_fd", -1) >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _remap(self, min_size: int = 0):
+        with self._lock:
+            if self._map is not None and len(self._map) >= min_size:
+                return self._map
+
+            size = os.fstat(self._fd).st_size
+            if size < min_size:
+                raise ValueError(
+                    f"read past the end of {self.filename}: {min_size} > {size}"
+                )
+            # an empty file cannot be mapped, it is mapped on the first read
+            if size > 0:
+                self._map = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+            return self._map
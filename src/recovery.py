@@ -0,0 +1,142 @@
+import typing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from src.format import (
+    CODEC_MASK,
+    FLAG_BATCH,
+    FLAG_DELETED,
+    FLAG_STREAMING,
+    HEADER_SIZE,
+    TYPE_MASK,
+)
+from src.hint import HintEntry, load_hint
+from src.scanner import SCAN_CHUNK_SIZE, RecordScanner
+
+"""
+recovery of the key_dir from the data files.
+
+every data file is loaded on its own: entries from its hint file, if there
+is a valid one, and a scan of the records past the part covered by the hint.
+a file yields a partial key_dir holding the last entry of every key in it.
+the partial key_dirs are merged oldest file first, so that for every key the
+entry written last (the highest file id and position) wins.
+
+the scan reads the data file in large chunks, see src/scanner.py. with a
+data directory the files can be loaded by a pool of worker processes,
+scanning is CPU bound.
+
+every scanned record is validated: it must end before the end of the file,
+its flags must be known, its key valid utf-8 and the CRC of its value must
+match. the scan stops at the first record that is not, everything from
+there on is discarded, as is a batch whose last record is missing. the
+process dying in the middle of a write leaves such a torn tail.
+"""
+
+# every bit a record may have set in its flags field
+KNOWN_FLAGS: typing.Final[int] = TYPE_MASK | CODEC_MASK | FLAG_BATCH | FLAG_DELETED
+
+# why the tail of a data file was discarded
+TORN_RECORD: typing.Final[str] = "torn record"
+CORRUPT_RECORD: typing.Final[str] = "corrupt record"
+TORN_BATCH: typing.Final[str] = "incomplete batch"
+
+
+class LoadedFile(typing.NamedTuple):
+    """
+    what recovery found in a data file
+
+    entries  : the last entry of every key in the file, in hint file format
+    size     : size of the data file
+    valid_sz : size of the valid records at the start of the file,
+               anything after is a write cut short by a crash or corrupt
+    reason   : why the bytes past valid_sz are discarded, None if there
+               are none
+    """
+
+    entries: list[HintEntry]
+    size: int
+    valid_sz: int
+    reason: typing.Optional[str] = None
+
+
+class DiscardedTail(typing.NamedTuple):
+    """
+    the end of a data file truncated by recovery, see KVStore.discarded
+
+    data_path : the data file
+    offset    : where the discarded bytes started, the new size of the file
+    size      : bytes discarded
+    reason    : TORN_RECORD, CORRUPT_RECORD or TORN_BATCH
+    """
+
+    data_path: str
+    offset: int
+    size: int
+    reason: str
+
+
+def load_data_file(data_path: str, chunk_size: int = SCAN_CHUNK_SIZE) -> LoadedFile:
+    """
+    loads the entries of a data file from its hint file and a scan of the
+    records the hint does not cover, validated as the module docstring
+    describes. records of a batch are kept only if the last record of the
+    batch is valid. runs in the worker processes
+    """
+    latest: dict[str, HintEntry] = {}
+    pos = 0
+
+    hint = load_hint(data_path)
+    if hint is not None:
+        entries, pos = hint
+        for entry in entries:
+            latest[entry[5]] = entry
+
+    batch: list[HintEntry] = []
+    valid_sz = pos
+    reason = None
+
+    crc32 = zlib.crc32
+    scanner = RecordScanner(data_path, start=pos, chunk_size=chunk_size)
+    for pos, hdr, key, value in scanner:
+        flags = hdr[3]
+        if flags & ~KNOWN_FLAGS or crc32(value) != hdr[0]:
+            # a streamed value the process died writing is a torn write
+            reason = TORN_RECORD if flags & FLAG_STREAMING else CORRUPT_RECORD
+            break
+        try:
+            key = str(key, "utf-8")
+        except UnicodeDecodeError:
+            reason = CORRUPT_RECORD
+            break
+
+        size = HEADER_SIZE + hdr[4] + hdr[5]
+        batch.append((hdr[1], hdr[2], flags & FLAG_DELETED, pos, size, key))
+
+        if not flags & FLAG_BATCH:
+            for entry in batch:
+                latest[entry[5]] = entry
+            batch.clear()
+            valid_sz = pos + size
+
+    size = scanner.end
+    if reason is None and valid_sz < size:
+        reason = TORN_RECORD if scanner.torn else TORN_BATCH
+    return LoadedFile(list(latest.values()), size, valid_sz, reason)
+
+
+def load_data_files(
+    data_paths: list[str], workers: int = 1
+) -> typing.Iterator[LoadedFile]:
+    """
+    loads data files with load_data_file(), yields the results in the order
+    of data_paths. with more than one worker the files are loaded in
+    parallel by a pool of processes
+    """
+    if workers <= 1 or len(data_paths) <= 1:
+        for data_path in data_paths:
+            yield load_data_file(data_path)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(data_paths))) as pool:
+        yield from pool.map(load_data_file, data_paths)
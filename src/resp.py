@@ -0,0 +1,197 @@
+import typing
+
+from src.errors import ProtocolError, UnsupportedTypeError
+from src.utils import encode_to_str
+
+"""
+ref: https://redis.io/docs/latest/develop/reference/protocol-spec/
+
+RESP2, the protocol of redis, spoken by src/server.py and src/client.py.
+redis-cli and redis client libraries can talk to the server.
+
+a command is an array of bulk strings, a reply is any of
+
+    +OK\\r\\n                     simple string
+    -ERR message\\r\\n            error
+    :42\\r\\n                     integer
+    $5\\r\\nhello\\r\\n             bulk string, $-1\\r\\n for none
+    *2\\r\\n$1\\r\\na\\r\\n:1\\r\\n      array, *-1\\r\\n for none
+
+a client can send many commands without waiting for their replies,
+pipelining. the replies come back in the order of the commands.
+"""
+
+DEFAULT_PORT: typing.Final[int] = 6380
+
+CRLF: typing.Final[bytes] = b"\r\n"
+
+# longest line and bulk string accepted, as redis does
+MAX_LINE: typing.Final[int] = 64 * 1024
+MAX_BULK: typing.Final[int] = 512 * 1024 * 1024
+
+OK: typing.Final[bytes] = b"+OK\r\n"
+NULL_BULK: typing.Final[bytes] = b"$-1\r\n"
+
+
+class RespError:
+    """
+    RespError is an error reply read off the wire, a value rather than an
+    exception so that a pipeline can hold it among other replies
+    """
+
+    __slots__ = ("message",)
+
+    def __init__(self, message: str):
+        self.message = message
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RespError) and other.message == self.message
+
+    def __repr__(self) -> str:
+        return f"RespError({self.message!r})"
+
+
+# returned by RespParser.parse() when the buffer holds a partial value
+INCOMPLETE: typing.Final = object()
+
+
+class RespParser:
+    """
+    RespParser parses RESP values out of the bytes fed to it, as they arrive
+    on a socket. parse() returns the next complete value, or INCOMPLETE
+    until more bytes were fed
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def feed(self, data: bytes) -> None:
+        if self._pos:
+            # drop what was parsed already before growing the buffer
+            del self._buf[: self._pos]
+            self._pos = 0
+        self._buf += data
+
+    def parse(self) -> typing.Any:
+        start = self._pos
+        try:
+            return self._value()
+        except _Incomplete:
+            self._pos = start
+            return INCOMPLETE
+
+    def parse_all(self) -> list:
+        """
+        returns every complete value in the buffer, the pipelined commands
+        or replies that arrived together
+        """
+        values = []
+        while (value := self.parse()) is not INCOMPLETE:
+            values.append(value)
+        return values
+
+    def _line(self) -> bytes:
+        end = self._buf.find(CRLF, self._pos)
+        if end < 0:
+            if len(self._buf) - self._pos > MAX_LINE:
+                raise ProtocolError("line too long")
+            raise _Incomplete
+        line = bytes(self._buf[self._pos : end])
+        self._pos = end + 2
+        return line
+
+    def _length(self, line: bytes, limit: int) -> int:
+        try:
+            n = int(line[1:])
+        except ValueError:
+            raise ProtocolError(f"invalid length {line[1:]!r}") from None
+        if n < -1 or n > limit:
+            raise ProtocolError(f"invalid length {n}")
+        return n
+
+    def _value(self) -> typing.Any:
+        line = self._line()
+        kind = line[:1]
+        if kind == b"$":
+            n = self._length(line, MAX_BULK)
+            if n == -1:
+                return None
+            if len(self._buf) - self._pos < n + 2:
+                raise _Incomplete
+            value = bytes(self._buf[self._pos : self._pos + n])
+            if self._buf[self._pos + n : self._pos + n + 2] != CRLF:
+                raise ProtocolError("bulk string not terminated by CRLF")
+            self._pos += n + 2
+            return value
+        if kind == b"*":
+            n = self._length(line, MAX_BULK)
+            if n == -1:
+                return None
+            return [self._value() for _ in range(n)]
+        if kind == b"+":
+            return line[1:].decode("utf-8", "replace")
+        if kind == b"-":
+            return RespError(line[1:].decode("utf-8", "replace"))
+        if kind == b":":
+            try:
+                return int(line[1:])
+            except ValueError:
+                raise ProtocolError(f"invalid integer {line[1:]!r}") from None
+        raise ProtocolError(f"unexpected {kind!r}, expected a RESP value")
+
+
+class _Incomplete(Exception):
+    pass
+
+
+def to_bytes(value) -> bytes:
+    """
+    returns the bytes a key or value is sent as, bytes as they are and
+    other types as their string form
+    """
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, bool):
+        return b"1" if value else b"0"
+    try:
+        return encode_to_str(value).encode("utf-8")
+    except UnsupportedTypeError as e:
+        raise UnsupportedTypeError(e.value_type, "in a RESP message") from e
+
+
+def encode_command(*args) -> bytes:
+    """
+    encodes a command as an array of bulk strings
+    """
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        arg = to_bytes(arg)
+        parts.append(b"$%d\r\n%b\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def encode_reply(value) -> bytes:
+    """
+    encodes a reply. None is the null bulk string, str a simple string and
+    bytes a bulk string
+    """
+    if value is None:
+        return NULL_BULK
+    if value == "OK":
+        return OK
+    if isinstance(value, str):
+        return b"+%b\r\n" % value.encode("utf-8")
+    if isinstance(value, RespError):
+        # a line break would end the error line early
+        message = value.message.replace("\r", " ").replace("\n", " ")
+        return b"-%b\r\n" % message.encode("utf-8")
+    if isinstance(value, bool):
+        return b":1\r\n" if value else b":0\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(v) for v in value)
+    if isinstance(value, bytes):
+        return b"$%d\r\n%b\r\n" % (len(value), value)
+    raise UnsupportedTypeError(type(value), "in a RESP reply")
@@ -0,0 +1,113 @@
+import os
+import typing
+
+from src.format import HEADER_SIZE, HEADER_STRUCT
+
+"""
+sequential scan of the records of a data file, shared by recovery,
+compaction and anything else walking a data file from start to end.
+
+the file is read in large chunks with positional reads, headers are decoded
+straight from the chunk and keys and values are handed out as memoryview
+slices of it, nothing is copied per record. a record crossing the end of a
+chunk starts the next chunk, a record larger than a chunk is read whole.
+"""
+
+# bytes read at once while scanning a data file
+SCAN_CHUNK_SIZE: typing.Final[int] = 4 * 1024 * 1024
+
+# (crc, timestamp, expiry, flags, key size, value size) as stored on disk
+RawHeader = tuple[int, int, int, int, int, int]
+
+# (offset, header, key, value) of a record, key and value are views of the
+# chunk holding the record, valid as long as they are referenced
+ScannedRecord = tuple[int, RawHeader, memoryview, memoryview]
+
+
+class RecordScanner:
+    """
+    RecordScanner iterates over the complete records of a data file between
+    two offsets. it stops at the first record that does not fit before the
+    end, pos is then the offset of the first byte not scanned and torn tells
+    whether a partial record was found there.
+
+    args:
+        filename   : path of the data file
+        start      : offset of the first record to scan
+        end        : offset to stop at, the size of the file by default
+        chunk_size : bytes read at once
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        start: int = 0,
+        end: typing.Optional[int] = None,
+        chunk_size: int = SCAN_CHUNK_SIZE,
+    ):
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self.chunk_size = chunk_size
+        self.pos = start
+
+    @property
+    def torn(self) -> bool:
+        """
+        whether scanning stopped at a partial record before the end
+        """
+        return self.end is not None and self.pos < self.end
+
+    def __iter__(self) -> typing.Iterator[ScannedRecord]:
+        unpack_from = HEADER_STRUCT.unpack_from
+        fd = os.open(self.filename, os.O_RDONLY)
+        try:
+            end = self.end
+            if end is None:
+                end = self.end = os.fstat(fd).st_size
+
+            pos = self.pos = self.start
+            need = HEADER_SIZE
+            while pos + HEADER_SIZE <= end:
+                want = min(max(self.chunk_size, need), end - pos)
+                chunk = memoryview(os.pread(fd, want, pos))
+                n = len(chunk)
+
+                # records completely inside the chunk
+                offset, need = 0, HEADER_SIZE
+                while offset + HEADER_SIZE <= n:
+                    hdr = unpack_from(chunk, offset)
+                    key_at = offset + HEADER_SIZE
+                    value_at = key_at + hdr[4]
+                    next_at = value_at + hdr[5]
+                    if next_at > n:
+                        # the next chunk starts with this record, whole
+                        need = next_at - offset
+                        break
+                    yield (
+                        pos + offset,
+                        hdr,
+                        chunk[key_at:value_at],
+                        chunk[value_at:next_at],
+                    )
+                    offset = next_at
+
+                pos = self.pos = pos + offset
+                # no complete record before the end, or the file is shorter
+                if offset == 0 and (n < want or want == end - pos):
+                    break
+        finally:
+            os.close(fd)
+
+
+def scan_records(
+    filename: str,
+    start: int = 0,
+    end: typing.Optional[int] = None,
+    chunk_size: int = SCAN_CHUNK_SIZE,
+) -> typing.Iterator[ScannedRecord]:
+    """
+    yields (offset, header, key, value) of the complete records of a data
+    file, see RecordScanner
+    """
+    return iter(RecordScanner(filename, start, end, chunk_size))
@@ -0,0 +1,128 @@
+import json
+import pickle
+import typing
+
+from src.errors import MissingSerializerError, UnsupportedTypeError
+
+"""
+encoding of values into the bytes stored on disk, and back to the type they
+were written with.
+
+the type of a value is recorded in bits 5-7 of the flags field of the record
+header (see src/format.py). str, bytes, int, float and bool are stored
+natively, bytes as they are. any other type goes through the serializer the
+store was opened with, if any.
+
+    | tag | type       | stored as                      |
+    |   0 | str        | UTF-8, what older records hold |
+    |   1 | bytes      | the bytes as they are          |
+    |   2 | int        | decimal digits                 |
+    |   3 | float      | repr()                         |
+    |   4 | bool       | b"1" or b"0"                   |
+    |   5 | serialized | serializer.dumps()             |
+"""
+
+VALUE_STR: typing.Final[int] = 0
+VALUE_BYTES: typing.Final[int] = 1
+VALUE_INT: typing.Final[int] = 2
+VALUE_FLOAT: typing.Final[int] = 3
+VALUE_BOOL: typing.Final[int] = 4
+VALUE_SERIALIZED: typing.Final[int] = 5
+
+
+class Serializer(typing.Protocol):
+    """
+    turns values of other types than str, bytes, int, float and bool into
+    bytes and back
+    """
+
+    def dumps(self, value: typing.Any) -> bytes: ...
+
+    def loads(self, data: bytes) -> typing.Any: ...
+
+
+class JSONSerializer:
+    def dumps(self, value: typing.Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes) -> typing.Any:
+        return json.loads(data)
+
+
+class PickleSerializer:
+    """
+    pickles values. only open stores written by trusted code with it,
+    unpickling runs arbitrary code
+    """
+
+    def dumps(self, value: typing.Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> typing.Any:
+        return pickle.loads(data)
+
+
+class MsgpackSerializer:
+    """
+    msgpack serializer, needs the msgpack package
+    """
+
+    def __init__(self):
+        import msgpack
+
+        self._msgpack = msgpack
+
+    def dumps(self, value: typing.Any) -> bytes:
+        return self._msgpack.packb(value)
+
+    def loads(self, data: bytes) -> typing.Any:
+        return self._msgpack.unpackb(data)
+
+
+def encode_value(
+    value: typing.Any, serializer: typing.Optional[Serializer] = None
+) -> tuple[int, bytes]:
+    """
+    returns the type tag of value and the bytes to store it as
+    """
+    value_type = type(value)
+    if value_type is str:
+        return VALUE_STR, value.encode("utf-8")
+    if value_type is bytes:
+        return VALUE_BYTES, value
+    if value_type is bool:
+        return VALUE_BOOL, b"1" if value else b"0"
+    if value_type is int:
+        return VALUE_INT, str(value).encode("ascii")
+    if value_type is float:
+        return VALUE_FLOAT, repr(value).encode("ascii")
+    if isinstance(value, (bytearray, memoryview)):
+        return VALUE_BYTES, bytes(value)
+    if serializer is None:
+        raise UnsupportedTypeError(value_type, "without a serializer")
+    return VALUE_SERIALIZED, serializer.dumps(value)
+
+
+def decode_value(
+    tag: int,
+    data: typing.Union[bytes, memoryview],
+    serializer: typing.Optional[Serializer] = None,
+) -> typing.Any:
+    """
+    returns the value stored as data with the type tag
+    """
+    if tag == VALUE_STR:
+        return str(data, "utf-8")
+    if tag == VALUE_BYTES:
+        return bytes(data)
+    if tag == VALUE_INT:
+        return int(bytes(data))
+    if tag == VALUE_FLOAT:
+        return float(bytes(data))
+    if tag == VALUE_BOOL:
+        return data == b"1"
+    if tag == VALUE_SERIALIZED:
+        if serializer is None:
+            raise MissingSerializerError()
+        return serializer.loads(bytes(data))
+    raise ValueError(f"unknown value type tag: {tag}")
@@ -0,0 +1,381 @@
+import argparse
+import asyncio
+import math
+import os
+import typing
+
+from src.async_store import AsyncKVStore
+from src.errors import ProtocolError
+from src.resp import DEFAULT_PORT, RespError, RespParser, encode_reply, to_bytes
+
+"""
+a TCP and unix socket server in front of a KVStore, speaking RESP, see
+src/resp.py. processes share one store, and one key_dir, through it rather
+than each embedding a KVStore of their own.
+
+    python -m src.server file.db --port 6380
+    redis-cli -p 6380 set foo bar
+
+every connection is served by a coroutine. it reads whatever the client
+sent, runs the pipelined commands it holds and answers them with a single
+write. commands run on an AsyncKVStore, so the writes of all connections
+are group committed together: one write and one fsync for everything
+queued while the previous group was written. a run of writes pipelined on
+one connection is queued at once and joins the same group, a run of gets
+is coalesced into one get_many().
+
+supported commands
+
+    PING [message]              ECHO message
+    GET key                     MGET key [key ...]
+    SET key value [EX s|PX ms]  MSET key value [key value ...]
+    DEL key [key ...]           EXISTS key [key ...]
+    TTL key   EXPIRE key s      PERSIST key
+    DBSIZE                      QUIT
+
+values are stored as the bytes sent, GET returns them as bytes. MSET and a
+DEL of many keys are written as a batch, recovered as a unit.
+"""
+
+# bytes read off a socket at a time
+READ_SIZE: typing.Final[int] = 64 * 1024
+
+# commands queued into the store together when pipelined one after another
+WRITES: typing.Final[frozenset] = frozenset({b"SET", b"MSET", b"DEL"})
+READS: typing.Final[frozenset] = frozenset({b"GET", b"MGET"})
+
+
+class KVServer:
+    """
+    KVServer serves an AsyncKVStore over TCP, or a unix socket if
+    unix_path is given, see the module docstring
+
+    args:
+        store     : the store to serve, not closed by close()
+        host      : address to listen on
+        port      : TCP port, 0 for any free port, see address
+        unix_path : path of a unix socket to listen on instead of TCP
+    """
+
+    def __init__(
+        self,
+        store: AsyncKVStore,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        unix_path: typing.Optional[str] = None,
+    ):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self._server: typing.Optional[asyncio.AbstractServer] = None
+        self._connections: set[asyncio.Task] = set()
+
+        # commands served, useful to see pipelining at work
+        self.command_count: int = 0
+
+    async def start(self) -> None:
+        if self.unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._serve, self.unix_path)
+        else:
+            self._server = await asyncio.start_server(self._serve, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    @property
+    def address(self) -> typing.Union[str, tuple[str, int]]:
+        """
+        the unix socket path or the (host, port) the server listens on
+        """
+        return self.unix_path if self.unix_path is not None else (self.host, self.port)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        stops listening and closes every connection, commands already read
+        are answered first
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+
+    async def __aenter__(self) -> "KVServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        serves one connection until the client closes it or sends QUIT
+        """
+        task = asyncio.current_task()
+        self._connections.add(task)
+        parser = RespParser()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                parser.feed(data)
+                try:
+                    commands = parser.parse_all()
+                except ProtocolError as e:
+                    writer.write(encode_reply(RespError(f"ERR Protocol error: {e}")))
+                    break
+                if not commands:
+                    continue
+
+                replies, quit = await self._run_pipeline(commands)
+                writer.write(b"".join(encode_reply(r) for r in replies))
+                await writer.drain()
+                if quit:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    async def _run_pipeline(self, commands: list) -> tuple[list, bool]:
+        """
+        runs the commands read together, in order. consecutive writes, and
+        consecutive reads, are started together so that they share a group
+        commit or a get_many(). a DEL starts a run of its own, its count of
+        deleted keys must not miss the writes before it
+
+        returns the replies and whether the client sent QUIT
+        """
+        replies: list = []
+        i = 0
+        while i < len(commands):
+            name = _name(commands[i])
+            if name == b"QUIT":
+                replies.append("OK")
+                return replies, True
+
+            kind = WRITES if name in WRITES else READS if name in READS else None
+            j = i + 1
+            if kind is not None:
+                while (
+                    j < len(commands)
+                    and _name(commands[j]) in kind
+                    and _name(commands[j]) != b"DEL"
+                ):
+                    j += 1
+            replies.extend(await asyncio.gather(*(self._run(c) for c in commands[i:j])))
+            self.command_count += j - i
+            i = j
+        return replies, False
+
+    async def _run(self, command) -> typing.Any:
+        """
+        runs a single command, errors are turned into error replies
+        """
+        if not isinstance(command, list) or not command:
+            return RespError("ERR Protocol error: expected an array of bulk strings")
+        if not all(isinstance(arg, bytes) for arg in command):
+            return RespError("ERR Protocol error: arguments must be bulk strings")
+
+        name, args = command[0].upper(), command[1:]
+        handler = _COMMANDS.get(name)
+        if handler is None:
+            return RespError(f"ERR unknown command '{_text(command[0])}'")
+        fn, least, most = handler
+        if len(args) < least or most is not None and len(args) > most:
+            return RespError(
+                f"ERR wrong number of arguments for '{_text(name).lower()}' command"
+            )
+        try:
+            return await fn(self.store, *args)
+        except _CommandError as e:
+            return RespError(str(e))
+        except Exception as e:
+            return RespError(f"ERR {e}")
+
+
+class _CommandError(Exception):
+    pass
+
+
+def _name(command) -> bytes:
+    if isinstance(command, list) and command and isinstance(command[0], bytes):
+        return command[0].upper()
+    return b""
+
+
+def _text(arg: bytes) -> str:
+    return arg.decode("utf-8", "replace")
+
+
+def _int(arg: bytes) -> int:
+    try:
+        return int(arg)
+    except ValueError:
+        raise _CommandError("ERR value is not an integer or out of range") from None
+
+
+async def _ping(store: AsyncKVStore, *args) -> typing.Any:
+    return args[0] if args else "PONG"
+
+
+async def _echo(store: AsyncKVStore, message: bytes) -> bytes:
+    return message
+
+
+def _reply_value(key: str, value: typing.Any) -> typing.Optional[bytes]:
+    if value == "Key Not Found":
+        return None
+    if value == "Invalid/corrupted":
+        # not data, the record failed its CRC check
+        raise _CommandError(f"ERR value of '{key}' is corrupted")
+    # values set by an embedded KVStore may be of other types
+    return to_bytes(value)
+
+
+async def _get(store: AsyncKVStore, key: bytes) -> typing.Any:
+    name = _text(key)
+    return _reply_value(name, await store.get(name))
+
+
+async def _mget(store: AsyncKVStore, *keys: bytes) -> list:
+    names = [_text(key) for key in keys]
+    values = await store.get_many(names)
+    return [_reply_value(k, values[k]) for k in names]
+
+
+async def _set(store: AsyncKVStore, key: bytes, value: bytes, *options) -> str:
+    expiry = 0
+    if options:
+        if len(options) != 2 or options[0].upper() not in (b"EX", b"PX"):
+            raise _CommandError("ERR syntax error")
+        expiry = _int(options[1])
+        if options[0].upper() == b"PX":
+            # the store keeps expiries in seconds
+            expiry = math.ceil(expiry / 1000)
+        if expiry <= 0:
+            raise _CommandError("ERR invalid expire time in 'set' command")
+    await store.set(_text(key), value, expiry)
+    return "OK"
+
+
+async def _mset(store: AsyncKVStore, *args: bytes) -> str:
+    if len(args) % 2:
+        raise _CommandError("ERR wrong number of arguments for 'mset' command")
+    await store.set_many((_text(args[i]), args[i + 1]) for i in range(0, len(args), 2))
+    return "OK"
+
+
+async def _del(store: AsyncKVStore, *keys: bytes) -> int:
+    names = list(dict.fromkeys(_text(key) for key in keys))
+    existing = [key for key in names if await store.exists(key)]
+    if len(existing) == 1:
+        await store.delete(existing[0])
+    elif existing:
+        await store.delete_many(existing)
+    return len(existing)
+
+
+async def _exists(store: AsyncKVStore, *keys: bytes) -> int:
+    return sum([await store.exists(_text(key)) for key in keys])
+
+
+async def _ttl(store: AsyncKVStore, key: bytes) -> int:
+    return await store.ttl(_text(key))
+
+
+async def _expire(store: AsyncKVStore, key: bytes, seconds: bytes) -> bool:
+    return await store.expire(_text(key), _int(seconds))
+
+
+async def _persist(store: AsyncKVStore, key: bytes) -> bool:
+    return await store.persist(_text(key))
+
+
+async def _dbsize(store: AsyncKVStore) -> int:
+    return len(store.store)
+
+
+async def _command(store: AsyncKVStore, *args) -> list:
+    # redis-cli asks for the command docs on connect
+    return []
+
+
+# name: (handler, least arguments, most arguments or None)
+_COMMANDS: dict[bytes, tuple[typing.Callable, int, typing.Optional[int]]] = {
+    b"PING": (_ping, 0, 1),
+    b"ECHO": (_echo, 1, 1),
+    b"GET": (_get, 1, 1),
+    b"MGET": (_mget, 1, None),
+    b"SET": (_set, 2, 4),
+    b"MSET": (_mset, 2, None),
+    b"DEL": (_del, 1, None),
+    b"EXISTS": (_exists, 1, None),
+    b"TTL": (_ttl, 1, 1),
+    b"EXPIRE": (_expire, 2, 2),
+    b"PERSIST": (_persist, 1, 1),
+    b"DBSIZE": (_dbsize, 0, 0),
+    b"COMMAND": (_command, 0, None),
+}
+
+
+async def serve(
+    filename: str,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    unix_path: typing.Optional[str] = None,
+    **kwargs,
+) -> None:
+    """
+    opens a store and serves it until cancelled. kwargs are passed to
+    KVStore
+    """
+    async with await AsyncKVStore.open(filename, **kwargs) as store:
+        async with KVServer(store, host, port, unix_path) as server:
+            print(f"serving {filename} on {server.address}")
+            await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="serves a KVStore over RESP")
+    parser.add_argument("filename", help="data file, or data directory ending in /")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on a unix socket instead of TCP")
+    parser.add_argument(
+        "--sync-mode", default="always", help='"always", "interval" or "none"'
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(
+            serve(
+                args.filename,
+                args.host,
+                args.port,
+                args.unix,
+                sync_mode=args.sync_mode,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
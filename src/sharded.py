@@ -0,0 +1,417 @@
+import multiprocessing
+import os
+import threading
+import typing
+import zlib
+from collections.abc import Iterable, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from heapq import merge
+from os import path
+
+from src.compact import CompactionStats
+from src.custom_types import KeyType, ValueType
+from src.disk_store import KVStore
+from src.errors import ShardCountError, UnsupportedTypeError
+from src.utils import encode_to_str
+
+"""
+hash partitioning of the keys across several independent KVStores.
+
+a sharded store is a directory holding one data directory per shard
+
+    store/
+        shard-000/  000000000.data  000000001.data ...
+        shard-001/  000000000.data ...
+
+every shard has its own data files, append stream, fsyncs, key_dir and
+compaction. a key lives in the shard crc32(key) % shards, the number of
+shards is fixed when the store is created.
+
+shards either run in the calling process, calls fanned out to several
+shards then run on a thread pool and their fsyncs overlap, or each in a
+worker process of its own, driven over a pipe. a call fanned out to worker
+processes is sent to every shard before any answer is read, the shards
+encode, write, fsync and recover in parallel on as many cores.
+
+set_many() and delete_many() are applied as a unit by every shard, not
+across shards: a crash may keep the part of a batch that went to one shard
+and lose the part that went to another.
+"""
+
+SHARD_DIR_PREFIX: typing.Final[str] = "shard-"
+DEFAULT_SHARDS: typing.Final[int] = 4
+
+
+def shard_of(key: str, shards: int) -> int:
+    """
+    returns the shard of key. crc32 rather than hash(), which differs
+    between processes
+    """
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+class LocalShard:
+    """
+    LocalShard runs the KVStore of a shard in the calling process, fanned
+    out calls run on the executor
+    """
+
+    def __init__(self, filename: str, options: dict, executor: ThreadPoolExecutor):
+        self.store = KVStore(filename, **options)
+        self._executor = executor
+
+    def call(self, method: str, *args):
+        return getattr(self.store, method)(*args)
+
+    def submit(self, method: str, *args) -> Future:
+        return self._executor.submit(getattr(self.store, method), *args)
+
+    def result(self, pending: Future):
+        return pending.result()
+
+    def alive(self) -> bool:
+        return True
+
+    def stop(self) -> None:
+        pass
+
+    def discard(self) -> None:
+        """
+        closes the shard of a ShardedKVStore that failed to open
+        """
+        self.store.close()
+
+
+class ProcessShard:
+    """
+    ProcessShard runs the KVStore of a shard in a worker process, every call
+    is a (method, args) message on a pipe answered by ("ok", result) or
+    ("err", exception). a shard serves one call at a time, the pipe is held
+    from submit() to result()
+    """
+
+    def __init__(self, filename: str, options: dict, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve_shard,
+            args=(child, filename, options),
+            name=f"pyk-{path.basename(path.normpath(filename))}",
+            daemon=True,
+        )
+        try:
+            self.process.start()
+        except BaseException:
+            self.conn.close()
+            raise
+        finally:
+            child.close()
+        self._lock = threading.Lock()
+        # the worker answers once the store is open, see wait_open()
+        self._lock.acquire()
+        self.opened: typing.Optional[bool] = None
+
+    def wait_open(self) -> None:
+        """
+        waits for the worker to open its store, raises what opening raised
+        """
+        try:
+            self.result()
+        except BaseException:
+            self.opened = False
+            raise
+        self.opened = True
+
+    def call(self, method: str, *args):
+        return self.result(self.submit(method, *args))
+
+    def submit(self, method: str, *args) -> None:
+        self._lock.acquire()
+        try:
+            self.conn.send((method, args))
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def result(self, pending: None = None):
+        try:
+            status, value = self.conn.recv()
+        finally:
+            self._lock.release()
+        if status == "err":
+            raise value
+        return value
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self) -> None:
+        self.conn.close()
+        self.process.join()
+
+    def discard(self) -> None:
+        """
+        closes the shard of a ShardedKVStore that failed to open, once the
+        worker is done opening it
+        """
+        try:
+            if self.opened is None:
+                self.wait_open()
+            if self.opened:
+                self.call("close")
+        finally:
+            self.stop()
+
+
+def _serve_shard(conn, filename: str, options: dict) -> None:
+    """
+    entry point of a shard worker process
+    """
+    try:
+        store = KVStore(filename, **options)
+    except Exception as e:
+        conn.send(("err", e))
+        return
+    conn.send(("ok", None))
+
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            # the parent went away without closing the shard
+            store.close()
+            return
+
+        try:
+            conn.send(("ok", getattr(store, method)(*args)))
+        except Exception as e:
+            conn.send(("err", e))
+        if method == "close":
+            return
+
+
+class ShardedKVStore:
+    """
+    ShardedKVStore hash partitions keys across several KVStores, see the
+    module docstring. it has the same methods as KVStore for single keys
+    and fans get_many(), set_many() and delete_many() out to the shards
+    holding the keys.
+
+    args:
+        directory : directory holding the shards, created if needed
+        shards    : number of shards. None to open an existing store with
+                    the number it was created with, or DEFAULT_SHARDS
+        processes : run every shard in a worker process of its own
+        start_method : how worker processes are started, see
+                    multiprocessing.get_context()
+        options   : passed to the KVStore of every shard, they must be
+                    picklable with processes
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        shards: typing.Optional[int] = None,
+        processes: bool = False,
+        start_method: str = "spawn",
+        **options,
+    ):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        found = len(
+            [
+                name
+                for name in os.listdir(directory)
+                if name.startswith(SHARD_DIR_PREFIX)
+            ]
+        )
+        if shards is None:
+            shards = found or DEFAULT_SHARDS
+        if found and found != shards:
+            raise ShardCountError(directory, found, shards)
+
+        self.processes = processes
+        self._executor: typing.Optional[ThreadPoolExecutor] = None
+        self.shards: list[typing.Union[LocalShard, ProcessShard]] = []
+        try:
+            if processes:
+                context = multiprocessing.get_context(start_method)
+                for i in range(shards):
+                    self.shards.append(
+                        ProcessShard(self._shard_path(i), options, context)
+                    )
+                # every worker opens its shard meanwhile
+                for shard in self.shards:
+                    shard.wait_open()
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=shards,
+                    thread_name_prefix="pyk-shard",
+                )
+                for i in range(shards):
+                    self.shards.append(
+                        LocalShard(self._shard_path(i), options, self._executor)
+                    )
+        except BaseException:
+            self._discard_shards()
+            raise
+
+    def set(self, key: KeyType, value: ValueType, expiry: int = 0) -> None:
+        self._shard(key, "set()").call("set", key, value, expiry)
+
+    def get(self, key: KeyType) -> typing.Any:
+        return self._shard(key, "get()").call("get", key)
+
+    def delete(self, key: KeyType) -> None:
+        self._shard(key, "delete()").call("delete", key)
+
+    def exists(self, key: KeyType) -> bool:
+        return self._shard(key, "exists()").call("exists", key)
+
+    def ttl(self, key: KeyType) -> int:
+        return self._shard(key, "ttl()").call("ttl", key)
+
+    def expire(self, key: KeyType, seconds: int) -> bool:
+        return self._shard(key, "expire()").call("expire", key, seconds)
+
+    def persist(self, key: KeyType) -> bool:
+        return self._shard(key, "persist()").call("persist", key)
+
+    def get_many(self, keys: Iterable[KeyType]) -> dict[KeyType, typing.Any]:
+        """
+        retrive values for many keys at once, with a get_many() of every
+        shard holding some of them
+        """
+        groups: dict[int, list[KeyType]] = {}
+        for key in keys:
+            groups.setdefault(self._shard_id(key, "get_many()"), []).append(key)
+
+        result: dict[KeyType, typing.Any] = {}
+        calls = {i: (group,) for i, group in groups.items()}
+        for values in self._fan_out("get_many", calls):
+            result.update(values)
+        return result
+
+    def set_many(
+        self,
+        items: typing.Union[
+            Mapping[KeyType, ValueType], Iterable[tuple[KeyType, ValueType]]
+        ],
+        expiry: int = 0,
+    ) -> None:
+        """
+        store many keys and values, as a batch per shard
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+
+        groups: dict[int, list[tuple[KeyType, ValueType]]] = {}
+        for key, value in items:
+            groups.setdefault(self._shard_id(key, "set_many()"), []).append(
+                (key, value)
+            )
+        self._fan_out("set_many", {i: (g, expiry) for i, g in groups.items()})
+
+    def delete_many(self, keys: Iterable[KeyType]) -> None:
+        """
+        deletes many keys, as a batch per shard
+        """
+        groups: dict[int, list[KeyType]] = {}
+        for key in keys:
+            groups.setdefault(self._shard_id(key, "delete_many()"), []).append(key)
+        self._fan_out("delete_many", {i: (g,) for i, g in groups.items()})
+
+    def keys(self) -> list[str]:
+        """
+        returns every key with a value in sorted order
+        """
+        return list(merge(*self._fan_out_all("keys")))
+
+    def sync(self) -> None:
+        self._fan_out_all("sync")
+
+    def compact(self) -> list[CompactionStats]:
+        """
+        compacts every shard, in parallel
+
+        returns the stats of every compacted data file
+        """
+        return [stats for result in self._fan_out_all("compact") for stats in result]
+
+    def close(self) -> None:
+        try:
+            self._fan_out(
+                "close",
+                {i: () for i, shard in enumerate(self.shards) if shard.alive()},
+            )
+        finally:
+            for shard in self.shards:
+                shard.stop()
+            if self._executor is not None:
+                self._executor.shutdown()
+
+    def __len__(self) -> int:
+        return sum(self._fan_out_all("__len__"))
+
+    def _discard_shards(self) -> None:
+        """
+        closes the shards opened so far and the executor, when __init__
+        fails part way. the error that failed __init__ is the one raised,
+        errors closing the shards are dropped
+        """
+        for shard in self.shards:
+            try:
+                shard.discard()
+            except Exception:
+                pass
+        self.shards = []
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _shard_id(self, key: KeyType, context: str) -> int:
+        try:
+            key = encode_to_str(key)
+        except UnsupportedTypeError as e:
+            raise UnsupportedTypeError(e.value_type, f"for key in {context}") from e
+        return shard_of(key, len(self.shards))
+
+    def _shard(
+        self, key: KeyType, context: str
+    ) -> typing.Union[LocalShard, ProcessShard]:
+        return self.shards[self._shard_id(key, context)]
+
+    def _fan_out(self, method: str, calls: dict[int, tuple]) -> list:
+        """
+        calls method of every shard in calls with its arguments, sending
+        every call before reading any answer
+
+        returns the results in shard order
+        """
+        if len(calls) == 1:
+            ((shard_id, args),) = calls.items()
+            return [self.shards[shard_id].call(method, *args)]
+
+        pending = []
+        try:
+            for shard_id in sorted(calls):
+                shard = self.shards[shard_id]
+                pending.append((shard, shard.submit(method, *calls[shard_id])))
+        finally:
+            # every submitted call is answered, even if a later one failed
+            results, error = [], None
+            for shard, handle in pending:
+                try:
+                    results.append(shard.result(handle))
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _fan_out_all(self, method: str) -> list:
+        """
+        calls method of every shard, without arguments
+        """
+        return self._fan_out(method, {i: () for i in range(len(self.shards))})
+
+    def _shard_path(self, shard_id: int) -> str:
+        return path.join(self.directory, f"{SHARD_DIR_PREFIX}{shard_id:03d}") + os.sep
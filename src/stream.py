@@ -0,0 +1,191 @@
+import io
+import os
+import typing
+import zlib
+
+from src.errors import CorruptValueError, UnsupportedTypeError
+
+"""
+values too large to hold in memory at once.
+
+KVStore.set_stream() appends a value read a chunk at a time from a file or
+an iterable of bytes. the record header holds the CRC and the size of the
+value, neither is known until the last chunk was written, so the header is
+written first with FLAG_STREAMING set and written again in place once the
+value is complete. a crash in between leaves a record recovery discards,
+see src/recovery.py. the CRC is computed incrementally over the chunks.
+
+KVStore.open_value() returns a ValueReader, a seekable file-like object
+over the byte range of a value in its data file. reads are positional
+reads of that range, nothing else of the value is in memory. a value read
+from start to end in order has its CRC checked as the last byte is read.
+copy_to() copies a value to another file or a socket, with os.sendfile()
+where the CRC does not need checking, the bytes never reach python then.
+"""
+
+# bytes read and written at once by set_stream() and ValueReader.copy_to()
+STREAM_CHUNK_SIZE: typing.Final[int] = 1024 * 1024
+
+# the size field of the record header is 32 bits wide
+MAX_VALUE_SIZE: typing.Final[int] = 0xFFFFFFFF
+
+
+def iter_chunks(
+    data: typing.Union[typing.BinaryIO, typing.Iterable[bytes], bytes],
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> typing.Iterator[typing.Union[bytes, bytearray, memoryview]]:
+    """
+    yields the bytes of data in chunks. data is a binary file object, read
+    chunk_size bytes at a time, an iterable of bytes-like chunks, yielded as
+    they are, or a single bytes-like object
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        yield data
+        return
+
+    if hasattr(data, "readinto"):
+        # one buffer for the whole stream
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        while n := data.readinto(buf):
+            yield view[:n]
+        return
+
+    if hasattr(data, "read"):
+        while chunk := data.read(chunk_size):
+            yield chunk
+        return
+
+    for chunk in data:
+        if not isinstance(chunk, (bytes, bytearray, memoryview)):
+            raise UnsupportedTypeError(type(chunk), "for a chunk in set_stream()")
+        yield chunk
+
+
+class ValueReader(io.RawIOBase):
+    """
+    ValueReader reads the value of a record from its data file, see the
+    module docstring. it can be wrapped in io.BufferedReader. closing it
+    leaves the data file handle open, it is shared by the store
+
+    args:
+        key      : key of the value, for errors
+        f        : handle of the data file, read with positional reads
+        start    : offset of the value in the data file
+        size     : size of the value
+        checksum : CRC of the value, None to not check it
+    """
+
+    def __init__(
+        self,
+        key: str,
+        f,
+        start: int,
+        size: int,
+        checksum: typing.Optional[int] = None,
+    ):
+        super().__init__()
+        self.key = key
+        self._f = f
+        self._start = start
+        self._size = size
+        self._pos = 0
+        self._checksum = checksum
+        # CRC of the bytes read in order from the start, None once a seek
+        # broke the order
+        self._crc: typing.Optional[int] = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._check_open()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence {whence}")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        if pos != self._pos:
+            self._crc = None
+        self._pos = pos
+        return pos
+
+    def readinto(self, b) -> int:
+        self._check_open()
+        view = memoryview(b).cast("B")
+        n = max(0, min(len(view), self._size - self._pos))
+        if n == 0:
+            return 0
+        n = os.preadv(self._f.fileno(), [view[:n]], self._start + self._pos)
+        if n == 0:
+            raise EOFError(f"the data file ends within the value of {self.key}")
+        self._advance(view[:n])
+        return n
+
+    def copy_to(self, out, chunk_size: int = STREAM_CHUNK_SIZE) -> int:
+        """
+        copies the rest of the value to out, a binary file object or a
+        socket. with os.sendfile() the kernel copies it, unless the CRC has
+        to be checked
+
+        returns the number of bytes copied
+        """
+        self._check_open()
+        copied = 0
+        out_fd = None
+        if (self._crc is None or self._checksum is None) and hasattr(os, "sendfile"):
+            try:
+                out_fd = out.fileno()
+            except (AttributeError, OSError):
+                # in-memory files raise io.UnsupportedOperation, an OSError
+                pass
+        if out_fd is not None:
+            if hasattr(out, "flush"):
+                out.flush()
+            in_fd = self._f.fileno()
+            while self._pos < self._size:
+                n = os.sendfile(
+                    out_fd,
+                    in_fd,
+                    self._start + self._pos,
+                    min(chunk_size, self._size - self._pos),
+                )
+                if n == 0:
+                    raise EOFError(f"the data file ends within the value of {self.key}")
+                self._pos += n
+                copied += n
+            return copied
+
+        buf = bytearray(chunk_size)
+        write = out.sendall if hasattr(out, "sendall") else out.write
+        while n := self.readinto(buf):
+            write(memoryview(buf)[:n])
+            copied += n
+        return copied
+
+    def _check_open(self) -> None:
+        if self.closed:
+            raise ValueError("I/O operation on closed ValueReader")
+
+    def _advance(self, data: memoryview) -> None:
+        self._pos += len(data)
+        if self._crc is None or self._checksum is None:
+            return
+        self._crc = zlib.crc32(data, self._crc)
+        if self._pos == self._size and self._crc != self._checksum:
+            raise CorruptValueError(self.key)
@@ -0,0 +1,190 @@
+import threading
+import time
+import typing
+import zlib
+
+from src.format import HEADER_STRUCT
+from src.scanner import RecordScanner
+
+"""
+verification of the CRC of the records.
+
+the CRC of a record covers its value bytes as stored on disk, compressed or
+not, checking it costs a pass of zlib.crc32 over the value. how often reads
+pay for it is set by the verify mode of the store
+
+    always   : every read checks the CRC of the record it returns
+    sampled  : one read in verify_sample checks it
+    scrub    : reads never do, compaction and the scrubber do
+    never    : nothing checks it
+
+a read that finds a corrupt record returns "Invalid/corrupted". compaction
+checks the records it copies unless the mode is never, corrupt records are
+copied as they are and reported in KVStore.corrupt.
+
+the scrubber walks every data file in the background, record by record, at
+a limited number of bytes per second so that it does not compete with the
+store for the disk. it reports what it finds in KVStore.corrupt as well.
+"""
+
+VERIFY_ALWAYS: typing.Final[str] = "always"
+VERIFY_SAMPLED: typing.Final[str] = "sampled"
+VERIFY_SCRUB: typing.Final[str] = "scrub"
+VERIFY_NEVER: typing.Final[str] = "never"
+
+VERIFY_MODES = (VERIFY_ALWAYS, VERIFY_SAMPLED, VERIFY_SCRUB, VERIFY_NEVER)
+
+
+class CorruptRecord(typing.NamedTuple):
+    """
+    a record whose CRC does not match its value
+
+    data_path : the data file holding it
+    offset    : position of the record in the data file
+    key       : the key of the record, as stored
+    """
+
+    data_path: str
+    offset: int
+    key: bytes
+
+
+def read_check_interval(mode: str, sample: int) -> int:
+    """
+    returns every how many reads the CRC is checked, 0 for never
+    """
+    if mode not in VERIFY_MODES:
+        raise ValueError(
+            f"unknown verify mode {mode!r}, expected one of {VERIFY_MODES}"
+        )
+    if mode == VERIFY_ALWAYS:
+        return 1
+    if mode == VERIFY_SAMPLED:
+        if sample < 1:
+            raise ValueError("verify_sample must be at least 1")
+        return sample
+    return 0
+
+
+def corrupt_in(run: typing.Union[bytes, bytearray], start: int = 0) -> list[int]:
+    """
+    returns the offsets, relative to start, of the records in run whose CRC
+    does not match. run holds whole records back to back
+    """
+    unpack_from = HEADER_STRUCT.unpack_from
+    crc32 = zlib.crc32
+    view = memoryview(run)
+    corrupt = []
+    offset = 0
+    while offset < len(view):
+        crc, _, _, _, ksz, vsz = unpack_from(view, offset)
+        value_at = offset + HEADER_STRUCT.size + ksz
+        if crc32(view[value_at : value_at + vsz]) != crc:
+            corrupt.append(start + offset)
+        offset = value_at + vsz
+    return corrupt
+
+
+class Scrubber:
+    """
+    Scrubber verifies every record of the data files of a KVStore on a
+    background thread, see the module docstring. a pass over every data
+    file starts every interval seconds, records are read at rate bytes per
+    second at most.
+
+    args:
+        store    : the KVStore to scrub
+        rate     : bytes per second to verify at most, None for no limit
+        interval : seconds between the start of two passes
+    """
+
+    def __init__(
+        self,
+        store,
+        rate: typing.Optional[int] = 16 * 1024 * 1024,
+        interval: float = 3600.0,
+    ):
+        self.store = store
+        self.rate = rate
+        self.interval = interval
+
+        # completed passes, and bytes and records verified in all of them
+        self.passes: int = 0
+        self.bytes_verified: int = 0
+        self.records_verified: int = 0
+
+        self._stop = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="pyk-scrubber",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> list[CorruptRecord]:
+        """
+        verifies every data file once in the calling thread, at the rate
+        limit. the active data file is verified up to its size when the
+        pass reaches it
+
+        returns the corrupt records found, they are added to
+        KVStore.corrupt as well
+        """
+        found = []
+        started = time.monotonic()
+        done = 0
+        for data_path, end in self.store._scrub_targets():
+            scanner = RecordScanner(data_path, end=end)
+            try:
+                for pos, hdr, key, value in scanner:
+                    if zlib.crc32(value) != hdr[0]:
+                        record = CorruptRecord(data_path, pos, bytes(key))
+                        print(f"corrupt record at offset {pos} of {data_path}")
+                        found.append(record)
+                        self.store.corrupt.append(record)
+
+                    size = HEADER_STRUCT.size + hdr[4] + hdr[5]
+                    done += size
+                    self.bytes_verified += size
+                    self.records_verified += 1
+                    if self._throttle(started, done):
+                        return found
+            except FileNotFoundError:
+                # removed by compaction meanwhile
+                continue
+        self.passes += 1
+        return found
+
+    def _throttle(self, started: float, done: int) -> bool:
+        """
+        sleeps until done bytes are within the rate limit
+
+        returns whether the scrubber was stopped meanwhile
+        """
+        if self.rate is not None:
+            ahead = done / self.rate - (time.monotonic() - started)
+            # short sleeps cost more than they are worth
+            if ahead > 0.01:
+                return self._stop.wait(ahead)
+        return self._stop.is_set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"unexpected {e=}, {type(e)=} while scrubbing")
+            if self._stop.wait(self.interval):
+                break
@@ -0,0 +1,124 @@
+import asyncio
+import glob
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.async_store import AsyncKVStore
+from src.disk_store import KVStore
+from src.errors import UnsupportedTypeError
+from src.serializer import JSONSerializer
+
+
+class AsyncKVStoreTester(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        for sidecar in glob.glob(glob.escape(self.path) + ".*"):
+            os.remove(sidecar)
+
+    async def test_get_set_delete(self):
+        async with await AsyncKVStore.open(self.path) as ds:
+            self.assertEqual(await ds.get("foo"), "Key Not Found")
+            await ds.set("foo", "bar")
+            self.assertEqual(await ds.get("foo"), "bar")
+            await ds.delete("foo")
+            self.assertEqual(await ds.get("foo"), "Key Not Found")
+
+            await ds.set_many({"a": 1, "b": 2})
+            self.assertEqual(await ds.get_many(["a", "b"]), {"a": 1, "b": 2})
+            await ds.delete_many(["a"])
+            self.assertEqual(await ds.get("a"), "Key Not Found")
+
+        # everything was persisted by close()
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("b"), 2)
+        ds.close()
+
+    async def test_group_commit(self):
+        ds = AsyncKVStore(KVStore(self.path, sync_mode="always"))
+        await asyncio.gather(*(ds.set(f"key-{i}", i) for i in range(500)))
+
+        # concurrent sets share writes and fsyncs
+        self.assertLess(ds.group_count, 500)
+        self.assertLess(ds.store.syncer.sync_count, 500)
+
+        # and concurrent gets share reads
+        values = await asyncio.gather(*(ds.get(f"key-{i}") for i in range(500)))
+        self.assertEqual(values, list(range(500)))
+        values = await ds.get_many(f"key-{i}" for i in range(500))
+        self.assertEqual(values, {f"key-{i}": i for i in range(500)})
+        await ds.close()
+
+    async def test_group_limit(self):
+        ds = AsyncKVStore(KVStore(self.path), max_group_records=10)
+        await asyncio.gather(
+            ds.set_many({f"big-{i}": i for i in range(25)}),
+            *(ds.set(f"key-{i}", i) for i in range(30)),
+        )
+        # the 25 records of set_many are never split
+        self.assertGreaterEqual(ds.group_count, 4)
+        self.assertEqual(await ds.get("big-24"), 24)
+        self.assertEqual(await ds.get("key-29"), 29)
+        await ds.close()
+
+    async def test_invalid_key(self):
+        ds = AsyncKVStore(KVStore(self.path))
+        with self.assertRaises(UnsupportedTypeError):
+            await ds.set([1, 2], "value")
+        with self.assertRaises(UnsupportedTypeError):
+            await ds.get([1, 2])
+        await ds.set("ok", "value")
+        self.assertEqual(await ds.get("ok"), "value")
+        await ds.close()
+
+    async def test_encode_off_loop(self):
+        ds = AsyncKVStore(
+            KVStore(self.path, compression="zlib", serializer=JSONSerializer())
+        )
+        threads = []
+        encode_record = ds.store.encode_record
+
+        def encode(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return encode_record(*args, **kwargs)
+
+        ds.store.encode_record = encode
+        items = {"small": "value", "n": 1, "serialized": [1, 2, 3]}
+        await ds.set_many(items)
+        await ds.set("compressed", "x" * ds.store.compression_threshold)
+        await ds.delete("n")
+        self.assertEqual(len(threads), 5)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual(await ds.get("serialized"), [1, 2, 3])
+        await ds.close()
+
+    async def test_write_order(self):
+        ds = AsyncKVStore(
+            KVStore(self.path, compression="zlib", serializer=JSONSerializer())
+        )
+        big = "x" * 100_000
+        # writes are applied in the order they were called, whatever it
+        # takes to encode them
+        await asyncio.gather(ds.set("k", big), ds.set("k", "small"))
+        self.assertEqual(await ds.get("k"), "small")
+        await asyncio.gather(ds.set("j", big), ds.delete("j"))
+        self.assertEqual(await ds.get("j"), "Key Not Found")
+        await asyncio.gather(
+            ds.set_many({"a": [1, 2], "b": big}),
+            ds.delete_many(["a"]),
+            ds.set("b", 1),
+        )
+        self.assertEqual(await ds.get_many(["a", "b"]), {"a": "Key Not Found", "b": 1})
+        await ds.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
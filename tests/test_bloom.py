@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.bloom import BloomFilter, bloom_path, file_keys, load_bloom, write_bloom
+from src.disk_store import KVStore
+
+
+class BloomFilterTester(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.dir, "000000000.data")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter.create(10_000, fp_rate=0.01)
+        keys = [f"key-{i}".encode() for i in range(10_000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+        false_positives = sum(f"other-{i}".encode() in bloom for i in range(10_000))
+        self.assertLess(false_positives, 200)
+        self.assertLess(bloom.nbytes / len(keys), 1.3)
+
+    def test_write_load(self):
+        ds = KVStore(self.data_path)
+        ds.set_many({f"key-{i}": i for i in range(100)})
+        ds.set("key-1", "updated")
+        ds.close()
+
+        keys = file_keys(self.data_path)
+        self.assertEqual(len(keys), 100)
+        write_bloom(self.data_path, keys, os.path.getsize(self.data_path))
+        bloom = load_bloom(self.data_path)
+        self.assertEqual(bloom.num_keys, 100)
+        self.assertTrue(all(key in bloom for key in keys))
+
+        # a filter of another version of the data file is not used
+        with open(self.data_path, "ab") as f:
+            f.write(b"x")
+        self.assertIsNone(load_bloom(self.data_path))
+        os.truncate(self.data_path, os.path.getsize(self.data_path) - 1)
+        self.assertIsNotNone(load_bloom(self.data_path))
+
+        # nor a corrupted one
+        with open(bloom_path(self.data_path), "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+        self.assertIsNone(load_bloom(self.data_path))
+        self.assertIsNone(load_bloom(os.path.join(self.dir, "missing.data")))
+
+
+if __name__ == "__main__":
+    unittest.main()
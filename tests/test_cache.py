@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.cache import (
+    FrequencySketch,
+    LRUCache,
+    TinyLFUCache,
+    ValueCache,
+    make_cache,
+)
+
+
+class LRUCacheTester(unittest.TestCase):
+    def test_get_put(self):
+        cache = LRUCache(1024)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "1", 0, 10, cache.ticket())
+        self.assertEqual(cache.get("a"), "1")
+        self.assertEqual(cache.stats()[:3], (1, 1, 0))
+        self.assertEqual(cache.stats().hit_ratio, 0.5)
+
+    def test_none_value(self):
+        cache = LRUCache(1024)
+        cache.put("a", None, 0, 10, cache.ticket())
+        missing = object()
+        self.assertIsNone(cache.get("a", missing))
+        self.assertIs(cache.get("b", missing), missing)
+        self.assertEqual(cache.stats()[:2], (1, 1))
+
+    def test_policy_required(self):
+        with self.assertRaises(TypeError):
+            ValueCache(1024)
+
+    def test_byte_bound(self):
+        cache = LRUCache(100)
+        for key in "abcde":
+            cache.put(key, key, 0, 30, cache.ticket())
+        self.assertEqual(cache.stats().size, 90)
+        self.assertEqual(cache.evictions, 2)
+        self.assertNotIn("a", cache)
+        self.assertIn("e", cache)
+
+        # too large for the cache, never cached
+        cache.put("big", "x", 0, 101, cache.ticket())
+        self.assertNotIn("big", cache)
+
+    def test_entry_bound_evicts_least_recent(self):
+        cache = LRUCache(1 << 20, max_entries=2)
+        cache.put("a", "1", 0, 1, cache.ticket())
+        cache.put("b", "2", 0, 1, cache.ticket())
+        cache.get("a")
+        cache.put("c", "3", 0, 1, cache.ticket())
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+
+    def test_stale_ticket(self):
+        cache = LRUCache(1024)
+        ticket = cache.ticket()
+        cache.invalidate("a")
+        cache.put("a", "old", 0, 10, ticket)
+        self.assertNotIn("a", cache)
+
+    def test_expiry(self):
+        cache = LRUCache(1024)
+        cache.put("a", "1", int(time.time()) + 1, 10, cache.ticket())
+        self.assertEqual(cache.get("a"), "1")
+        with unittest.mock.patch("time.time", return_value=time.time() + 2):
+            self.assertIsNone(cache.get("a"))
+        self.assertNotIn("a", cache)
+
+
+class TinyLFUCacheTester(unittest.TestCase):
+    def test_bounds(self):
+        cache = TinyLFUCache(10_000, max_entries=50)
+        for i in range(1000):
+            cache.put(f"key-{i}", "v", 0, 50, cache.ticket())
+            self.assertLessEqual(cache.stats().size, 10_000)
+            self.assertLessEqual(len(cache), 50)
+
+    def test_scan_resistance(self):
+        cache = TinyLFUCache(100 * 10)
+        hot = [f"hot-{i}" for i in range(50)]
+        for _ in range(5):
+            for key in hot:
+                if cache.get(key) is None:
+                    cache.put(key, key, 0, 10, cache.ticket())
+
+        # a scan of one-off keys does not flush the frequently used ones
+        for i in range(1000):
+            key = f"scan-{i}"
+            if cache.get(key) is None:
+                cache.put(key, key, 0, 10, cache.ticket())
+
+        self.assertGreater(sum(key in cache for key in hot), 40)
+
+    def test_make_cache(self):
+        self.assertIsInstance(make_cache("lru", 1024), LRUCache)
+        self.assertIsInstance(make_cache("tinylfu", 1024), TinyLFUCache)
+        with self.assertRaises(ValueError):
+            make_cache("fifo", 1024)
+
+
+class FrequencySketchTester(unittest.TestCase):
+    def test_frequency_and_aging(self):
+        sketch = FrequencySketch(64)
+        for _ in range(6):
+            sketch.add("a")
+        self.assertGreaterEqual(sketch.frequency("a"), 6)
+        self.assertEqual(sketch.frequency("never-seen"), 0)
+
+        # counters saturate and are halved once sample_size keys were added
+        sketch._additions = sketch.sample_size - 1
+        for _ in range(20):
+            sketch.add("b")
+        self.assertLessEqual(sketch.frequency("a"), 3)
+        self.assertEqual(sketch.frequency("b"), FrequencySketch.MAX_COUNT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.codec import (
+    CODEC_LZMA,
+    CODEC_ZLIB,
+    available_codecs,
+    compress,
+    decompress,
+    get_codec,
+)
+from src.errors import UnsupportedCodecError
+
+
+class CodecTester(unittest.TestCase):
+    def test_round_trip(self):
+        value = b'{"name": "pyk", "tags": ["kv", "bitcask"]}' * 100
+        for name in available_codecs():
+            codec = get_codec(name)
+            codec_id, stored = compress(value, codec, threshold=1024)
+            self.assertEqual(codec_id, codec.id)
+            self.assertLess(len(stored), len(value))
+            self.assertEqual(decompress(codec_id, stored), value)
+
+    def test_left_as_is(self):
+        codec = get_codec(CODEC_ZLIB)
+        # below the threshold
+        self.assertEqual(compress(b"x" * 100, codec, 1024), (0, b"x" * 100))
+        # does not get smaller
+        random_bytes = os.urandom(2048)
+        self.assertEqual(compress(random_bytes, codec, 1024), (0, random_bytes))
+        # no codec
+        self.assertEqual(compress(b"x" * 2048, None, 0), (0, b"x" * 2048))
+        self.assertEqual(decompress(0, memoryview(b"abc")), b"abc")
+
+    def test_unsupported(self):
+        self.assertIn(CODEC_ZLIB, available_codecs())
+        self.assertIn(CODEC_LZMA, available_codecs())
+        self.assertIsNone(get_codec(None))
+        self.assertIsNone(get_codec("none"))
+        with self.assertRaises(UnsupportedCodecError):
+            get_codec("brotli")
+        with self.assertRaises(UnsupportedCodecError):
+            decompress(7, b"abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
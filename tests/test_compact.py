@@ -0,0 +1,258 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.bloom import bloom_path
+from src.compact import shrink
+from src.disk_store import KVStore
+from src.hint import hint_path, load_hint
+
+
+class CompactionTester(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        for name in (self.path, hint_path(self.path)):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def write(self, ops):
+        ds = KVStore(self.path)
+        for key, value in ops:
+            if value is None:
+                ds.delete(key)
+            else:
+                ds.set(key, value)
+        ds.file.close()
+
+    def test_keeps_latest_version(self):
+        self.write([("a", "1"), ("b", "1"), ("a", "2"), ("a", "3")])
+        size = os.path.getsize(self.path)
+
+        stats = shrink(self.path)
+        self.assertEqual(stats.records, 2)
+        self.assertEqual(stats.bytes_before, size)
+        self.assertEqual(stats.bytes_after, os.path.getsize(self.path))
+        self.assertGreater(stats.bytes_reclaimed, 0)
+
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("a"), "3")
+        self.assertEqual(ds.get("b"), "1")
+        ds.file.close()
+
+    def test_value_written_after_delete(self):
+        self.write([("a", "1"), ("b", "1"), ("a", None), ("a", "2"), ("b", None)])
+
+        stats = shrink(self.path)
+        self.assertEqual(stats.records, 1)
+
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("a"), "2")
+        self.assertEqual(ds.get("b"), "Key Not Found")
+        self.assertEqual(len(ds.key_dir), 1)
+        ds.file.close()
+
+    def test_key_dir_and_scan_agree(self):
+        ops = [(f"key-{i % 7}", str(i)) for i in range(50)] + [("key-3", None)]
+        self.write(ops)
+
+        ds = KVStore(self.path)
+        key_dir = ds.key_dir
+        ds.file.close()
+
+        with open(self.path, "rb") as f:
+            original = f.read()
+        by_key_dir = shrink(self.path, key_dir=key_dir)
+        with open(self.path, "rb") as f:
+            compacted = f.read()
+
+        with open(self.path, "wb") as f:
+            f.write(original)
+        by_scan = shrink(self.path)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), compacted)
+
+        self.assertEqual(by_key_dir.bytes_after, by_scan.bytes_after)
+        entries, data_sz = load_hint(self.path)
+        self.assertEqual(len(entries), 6)
+        self.assertEqual(data_sz, len(compacted))
+
+    def test_compact_on_close_writes_no_filter(self):
+        ds = KVStore(self.path, compact_on_close=True)
+        for i in range(20):
+            ds.set(f"key-{i % 5}", i)
+        ds.close()
+        # filters are only read for the data files of a data directory
+        self.assertTrue(os.path.exists(hint_path(self.path)))
+        self.assertFalse(os.path.exists(bloom_path(self.path)))
+
+    def test_nothing_to_compact(self):
+        self.write([("a", "1"), ("b", "2")])
+        size = os.path.getsize(self.path)
+
+        stats = shrink(self.path)
+        self.assertEqual(stats.bytes_reclaimed, 0)
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertFalse(os.path.exists(self.path + "_kompact"))
+
+
+class OnlineCompactionTester(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in (self.path, hint_path(self.path)):
+            if os.path.exists(name):
+                os.remove(name)
+        shutil.rmtree(self.dir)
+
+    def test_compact_single_file(self):
+        ds = KVStore(self.path)
+        for i in range(100):
+            ds.set(f"key-{i % 10}", f"value-{i}")
+        ds.delete("key-0")
+
+        size = os.path.getsize(self.path)
+        self.assertGreater(ds.dead_bytes[0], 0)
+
+        (stats,) = ds.compact()
+        self.assertEqual(stats.records, 9)
+        self.assertEqual(stats.bytes_before, size)
+        self.assertEqual(stats.bytes_after, os.path.getsize(self.path))
+        self.assertEqual(ds.dead_bytes[0], 0)
+        self.assertNotIn("key-0", ds.key_dir)
+
+        for i in range(1, 10):
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{90 + i}")
+
+        ds.set("key-1", "after compaction")
+        ds.close()
+
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("key-0"), "Key Not Found")
+        self.assertEqual(ds.get("key-1"), "after compaction")
+        self.assertEqual(ds.get("key-2"), "value-92")
+        ds.close()
+
+    def test_writes_during_compaction(self):
+        ds = KVStore(self.path)
+        for i in range(100):
+            ds.set(f"key-{i % 10}", f"value-{i}")
+
+        # writes racing with the copy end up in the tail of the active file
+        def progress(bytes_done):
+            ds.set("key-1", "raced")
+            ds.set("new", "raced")
+            ds.delete("key-2")
+
+        ds._compact_file(0, progress=progress)
+
+        self.assertEqual(ds.get("key-1"), "raced")
+        self.assertEqual(ds.get("new"), "raced")
+        self.assertEqual(ds.get("key-2"), "Key Not Found")
+        self.assertEqual(ds.get("key-3"), "value-93")
+        self.assertEqual(ds.write_pos, os.path.getsize(self.path))
+        ds.close()
+
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("key-1"), "raced")
+        self.assertEqual(ds.get("key-2"), "Key Not Found")
+        self.assertEqual(ds.get("key-3"), "value-93")
+        ds.close()
+
+    def test_compact_data_directory(self):
+        ds = KVStore(self.dir, max_file_size=512)
+        for i in range(60):
+            ds.set(f"key-{i % 6}", f"value-{i}")
+        ds.delete("key-0")
+        for i in range(30):
+            ds.set(f"other-{i}", "x")
+
+        sealed = ds._list_file_ids()[:-1]
+        before = {fid: os.path.getsize(ds._data_path(fid)) for fid in sealed}
+        results = ds.compact()
+        self.assertTrue(results)
+        for fid in sealed:
+            self.assertLessEqual(os.path.getsize(ds._data_path(fid)), before[fid])
+            self.assertIsNotNone(load_hint(ds._data_path(fid)))
+
+        self.assertEqual(ds.get("key-0"), "Key Not Found")
+        for i in range(1, 6):
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{54 + i}")
+        ds.close()
+
+        # deleted keys must not come back from older data files
+        ds = KVStore(self.dir, max_file_size=512)
+        self.assertEqual(ds.get("key-0"), "Key Not Found")
+        for i in range(1, 6):
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{54 + i}")
+        for i in range(30):
+            self.assertEqual(ds.get(f"other-{i}"), "x")
+        ds.close()
+
+    def test_background_compaction(self):
+        ds = KVStore(self.path)
+        for i in range(100):
+            ds.set(f"key-{i % 10}", f"value-{i}")
+
+        self.assertEqual(ds.compact(wait=False), [])
+        deadline = time.monotonic() + 10
+        while ds.compactor.runs == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(ds.compactor.runs, 1)
+        self.assertGreater(ds.compactor.total_reclaimed, 0)
+        self.assertEqual(ds.compactor.history[-1].records, 10)
+        self.assertFalse(ds.compactor.running)
+        for i in range(10):
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{90 + i}")
+        ds.close()
+
+    def test_dead_ratio_candidates(self):
+        ds = KVStore(self.path)
+        ds.compactor.dead_ratio = 0.5
+        for i in range(10):
+            ds.set(f"key-{i}", "value")
+        self.assertEqual(ds.compactor.candidates(), [])
+
+        for i in range(10):
+            ds.set(f"key-{i}", "value")
+        self.assertEqual(ds.compactor.candidates(), [0])
+        ds.close()
+
+        # dead bytes are recomputed on startup
+        ds = KVStore(self.path)
+        self.assertEqual(ds.dead_bytes[0], os.path.getsize(self.path) // 2)
+        ds.close()
+
+    def test_paused(self):
+        ds = KVStore(self.path)
+        for i in range(20):
+            ds.set(f"key-{i % 10}", i)
+
+        dead = ds.dead_bytes[0]
+        done = threading.Event()
+        compaction = threading.Thread(
+            target=lambda: (ds.compact(), done.set()),
+        )
+        with ds.compactor.paused():
+            compaction.start()
+            self.assertFalse(done.wait(0.2))
+            self.assertEqual(ds.dead_bytes[0], dead)
+        compaction.join()
+        self.assertEqual(ds.dead_bytes[0], 0)
+        ds.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,28 @@
+import glob
 import os
+import random
+import shutil
+import struct
 import sys
 import tempfile
+import threading
+import time
 import unittest
+import unittest.mock
+import zlib
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.disk_store import KVStore
-from src.errors import UnsupportedTypeError
+from src.codec import available_codecs
+from src.errors import (
+    MissingSerializerError,
+    UnsupportedCodecError,
+    UnsupportedTypeError,
+)
+from src.bloom import bloom_path, load_bloom
+from src.hint import hint_path, load_hint
+from src.serializer import JSONSerializer, PickleSerializer
 
 
 class TempStorageFile:
@@ -20,9 +36,12 @@ class TempStorageFile:
 
     def cleanup(self):
         """
-        deletes tempfiles created for db testing
+        deletes tempfiles created for db testing, along with the hint files
+        and other files kept next to the data file
         """
         os.remove(self.path)
+        for sidecar in glob.glob(glob.escape(self.path) + ".*"):
+            os.remove(sidecar)
         assert not os.path.exists(
             self.path
         ), f"""could not delete tempfile at {self.path}, please delete them manually!"""
@@ -185,6 +204,880 @@ class TestDiskStorage(unittest.TestCase):
 
         ds.close()
 
+    def test_sync_modes(self):
+        kvs = {"name": "Alice", "city": "New York", "age": "30"}
+
+        for mode in ("always", "interval", "batch", "none"):
+            ds = KVStore(self.file.path, sync_mode=mode, sync_interval_ms=10)
+            for k, v in kvs.items():
+                ds.set(k, v + mode)
+            ds.close()
+
+            ds = KVStore(self.file.path)
+            for k, v in kvs.items():
+                self.assertEqual(ds.get(k), v + mode)
+            ds.close()
+
+    def test_invalid_sync_mode(self):
+        with self.assertRaises(ValueError):
+            KVStore(self.file.path, sync_mode="sometimes")
+
+    def test_batch_sync(self):
+        ds = KVStore(self.file.path, sync_mode="batch", sync_batch_records=10)
+        for i in range(100):
+            ds.set(f"key-{i}", i)
+
+        self.assertEqual(ds.syncer.sync_count, 10)
+        ds.close()
+
+    def test_group_commit(self):
+        ds = KVStore(self.file.path, sync_mode="always")
+
+        def writer(n):
+            for i in range(50):
+                ds.set(f"key-{n}-{i}", i)
+
+        real_fsync = os.fsync
+
+        def slow_fsync(fd):
+            # a slow disk, the writers pile up behind the fsync in flight
+            time.sleep(0.005)
+            real_fsync(fd)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        with unittest.mock.patch("src.durability.fsync", side_effect=slow_fsync):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        # every write is durable, writers waiting together share an fsync
+        self.assertLess(ds.syncer.sync_count, 200)
+        for n in range(4):
+            for i in range(50):
+                self.assertEqual(ds.get(f"key-{n}-{i}"), i)
+        ds.close()
+
+    def test_concurrent_reads_and_writes(self):
+        ds = KVStore(self.file.path, sync_mode="none")
+        for i in range(20):
+            ds.set(f"key-{i}", f"{i}-0")
+
+        done = threading.Event()
+        errors = []
+
+        def writer():
+            for n in range(1, 200):
+                ds.set_many({f"key-{i}": f"{i}-{n}" for i in range(20)})
+            done.set()
+
+        def reader():
+            while not done.is_set():
+                i = len(errors) % 20
+                value = ds.get(f"key-{i}")
+                if not value.startswith(f"{i}-"):
+                    errors.append(value)
+                values = ds.get_many([f"key-{i}" for i in range(20)])
+                # a batch is seen as a whole or not at all
+                if len({v.split("-")[1] for v in values.values()}) != 1:
+                    errors.append(values)
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(ds.get("key-3"), "3-199")
+        ds.close()
+
+    def test_hint_file(self):
+        ds = KVStore(self.file.path)
+        for i in range(100):
+            ds.set(f"key-{i}", i)
+        ds.delete("key-0")
+        ds.close()
+
+        hint = load_hint(self.file.path)
+        self.assertIsNotNone(hint)
+        entries, data_sz = hint
+        # a single data file holds no older value for the tombstone of key-0
+        # to shadow, it is left out
+        self.assertEqual(len(entries), 99)
+        self.assertEqual(data_sz, os.path.getsize(self.file.path))
+
+        # records appended after the hint was written are found by a scan
+        ds = KVStore(self.file.path)
+        ds.set("key-1", "updated")
+        ds.set("new", "value")
+        ds.file.close()
+
+        ds = KVStore(self.file.path)
+        self.assertEqual(ds.get("key-0"), "Key Not Found")
+        self.assertEqual(ds.get("key-1"), "updated")
+        self.assertEqual(ds.get("key-2"), 2)
+        self.assertEqual(ds.get("new"), "value")
+        ds.close()
+
+    def test_corrupt_hint_file(self):
+        ds = KVStore(self.file.path)
+        for i in range(10):
+            ds.set(f"key-{i}", i)
+        ds.close()
+
+        with open(hint_path(self.file.path), "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"\xff")
+        self.assertIsNone(load_hint(self.file.path))
+
+        ds = KVStore(self.file.path)
+        for i in range(10):
+            self.assertEqual(ds.get(f"key-{i}"), i)
+        ds.close()
+
+    def test_set_many(self):
+        ds = KVStore(self.file.path)
+        kvs = {f"key-{i}": f"value-{i}" for i in range(100)}
+
+        ds.set_many(kvs)
+        self.assertEqual(ds.syncer.sync_count, 1)
+        for k, v in kvs.items():
+            self.assertEqual(ds.get(k), v)
+
+        ds.set_many([("key-0", "first"), ("key-0", "second")])
+        self.assertEqual(ds.get("key-0"), "second")
+
+        ds.delete_many(f"key-{i}" for i in range(50))
+        self.assertEqual(ds.syncer.sync_count, 3)
+        self.assertEqual(ds.get("key-1"), "Key Not Found")
+        ds.close()
+
+        ds = KVStore(self.file.path)
+        self.assertEqual(ds.get("key-0"), "Key Not Found")
+        self.assertEqual(ds.get("key-50"), "value-50")
+        ds.close()
+
+    def test_write_batch(self):
+        ds = KVStore(self.file.path)
+        ds.set("gone", "soon")
+
+        with ds.batch() as batch:
+            batch.set("foo", "bar")
+            batch.delete("gone")
+            self.assertEqual(len(batch), 2)
+            self.assertEqual(ds.get("foo"), "Key Not Found")
+
+        self.assertEqual(ds.get("foo"), "bar")
+        self.assertEqual(ds.get("gone"), "Key Not Found")
+
+        with self.assertRaises(RuntimeError):
+            with ds.batch() as batch:
+                batch.set("foo", "baz")
+                raise RuntimeError("abort")
+        self.assertEqual(ds.get("foo"), "bar")
+        ds.close()
+
+    def test_torn_batch(self):
+        ds = KVStore(self.file.path)
+        ds.set("before", "batch")
+        size = ds.write_pos
+        ds.set_many({f"key-{i}": "value" for i in range(10)})
+        ds.file.close()
+
+        # a crash in the middle of the batch write
+        with open(self.file.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.file.path) - 3)
+
+        ds = KVStore(self.file.path)
+        self.assertEqual(ds.get("before"), "batch")
+        for i in range(10):
+            self.assertEqual(ds.get(f"key-{i}"), "Key Not Found")
+        self.assertEqual(os.path.getsize(self.file.path), size)
+
+        ds.set("after", "restart")
+        ds.close()
+
+        ds = KVStore(self.file.path)
+        self.assertEqual(ds.get("after"), "restart")
+        self.assertEqual(ds.get("key-9"), "Key Not Found")
+        ds.close()
+
+    def test_batch_survives_compaction(self):
+        ds = KVStore(self.file.path)
+        ds.set_many({f"key-{i}": "value" for i in range(10)})
+        ds.set_many({f"key-{i}": "updated" for i in range(0, 10, 2)})
+        ds.compact()
+        ds.file.close()
+
+        ds = KVStore(self.file.path)
+        for i in range(10):
+            self.assertEqual(ds.get(f"key-{i}"), "updated" if i % 2 == 0 else "value")
+        ds.close()
+
+    def test_get_many(self):
+        ds = KVStore(self.file.path)
+        ds.set_many({f"key-{i}": f"value-{i}" for i in range(100)})
+        ds.delete("key-5")
+        ds.set("short-lived", "value", expiry=1)
+        ds.set(1234, "id")
+
+        keys = ["key-50", "key-5", "key-0", "missing", "short-lived", 1234]
+        self.assertEqual(
+            ds.get_many(keys),
+            {
+                "key-50": "value-50",
+                "key-5": "Key Not Found",
+                "key-0": "value-0",
+                "missing": "Key Not Found",
+                "short-lived": "value",
+                1234: "id",
+            },
+        )
+
+        keys = [f"key-{i}" for i in range(99, -1, -3)]
+        self.assertEqual(ds.get_many(keys), {k: ds.get(k) for k in keys})
+        ds.close()
+
+    def test_get_many_expired(self):
+        ds = KVStore(self.file.path)
+        ds.set("short-lived", "value", expiry=1)
+
+        # expired keys are deleted, the same way get() does
+        with unittest.mock.patch("time.time", return_value=time.time() + 2):
+            self.assertEqual(
+                ds.get_many(["short-lived"]), {"short-lived": "Key Not Found"}
+            )
+        self.assertNotIn("short-lived", ds.key_dir)
+        ds.close()
+
+
+class TestExpiry(unittest.TestCase):
+    def setUp(self):
+        self.file = TempStorageFile()
+
+    def tearDown(self):
+        self.file.cleanup()
+
+    def test_ttl_expire_persist(self):
+        ds = KVStore(self.file.path)
+        ds.set("forever", "value")
+        ds.set("short-lived", b"\x00value", expiry=10)
+        self.assertEqual(ds.ttl("forever"), -1)
+        self.assertIn(ds.ttl("short-lived"), (9, 10))
+        self.assertEqual(ds.ttl("missing"), -2)
+
+        self.assertTrue(ds.expire("forever", 100))
+        self.assertIn(ds.ttl("forever"), (99, 100))
+        self.assertFalse(ds.expire("missing", 100))
+        self.assertTrue(ds.persist("short-lived"))
+        self.assertFalse(ds.persist("short-lived"))
+        self.assertEqual(ds.ttl("short-lived"), -1)
+        self.assertEqual(ds.get("short-lived"), b"\x00value")
+        ds.close()
+
+        # the new expiry is on disk
+        ds = KVStore(self.file.path)
+        self.assertIn(ds.ttl("forever"), (99, 100))
+        self.assertEqual(ds.get("forever"), "value")
+        self.assertEqual(ds.ttl("short-lived"), -1)
+
+        self.assertTrue(ds.expire("forever", 0))
+        self.assertEqual(ds.get("forever"), "Key Not Found")
+        self.assertEqual(ds.ttl("forever"), -2)
+        ds.close()
+
+    def test_reap_expired(self):
+        ds = KVStore(self.file.path)
+        ds.set_many({f"key-{i}": i for i in range(100)}, expiry=1)
+        ds.set("forever", "value")
+        ds.set("renewed", "old", expiry=1)
+        ds.set("renewed", "new")
+
+        later = time.time() + 2
+        with unittest.mock.patch("time.time", return_value=later):
+            self.assertEqual(ds.reap_expired(limit=30), 30)
+            self.assertEqual(ds.reap_expired(), 70)
+            self.assertEqual(ds.reap_expired(), 0)
+            self.assertEqual(ds.ttl("key-5"), -2)
+        self.assertNotIn("key-5", ds.key_dir)
+        self.assertEqual(ds.get("forever"), "value")
+        self.assertEqual(ds.get("renewed"), "new")
+        self.assertEqual(len(ds.key_dir.expiring), 0)
+
+        # the values of the reaped keys are dead
+        self.assertGreater(ds.compact()[0].bytes_reclaimed, 0)
+        self.assertEqual(ds.get("renewed"), "new")
+        ds.close()
+
+    def test_reaped_key_set_again(self):
+        ds = KVStore(self.file.path)
+        ds.set("key", "old", expiry=1)
+        with unittest.mock.patch("time.time", return_value=time.time() + 2):
+            expired = ds.key_dir.expiring.pop_expired(int(time.time()))
+            # set again before the reaper writes its tombstone
+            ds.set("key", "new")
+            self.assertEqual(ds._expire_keys([k for k, _ in expired]), 0)
+        self.assertEqual(ds.get("key"), "new")
+        ds.close()
+
+    def test_expiring_keys_recovered(self):
+        ds = KVStore(self.file.path)
+        ds.set("short-lived", "value", expiry=1)
+        ds.set("long-lived", "value", expiry=100)
+        ds.close()
+
+        ds = KVStore(self.file.path)
+        self.assertEqual(len(ds.key_dir.expiring), 2)
+        with unittest.mock.patch("time.time", return_value=time.time() + 2):
+            self.assertEqual(ds.reap_expired(), 1)
+        self.assertEqual(ds.get("short-lived"), "Key Not Found")
+        self.assertEqual(ds.get("long-lived"), "value")
+        ds.close()
+
+    def test_misses_answered_in_memory(self):
+        ds = KVStore(self.file.path)
+        ds.set_many({f"key-{i}": i for i in range(10)})
+        ds.set("short-lived", "value", expiry=1)
+        ds.delete("key-0")
+        self.assertNotIn("key-0", ds.key_dir)
+        self.assertEqual(len(ds), 10)
+
+        with unittest.mock.patch("os.pread", side_effect=AssertionError):
+            self.assertEqual(ds.get("key-0"), "Key Not Found")
+            self.assertEqual(ds.get("missing"), "Key Not Found")
+            self.assertFalse(ds.exists("key-0"))
+            self.assertTrue(ds.exists("key-1"))
+            self.assertEqual(
+                ds.get_many(["key-0", "missing"]),
+                {"key-0": "Key Not Found", "missing": "Key Not Found"},
+            )
+            with unittest.mock.patch("time.time", return_value=time.time() + 2):
+                self.assertFalse(ds.exists("short-lived"))
+                self.assertEqual(len(ds), 9)
+                self.assertEqual(ds.get("short-lived"), "Key Not Found")
+        self.assertEqual(len(ds), 9)
+        self.assertEqual(ds.get("key-1"), 1)
+        ds.close()
+
+    def test_background_reaper(self):
+        ds = KVStore(self.file.path, reap_interval=0.05, reap_batch_size=10)
+        ds.set_many({f"key-{i}": i for i in range(50)}, expiry=1)
+        with unittest.mock.patch("time.time", return_value=time.time() + 2):
+            deadline = time.monotonic() + 5
+            while ds.reaper.reaped < 50 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(ds.reaper.reaped, 50)
+        self.assertEqual(len(ds.key_dir), 0)
+        ds.close()
+
+
+class TestValueCache(unittest.TestCase):
+    def setUp(self):
+        self.file = TempStorageFile()
+
+    def tearDown(self):
+        self.file.cleanup()
+
+    def test_hits_and_invalidation(self):
+        ds = KVStore(self.file.path, cache_size=1 << 20)
+        ds.set("foo", "bar")
+
+        self.assertEqual(ds.get("foo"), "bar")
+        self.assertEqual(ds.get("foo"), "bar")
+        self.assertEqual(ds.cache.hits, 1)
+        self.assertEqual(ds.cache.misses, 1)
+
+        ds.set("foo", "baz")
+        self.assertNotIn("foo", ds.cache)
+        self.assertEqual(ds.get("foo"), "baz")
+
+        ds.delete("foo")
+        self.assertEqual(ds.get("foo"), "Key Not Found")
+        self.assertNotIn("foo", ds.cache)
+
+        with ds.batch() as batch:
+            batch.set("a", "1")
+        ds.get("a")
+        ds.set_many({"a": "2"})
+        self.assertEqual(ds.get_many(["a", "foo"]), {"a": "2", "foo": "Key Not Found"})
+        self.assertEqual(ds.get_many(["a"]), {"a": "2"})
+        ds.close()
+
+    def test_expiry(self):
+        ds = KVStore(self.file.path, cache_size=1 << 20)
+        ds.set("short-lived", "value", expiry=1)
+        self.assertEqual(ds.get("short-lived"), "value")
+        self.assertIn("short-lived", ds.cache)
+
+        with unittest.mock.patch("time.time", return_value=time.time() + 2):
+            self.assertEqual(ds.get("short-lived"), "Key Not Found")
+        self.assertNotIn("short-lived", ds.key_dir)
+        ds.close()
+
+    def test_compaction(self):
+        ds = KVStore(self.file.path, cache_size=1 << 20, cache_policy="tinylfu")
+        for i in range(100):
+            ds.set(f"key-{i % 10}", f"value-{i}")
+        for i in range(10):
+            ds.get(f"key-{i}")
+
+        ds.compact()
+        for i in range(10):
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{90 + i}")
+        ds.set("key-0", "new")
+        self.assertEqual(ds.get("key-0"), "new")
+        ds.close()
+
+    def test_none_value(self):
+        ds = KVStore(self.file.path, serializer=JSONSerializer(), cache_size=1 << 20)
+        ds.set("null", None)
+        self.assertIsNone(ds.get("null"))
+
+        # a cached None is a hit, the key is not looked up again
+        with unittest.mock.patch.object(
+            ds, "_locate", wraps=ds._locate
+        ) as locate, unittest.mock.patch.object(
+            ds, "_locate_many", wraps=ds._locate_many
+        ) as locate_many:
+            self.assertIsNone(ds.get("null"))
+            self.assertEqual(ds.get_many(["null"]), {"null": None})
+        locate.assert_not_called()
+        locate_many.assert_called_once_with([])
+        self.assertEqual((ds.cache.hits, ds.cache.misses), (2, 1))
+        ds.close()
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            KVStore(self.file.path, cache_size=1024, cache_policy="fifo")
+
+
+class TestOrderedScans(unittest.TestCase):
+    def setUp(self):
+        self.file = TempStorageFile()
+
+    def tearDown(self):
+        self.file.cleanup()
+
+    def fill(self, ds):
+        for i in range(50):
+            ds.set(f"user:{i:02d}", f"name-{i}")
+            ds.set(f"item:{i:02d}", i)
+        for i in range(0, 50, 5):
+            ds.delete(f"user:{i:02d}")
+        ds.set("user:07", "short-lived", expiry=1)
+
+    def test_scans(self):
+        for ordered in (False, True):
+            ds = KVStore(self.file.path, ordered_index=ordered)
+            self.fill(ds)
+
+            users = [f"user:{i:02d}" for i in range(50) if i % 5]
+            items = [f"item:{i:02d}" for i in range(50)]
+            self.assertEqual(ds.keys(), items + users)
+            self.assertEqual(
+                list(ds.prefix_scan("user:")),
+                [(k, ds.get(k)) for k in users],
+            )
+            self.assertEqual(
+                list(ds.scan("item:10", "item:13")),
+                [("item:10", 10), ("item:11", 11), ("item:12", 12)],
+            )
+            self.assertEqual(len(list(ds.items())), 90)
+
+            # expired keys are left out without reading them
+            with unittest.mock.patch("time.time", return_value=time.time() + 2):
+                self.assertNotIn("user:07", ds.keys())
+                self.assertNotIn("user:07", dict(ds.prefix_scan("user:")))
+            ds.close()
+            os.truncate(self.file.path, 0)
+
+    def test_index_survives_compaction_and_restart(self):
+        ds = KVStore(self.file.path, ordered_index=True)
+        self.fill(ds)
+        keys = ds.keys()
+        ds.compact()
+        self.assertEqual(ds.keys(), keys)
+        ds.set("aaa", "first")
+        ds.close()
+
+        ds = KVStore(self.file.path, ordered_index=True)
+        self.assertEqual(ds.keys(), ["aaa"] + keys)
+        self.assertEqual(next(ds.items()), ("aaa", "first"))
+        ds.close()
+
+    def test_set_after_dropped_tombstone(self):
+        # in a data directory the tombstone of a key no older data file
+        # holds is dropped right away
+        directory = tempfile.mkdtemp()
+        try:
+            ds = KVStore(directory + os.sep, ordered_index=True)
+            ds.set("k", 1)
+            ds.delete("k")
+            ds.set("k", 2)
+            self.assertEqual(ds.get("k"), 2)
+            self.assertEqual(ds.keys(), ["k"])
+            self.assertEqual(list(ds.items()), [("k", 2)])
+            self.assertEqual(list(ds.scan()), [("k", 2)])
+            ds.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_random_ops_match_model(self):
+        rng = random.Random(7)
+        directory = tempfile.mkdtemp()
+        try:
+            ds = KVStore(directory + os.sep, ordered_index=True, max_file_size=2048)
+            model = {}
+            for i in range(3000):
+                key = f"key-{rng.randrange(40):02d}"
+                r = rng.random()
+                if r < 0.5:
+                    ds.set(key, i)
+                    model[key] = i
+                elif r < 0.8:
+                    ds.delete(key)
+                    model.pop(key, None)
+                else:
+                    self.assertEqual(ds.keys(), sorted(model))
+            self.assertEqual(ds.keys(), sorted(model))
+            self.assertEqual(dict(ds.items()), model)
+            ds.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_scan_pages(self):
+        ds = KVStore(self.file.path, sync_mode="none", ordered_index=True)
+        ds.set_many((f"key-{i:05d}", i) for i in range(2500))
+        scanned = list(ds.scan())
+        self.assertEqual(len(scanned), 2500)
+        self.assertEqual(scanned[1234], ("key-01234", 1234))
+        ds.close()
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.file = TempStorageFile()
+        self.value = '{"user": "pyk", "roles": ["admin", "dev"]}' * 50
+
+    def tearDown(self):
+        self.file.cleanup()
+
+    def test_codecs(self):
+        for codec in available_codecs():
+            ds = KVStore(self.file.path, compression=codec)
+            ds.set("json", self.value)
+            ds.set("small", "tiny")
+            self.assertEqual(ds.get("json"), self.value)
+            self.assertEqual(ds.get("small"), "tiny")
+            self.assertLess(ds.key_dir["json"].size, len(self.value) // 5)
+            ds.close()
+            os.truncate(self.file.path, 0)
+
+    def test_mixed_file(self):
+        ds = KVStore(self.file.path, compression="zlib")
+        ds.set("compressed", self.value)
+        ds.close()
+
+        # records say how they were stored, settings can change over time
+        ds = KVStore(self.file.path, compression="lzma")
+        ds.set("lzma", self.value)
+        ds.close()
+        ds = KVStore(self.file.path)
+        ds.set("plain", self.value)
+        for key in ("compressed", "lzma", "plain"):
+            self.assertEqual(ds.get(key), self.value)
+        self.assertEqual(
+            ds.get_many(["compressed", "plain"]),
+            {"compressed": self.value, "plain": self.value},
+        )
+
+        ds.compact()
+        self.assertEqual(ds.get("compressed"), self.value)
+        ds.close()
+
+    def test_corruption_detected_before_decompression(self):
+        ds = KVStore(self.file.path, compression="zlib")
+        ds.set("json", self.value)
+        entry = ds.key_dir["json"]
+        with open(self.file.path, "r+b") as f:
+            f.seek(entry.pos + entry.size - 10)
+            f.write(b"0123456789")
+        self.assertEqual(ds.get("json"), "Invalid/corrupted")
+        ds.close()
+
+    def test_unsupported_codec(self):
+        with self.assertRaises(UnsupportedCodecError):
+            KVStore(self.file.path, compression="brotli")
+
+
+class TestValueTypes(unittest.TestCase):
+    def setUp(self):
+        self.file = TempStorageFile()
+
+    def tearDown(self):
+        self.file.cleanup()
+
+    def test_native_types(self):
+        values = {
+            "str": "bar",
+            "unicode": "naïve café ☕",
+            "ключ": "значение",
+            "bytes": bytes(range(256)),
+            "empty": b"",
+            "int": -(2**70),
+            "float": 0.1,
+            "true": True,
+            "false": False,
+        }
+        ds = KVStore(self.file.path)
+        ds.set_many(values)
+        for key, value in values.items():
+            self.assertEqual(ds.get(key), value)
+            self.assertIs(type(ds.get(key)), type(value))
+        ds.close()
+
+        ds = KVStore(self.file.path)
+        self.assertEqual(ds.get_many(values), values)
+        ds.compact()
+        self.assertEqual(dict(ds.items()), values)
+        ds.close()
+
+    def test_sizes_in_bytes(self):
+        ds = KVStore(self.file.path)
+        ds.set("ключ", "значение")
+        ds.set("blob", bytes(1000))
+        # key and value sizes are counted in bytes, binary values are stored
+        # as they are
+        self.assertEqual(ds.key_dir["ключ"].size, 24 + 8 + 16)
+        self.assertEqual(ds.key_dir["blob"].size, 24 + 4 + 1000)
+        ds.close()
+
+    def test_serializer(self):
+        value = {"user": "pyk", "roles": ["admin", "dev"]}
+        for serializer in (JSONSerializer(), PickleSerializer()):
+            ds = KVStore(self.file.path, serializer=serializer)
+            ds.set("json", value)
+            self.assertEqual(ds.get("json"), value)
+            ds.close()
+
+            ds = KVStore(self.file.path, serializer=serializer)
+            self.assertEqual(ds.get("json"), value)
+            ds.close()
+            os.truncate(self.file.path, 0)
+
+    def test_missing_serializer(self):
+        ds = KVStore(self.file.path, serializer=JSONSerializer())
+        ds.set("list", [1, 2, 3])
+        ds.close()
+
+        ds = KVStore(self.file.path)
+        with self.assertRaises(UnsupportedTypeError):
+            ds.set("list", [1, 2, 3])
+        with self.assertRaises(MissingSerializerError):
+            ds.get("list")
+        ds.close()
+
+    def test_old_records(self):
+        # records written before values had a type tag hold UTF-8 text
+        value = "42".encode("utf-8")
+        hdr = struct.pack(
+            "<LLLLLL", zlib.crc32(value), int(time.time()), 0, 0, 3, len(value)
+        )
+        with open(self.file.path, "wb") as f:
+            f.write(hdr + b"old" + value)
+
+        ds = KVStore(self.file.path)
+        self.assertEqual(ds.get("old"), "42")
+        ds.close()
+
+
+class TestMemoryMappedReads(unittest.TestCase):
+    def setUp(self):
+        self.file = TempStorageFile()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.file.cleanup()
+        shutil.rmtree(self.dir)
+
+    def test_get(self):
+        ds = KVStore(self.file.path, use_mmap=True)
+        self.assertEqual(ds.get("foo"), "Key Not Found")
+
+        # the map grows with the active file
+        for i in range(100):
+            ds.set(f"key-{i}", f"value-{i}")
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{i}")
+        ds.delete("key-0")
+
+        self.assertEqual(ds.get("key-0"), "Key Not Found")
+        keys = [f"key-{i}" for i in range(100)]
+        self.assertEqual(ds.get_many(keys), {k: ds.get(k) for k in keys})
+        ds.close()
+
+    def test_compaction_remaps(self):
+        ds = KVStore(self.file.path, use_mmap=True)
+        for i in range(100):
+            ds.set(f"key-{i % 10}", f"value-{i}")
+        self.assertEqual(ds.get("key-1"), "value-91")
+
+        ds.compact()
+        for i in range(10):
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{90 + i}")
+        ds.close()
+
+    def test_data_directory(self):
+        ds = KVStore(self.dir, max_file_size=512, use_mmap=True)
+        for i in range(60):
+            ds.set(f"key-{i % 6}", f"value-{i}")
+            self.assertEqual(ds.get(f"key-{i % 6}"), f"value-{i}")
+        for i in range(30):
+            ds.set(f"other-{i}", "x")
+
+        ds.compact()
+        for i in range(6):
+            self.assertEqual(ds.get(f"key-{i}"), f"value-{54 + i}")
+        for i in range(30):
+            self.assertEqual(ds.get(f"other-{i}"), "x")
+        ds.close()
+
+
+class TestDataDirectory(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_rotation(self):
+        ds = KVStore(self.dir, max_file_size=1024)
+        for i in range(100):
+            ds.set(f"key-{i}", f"value-{i}")
+        for i in range(0, 100, 2):
+            ds.set(f"key-{i}", f"updated-{i}")
+        ds.delete("key-1")
+
+        file_ids = ds._list_file_ids()
+        self.assertGreater(len(file_ids), 1)
+        self.assertEqual(file_ids[-1], ds.file_id)
+        for file_id in file_ids:
+            self.assertLessEqual(os.path.getsize(ds._data_path(file_id)), 1024)
+        # sealed data files get their hint file when they are rotated
+        for file_id in file_ids[:-1]:
+            self.assertIsNotNone(load_hint(ds._data_path(file_id)))
+
+        self.assertEqual(ds.get("key-3"), "value-3")
+        self.assertEqual(ds.get("key-4"), "updated-4")
+
+        keys = [f"key-{i}" for i in range(100)]
+        self.assertEqual(ds.get_many(keys), {k: ds.get(k) for k in keys})
+        ds.close()
+
+        ds = KVStore(self.dir, max_file_size=1024)
+        self.assertEqual(ds._list_file_ids(), file_ids)
+        for i in range(100):
+            expected = f"updated-{i}" if i % 2 == 0 else f"value-{i}"
+            if i == 1:
+                expected = "Key Not Found"
+            self.assertEqual(ds.get(f"key-{i}"), expected)
+
+        # writes keep going to the newest data file after a restart
+        ds.set("key-3", "after restart")
+        self.assertEqual(ds.key_dir["key-3"].file_id, file_ids[-1])
+        self.assertEqual(ds.get("key-3"), "after restart")
+        ds.close()
+
+    def test_tombstones_shadow_older_files(self):
+        ds = KVStore(self.dir, max_file_size=1024)
+        for i in range(50):
+            ds.set(f"key-{i}", f"value-{i}")
+        ds.delete_many(f"key-{i}" for i in range(0, 50, 2))
+        ds.set("filler", "x" * 2048)
+        self.assertEqual(len(ds), 26)
+
+        # the tombstones are kept by compaction and hint files, except in
+        # the oldest data file
+        ds.compact()
+        ds.close()
+        ds = KVStore(self.dir, max_file_size=1024)
+        self.assertEqual(len(ds), 26)
+        for i in range(50):
+            expected = "Key Not Found" if i % 2 == 0 else f"value-{i}"
+            self.assertEqual(ds.get(f"key-{i}"), expected)
+        ds.close()
+
+    def test_bloom_filters(self):
+        ds = KVStore(self.dir, max_file_size=1024)
+        for i in range(100):
+            ds.set(f"old-{i}", f"value-{i}")
+        ds.close()
+
+        ds = KVStore(self.dir)
+        ds._build_filters(threading.Event())
+        sealed = ds._list_file_ids()[:-1]
+        self.assertEqual(sorted(ds.filters), sealed)
+        for file_id in sealed:
+            self.assertTrue(os.path.exists(bloom_path(ds._data_path(file_id))))
+            self.assertIsNotNone(ds.filters[file_id])
+
+        # a tombstone is only kept if an older data file may hold the key
+        ds.set("fresh", "value")
+        ds.delete_many(["fresh", "old-3"])
+        self.assertIsNone(ds.key_dir.find("fresh"))
+        self.assertTrue(ds.key_dir.find("old-3").deleted)
+
+        # compaction rewrites the filter of the file it compacts
+        ds.compact()
+        for file_id in sealed:
+            self.assertIsNotNone(load_bloom(ds._data_path(file_id)))
+            self.assertIsNotNone(ds.filters[file_id])
+        ds.close()
+
+        ds = KVStore(self.dir)
+        self.assertEqual(ds.get("fresh"), "Key Not Found")
+        self.assertEqual(ds.get("old-3"), "Key Not Found")
+        self.assertEqual(ds.get("old-4"), "value-4")
+        self.assertEqual(len(ds), 99)
+        ds.close()
+
+    def test_new_directory(self):
+        data_dir = os.path.join(self.dir, "store") + os.sep
+        ds = KVStore(data_dir)
+        ds.set("foo", "bar")
+        ds.close()
+
+        self.assertTrue(os.path.isdir(data_dir))
+        ds = KVStore(data_dir)
+        self.assertEqual(ds.get("foo"), "bar")
+        ds.close()
+
+    def test_parallel_recovery(self):
+        ds = KVStore(self.dir, max_file_size=1024)
+        for i in range(300):
+            ds.set(f"key-{i % 40}", f"value-{i}")
+        for i in range(0, 40, 3):
+            ds.delete(f"key-{i}")
+        ds.set_many({"a": 1, "b": 2})
+        ds.close()
+        self.assertGreater(len(ds._list_file_ids()), 4)
+
+        # a crash left some of the data files without their hint file
+        for hint in glob.glob(os.path.join(self.dir, "*.hint"))[::2]:
+            os.remove(hint)
+
+        serial = KVStore(self.dir)
+        expected = sorted(serial.key_dir.records())
+        serial.close()
+
+        ds = KVStore(self.dir, recovery_workers=4)
+        self.assertEqual(sorted(ds.key_dir.records()), expected)
+        self.assertEqual(ds.dead_bytes, serial.dead_bytes)
+        self.assertEqual(ds.get("key-1"), "value-281")
+        self.assertEqual(ds.get("key-3"), "Key Not Found")
+        ds.close()
+
 
 if __name__ == "__main__":
     unittest.main()
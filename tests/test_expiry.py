@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.expiry import ExpiryIndex
+from src.keydir import KeyDir
+
+
+class ExpiryIndexTester(unittest.TestCase):
+    def test_pop_expired(self):
+        index = ExpiryIndex()
+        for i in range(10):
+            index.add(f"key-{i}", 100 + i)
+        self.assertEqual(index.next_expiry(), 100)
+
+        self.assertEqual(index.pop_expired(99), [])
+        self.assertEqual(
+            index.pop_expired(104, limit=3),
+            [("key-0", 100), ("key-1", 101), ("key-2", 102)],
+        )
+        self.assertEqual(index.pop_expired(104), [("key-3", 103), ("key-4", 104)])
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.next_expiry(), 105)
+
+    def test_updates_leave_stale_entries(self):
+        index = ExpiryIndex()
+        index.add("a", 100)
+        index.add("b", 101)
+        index.add("a", 200)
+        index.discard("b")
+        self.assertEqual(index.deadline("a"), 200)
+        self.assertNotIn("b", index)
+        self.assertEqual(index.next_expiry(), 200)
+        self.assertEqual(index.pop_expired(150), [])
+        self.assertEqual(index.pop_expired(200), [("a", 200)])
+        self.assertIsNone(index.next_expiry())
+
+    def test_rebuild(self):
+        index = ExpiryIndex()
+        for n in range(10):
+            for i in range(1000):
+                index.add(f"key-{i}", 100 + n)
+        # stale entries do not pile up
+        self.assertLess(len(index._heap), 5000)
+        self.assertEqual(len(index.pop_expired(108)), 0)
+        self.assertEqual(len(index.pop_expired(109)), 1000)
+
+    def test_count_expired(self):
+        index = ExpiryIndex()
+        for i in range(100):
+            index.add(f"key-{i}", 100 + i)
+        index.discard("key-3")
+        index.add("key-4", 1000)
+        index.add("key-4", 104)
+        self.assertEqual(index.count_expired(99), 0)
+        self.assertEqual(index.count_expired(109), 9)
+        self.assertEqual(index.count_expired(1000), 99)
+        self.assertEqual(len(index), 99)
+
+    def test_key_dir(self):
+        key_dir = KeyDir()
+        key_dir.put("expiring", 1, 0, 10, expiry=100)
+        key_dir.put("forever", 1, 10, 10)
+        key_dir.put("deleted", 1, 20, 10, expiry=100, deleted=1)
+        self.assertEqual(list(key_dir.expiring.pop_expired(100)), [("expiring", 100)])
+
+        key_dir.put("expiring", 2, 30, 10, expiry=200)
+        key_dir.put("expiring", 3, 40, 10)
+        self.assertNotIn("expiring", key_dir.expiring)
+        key_dir.put("forever", 4, 50, 10, expiry=300)
+        del key_dir["forever"]
+        self.assertEqual(len(key_dir.expiring), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
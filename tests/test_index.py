@@ -0,0 +1,71 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.index import SortedKeys, prefix_end
+
+
+class SortedKeysTester(unittest.TestCase):
+    def test_range(self):
+        keys = [f"key-{i:03d}" for i in range(100)]
+        shuffled = keys[:]
+        random.shuffle(shuffled)
+
+        index = SortedKeys(shuffled[:50])
+        for key in shuffled[50:]:
+            index.add(key)
+        self.assertEqual(list(index), keys)
+        self.assertEqual(index.range("key-010", "key-020"), keys[10:20])
+        self.assertEqual(index.range("key-095"), keys[95:])
+        self.assertEqual(index.range(end="key-003"), keys[:3])
+        self.assertEqual(index.range(limit=5), keys[:5])
+        self.assertEqual(len(index), 100)
+
+    def test_add_discard(self):
+        index = SortedKeys(["b", "c"])
+        index.discard("b")
+        index.add("a")
+        index.discard("a")
+        index.add("d")
+        self.assertEqual(index.range(), ["c", "d"])
+
+        # removed, then added again before a merge
+        index.discard("c")
+        index.add("c")
+        self.assertEqual(index.range(), ["c", "d"])
+        self.assertEqual(len(index), 2)
+
+    def test_discard_missing(self):
+        index = SortedKeys(["b"])
+        # keys it does not hold are ignored, added again they are there
+        index.discard("a")
+        index.discard("b")
+        index.discard("b")
+        index.add("a")
+        index.add("b")
+        index.add("b")
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.range(), ["a", "b"])
+
+        index.discard("a")
+        index.discard("a")
+        index.add("a")
+        self.assertEqual(index.range(), ["a", "b"])
+
+    def test_prefix(self):
+        index = SortedKeys(["user:1", "user:2", "user;", "users", "usa", "u"])
+        self.assertEqual(index.prefix("user:"), ["user:1", "user:2"])
+        self.assertEqual(index.prefix("user"), ["user:1", "user:2", "user;", "users"])
+        self.assertEqual(index.prefix(""), sorted(index))
+
+    def test_prefix_end(self):
+        self.assertEqual(prefix_end("ab"), "ac")
+        self.assertEqual(prefix_end("a\U0010ffff"), "b")
+        self.assertIsNone(prefix_end(""))
+
+
+if __name__ == "__main__":
+    unittest.main()
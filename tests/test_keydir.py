@@ -0,0 +1,112 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.format import KVEntry
+from src.keydir import KeyDir
+
+
+class KeyDirTester(unittest.TestCase):
+    def test_put_get(self):
+        kd = KeyDir()
+        kd.put("a", 10, 0, 30, expiry=20, deleted=0, file_id=3)
+        entry = kd.get("a")
+        self.assertEqual(entry.timestamp, 10)
+        self.assertEqual(entry.pos, 0)
+        self.assertEqual(entry.size, 30)
+        self.assertEqual(entry.expiry, 20)
+        self.assertEqual(entry.file_id, 3)
+        self.assertIsNone(kd.get("b"))
+        self.assertIn("a", kd)
+        self.assertEqual(len(kd), 1)
+
+    def test_overwrite(self):
+        kd = KeyDir()
+        kd["a"] = KVEntry(1, 0, 30)
+        kd["a"] = KVEntry(2, 30, 40)
+        self.assertEqual(len(kd), 1)
+        self.assertEqual(kd["a"].pos, 30)
+        self.assertEqual(kd["a"].timestamp, 2)
+
+    def test_entries_are_copies(self):
+        kd = KeyDir()
+        kd.put("a", 1, 0, 30)
+        kd["a"].pos = 100
+        self.assertEqual(kd["a"].pos, 0)
+
+    def test_delete_reuses_slot(self):
+        kd = KeyDir()
+        for i in range(10):
+            kd.put(f"k{i}", i, i * 10, 10)
+        del kd["k3"]
+        self.assertEqual(kd.pop("k4").pos, 40)
+        self.assertIsNone(kd.pop("k4"))
+        self.assertNotIn("k3", kd)
+        self.assertEqual(len(kd), 8)
+
+        kd.put("new1", 1, 1000, 10)
+        kd.put("new2", 1, 2000, 10)
+        self.assertEqual(len(kd._pos), 10)
+        self.assertEqual(kd["new1"].pos, 1000)
+        self.assertEqual(kd["new2"].pos, 2000)
+        self.assertEqual(kd["k5"].pos, 50)
+        with self.assertRaises(KeyError):
+            kd["k3"]
+
+    def test_records_and_live_bytes(self):
+        kd = KeyDir()
+        kd.put("a", 1, 0, 30, file_id=0)
+        kd.put("b", 1, 30, 40, file_id=0)
+        kd.put("c", 1, 0, 50, file_id=1)
+        kd.put("d", 1, 50, 24, deleted=1, file_id=1)
+
+        self.assertEqual(
+            sorted(kd.records(0)), [(1, 0, 0, 0, 30, "a"), (1, 0, 0, 30, 40, "b")]
+        )
+        self.assertEqual(len(list(kd.records())), 4)
+        self.assertEqual(kd.live_bytes(), {0: 70, 1: 50})
+
+    def test_tombstones(self):
+        kd = KeyDir()
+        kd.put("a", 1, 0, 30, expiry=100)
+        kd.put("a", 2, 30, 24, deleted=1)
+        # tombstones are not live keys, but records() still has them
+        self.assertIsNone(kd.get("a"))
+        self.assertNotIn("a", kd)
+        self.assertEqual(len(kd), 0)
+        self.assertEqual(kd.find("a").pos, 30)
+        self.assertEqual(kd.tombstone_count(), 1)
+        self.assertEqual(list(kd.records()), [(2, 0, 1, 30, 24, "a")])
+        self.assertNotIn("a", kd.expiring)
+
+        kd.put("a", 3, 54, 30)
+        self.assertEqual(kd["a"].pos, 54)
+        self.assertEqual(kd.tombstone_count(), 0)
+        self.assertEqual(len(kd._pos), 1)
+
+        kd.put("b", 4, 84, 24, deleted=1)
+        del kd["b"]
+        self.assertIsNone(kd.find("b"))
+
+    def test_drop_tombstones(self):
+        kd = KeyDir(keep_tombstones=False)
+        kd.put("a", 1, 0, 30)
+        kd.put("a", 2, 30, 24, deleted=1)
+        kd.put("b", 2, 54, 24, deleted=1)
+        self.assertIsNone(kd.find("a"))
+        self.assertEqual(list(kd.records()), [])
+        kd.put("c", 3, 78, 30)
+        self.assertEqual(len(kd._pos), 1)
+
+    def test_clear(self):
+        kd = KeyDir()
+        kd.put("a", 1, 0, 30)
+        kd.clear()
+        self.assertEqual(len(kd), 0)
+        self.assertEqual(list(kd.items()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,262 @@
+import glob
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.compact import shrink
+from src.disk_store import KVStore
+from src.format import HEADER_SIZE
+from src.hint import hint_path
+from src.recovery import (
+    CORRUPT_RECORD,
+    TORN_BATCH,
+    TORN_RECORD,
+    load_data_file,
+)
+
+
+class SimulatedCrash(BaseException):
+    pass
+
+
+class CrashingFile:
+    """
+    wraps the append handle of a store, the write that reaches budget bytes
+    is cut short there and the process "dies" before it can clean up
+    """
+
+    def __init__(self, file, budget: int):
+        self.file = file
+        self.budget = budget
+
+    def write(self, data: bytes) -> int:
+        if len(data) <= self.budget:
+            self.budget -= len(data)
+            return self.file.write(data)
+        self.file.write(data[: self.budget])
+        self.file.flush()
+        raise SimulatedCrash
+
+    def truncate(self, size: int) -> int:
+        raise SimulatedCrash
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def abandon(ds: KVStore) -> None:
+    """
+    drops a store that crashed, without anything close() would write
+    """
+    ds.compactor.stop()
+    ds.reaper.stop()
+    ds.filter_builder.stop()
+    ds.file.file.close()
+
+
+def run_workload(ds: KVStore, rng: random.Random, ops: int) -> dict:
+    """
+    runs random sets, deletes and batches until ops were done or the store
+    crashed, returns what was acknowledged
+    """
+    acked: dict = {}
+    try:
+        for i in range(ops):
+            key = f"key-{rng.randrange(20)}"
+            r = rng.random()
+            if r < 0.6:
+                ds.set(key, rng.choice([i, f"value-{i}", b"\x00" * i]))
+                acked[key] = ds.get(key)
+            elif r < 0.8:
+                ds.delete(key)
+                acked.pop(key, None)
+            else:
+                items = {f"key-{rng.randrange(20)}": i for _ in range(5)}
+                ds.set_many(items)
+                acked.update(items)
+    except SimulatedCrash:
+        pass
+    return acked
+
+
+class TestCrashRecovery(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        for name in glob.glob(glob.escape(self.path) + "*"):
+            os.remove(name)
+
+    def check_recovered(self, acked: dict, size: int) -> KVStore:
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get_many(acked), acked)
+        self.assertEqual(len(ds), len(acked))
+        self.assertEqual(os.path.getsize(self.path), ds.write_pos)
+        self.assertEqual(sum(d.size for d in ds.discarded), size - ds.write_pos)
+        return ds
+
+    def test_writes_killed_at_random_offsets(self):
+        rng = random.Random(23)
+        for _ in range(40):
+            self.tearDown()
+            ds = KVStore(self.path)
+            ds.file = CrashingFile(ds.file, rng.randrange(20_000))
+            acked = run_workload(ds, rng, 1000)
+            abandon(ds)
+
+            size = os.path.getsize(self.path)
+            ds = self.check_recovered(acked, size)
+
+            # the store keeps working after recovery
+            ds.set("after", "restart")
+            ds.close()
+            ds = KVStore(self.path)
+            self.assertEqual(ds.get("after"), "restart")
+            self.assertEqual(ds.discarded, [])
+            ds.close()
+
+    def test_truncated_at_every_offset(self):
+        ds = KVStore(self.path)
+        boundaries, states, acked = [0], [{}], {}
+        for i in range(6):
+            if i == 3:
+                items = {f"batch-{j}": j for j in range(3)}
+                ds.set_many(items)
+                acked.update(items)
+            else:
+                ds.set(f"key-{i}", f"value-{i}")
+                acked[f"key-{i}"] = f"value-{i}"
+            boundaries.append(ds.write_pos)
+            states.append(dict(acked))
+        ds.close()
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        for cut in range(len(data) + 1):
+            with open(self.path, "wb") as f:
+                f.write(data[:cut])
+            last = max(i for i, b in enumerate(boundaries) if b <= cut)
+            ds = self.check_recovered(states[last], cut)
+            self.assertEqual(ds.write_pos, boundaries[last])
+            if cut != boundaries[last]:
+                (tail,) = ds.discarded
+                self.assertEqual(tail.offset, boundaries[last])
+                self.assertIn(tail.reason, (TORN_RECORD, TORN_BATCH))
+            ds.close()
+
+    def test_corrupt_record(self):
+        ds = KVStore(self.path)
+        for i in range(10):
+            ds.set(f"key-{i}", f"value-{i}")
+        pos = ds.key_dir["key-4"].pos
+        ds.close()
+
+        # a bit flipped in the value of key-4
+        with open(self.path, "r+b") as f:
+            f.seek(pos + HEADER_SIZE + len("key-4") + 1)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0x10]))
+        size = os.path.getsize(self.path)
+
+        # the hint file of a cleanly closed store is trusted, without it
+        # the data file is scanned
+        os.remove(hint_path(self.path))
+
+        # everything from the corrupt record on is discarded
+        loaded = load_data_file(self.path)
+        self.assertEqual((loaded.valid_sz, loaded.reason), (pos, CORRUPT_RECORD))
+        ds = self.check_recovered({f"key-{i}": f"value-{i}" for i in range(4)}, size)
+        self.assertEqual(ds.discarded[0].reason, CORRUPT_RECORD)
+        ds.close()
+
+    def test_garbage_header(self):
+        ds = KVStore(self.path)
+        ds.set("foo", "bar")
+        size = ds.write_pos
+        ds.close()
+
+        # unknown flags, and a value length running far past the end
+        for garbage in (b"\xff" * HEADER_SIZE, b"\x00" * 16 + b"\xff" * 8):
+            with open(self.path, "r+b") as f:
+                f.truncate(size)
+                f.seek(size)
+                f.write(garbage + b"x" * 100)
+            ds = self.check_recovered({"foo": "bar"}, size + HEADER_SIZE + 100)
+            ds.close()
+
+    def test_compaction_crash_before_swap(self):
+        ds = KVStore(self.path)
+        for i in range(100):
+            ds.set(f"key-{i % 10}", i)
+        ds.close()
+        with open(self.path, "rb") as f:
+            before = f.read()
+
+        # the compacted file is complete but the process dies before the
+        # swap, the data file is untouched
+        with unittest.mock.patch("src.compact.os.replace", side_effect=SimulatedCrash):
+            with self.assertRaises(SimulatedCrash):
+                shrink(self.path)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), before)
+
+        ds = self.check_recovered({f"key-{i}": 90 + i for i in range(10)}, len(before))
+        ds.close()
+
+    def test_compaction_swap_is_durable(self):
+        ds = KVStore(self.path)
+        for i in range(100):
+            ds.set(f"key-{i % 10}", i)
+        ds.close()
+
+        calls = []
+        real_replace = os.replace
+        with unittest.mock.patch(
+            "src.compact.os.replace",
+            side_effect=lambda *a: (calls.append("replace"), real_replace(*a)),
+        ), unittest.mock.patch(
+            "src.compact.fsync_dir", side_effect=lambda d: calls.append("fsync_dir")
+        ):
+            shrink(self.path)
+        # the data file swap, then the hint file
+        self.assertEqual(calls[:2], ["replace", "fsync_dir"])
+
+
+class TestDataDirectoryRecovery(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_torn_active_file(self):
+        ds = KVStore(self.dir, max_file_size=1024)
+        for i in range(100):
+            ds.set(f"key-{i}", i)
+        active = ds._data_path(ds.file_id)
+        ds.file = CrashingFile(ds.file, 10)
+        with self.assertRaises(SimulatedCrash):
+            ds.set("torn", "x" * 100)
+        abandon(ds)
+
+        ds = KVStore(self.dir)
+        keys = [f"key-{i}" for i in range(100)]
+        self.assertEqual(ds.get_many(keys), {k: i for i, k in enumerate(keys)})
+        self.assertEqual(ds.get("torn"), "Key Not Found")
+        self.assertEqual(
+            [(d.data_path, d.size, d.reason) for d in ds.discarded],
+            [(active, 10, TORN_RECORD)],
+        )
+        ds.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
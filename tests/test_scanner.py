@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.format import HEADER_SIZE, KVData, KVHeader
+from src.scanner import RecordScanner, scan_records
+
+
+def encode(key: str, value: str) -> bytes:
+    hdr = KVHeader(
+        checksum=zlib.crc32(value.encode("utf-8")),
+        timestamp=1,
+        key_sz=len(key),
+        value_sz=len(value),
+    )
+    return KVData(header=hdr, key=key, value=value).encode_kv()[1]
+
+
+class ScannerTester(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.records = [(f"key-{i}", "v" * (i * 7 % 50)) for i in range(100)]
+        # one record larger than the chunks used below
+        self.records.append(("large", "x" * 1000))
+        with open(self.path, "wb") as f:
+            for key, value in self.records:
+                f.write(encode(key, value))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def check(self, scanned, records):
+        pos = 0
+        self.assertEqual(len(scanned), len(records))
+        for (offset, hdr, key, value), (k, v) in zip(scanned, records):
+            self.assertEqual(offset, pos)
+            self.assertEqual(bytes(key), k.encode())
+            self.assertEqual(bytes(value), v.encode())
+            self.assertEqual(hdr[0], zlib.crc32(value))
+            pos += HEADER_SIZE + hdr[4] + hdr[5]
+
+    def test_scan(self):
+        self.check(list(scan_records(self.path)), self.records)
+
+    def test_small_chunks(self):
+        # records cross chunk boundaries, the large one spans several
+        for chunk_size in (1, 30, 64, 100):
+            scanned = list(scan_records(self.path, chunk_size=chunk_size))
+            self.check(scanned, self.records)
+
+    def test_start_end(self):
+        offsets = [r[0] for r in scan_records(self.path)]
+        scanned = list(scan_records(self.path, offsets[10], offsets[20]))
+        self.assertEqual([r[0] for r in scanned], offsets[10:20])
+
+    def test_torn_tail(self):
+        size = os.path.getsize(self.path)
+        for cut in (size - 1, size - 1000, size - 1010):
+            with open(self.path, "r+b") as f:
+                f.truncate(cut)
+            scanner = RecordScanner(self.path, chunk_size=64)
+            scanned = list(scanner)
+            self.check(scanned, self.records[:-1])
+            self.assertTrue(scanner.torn)
+            self.assertLess(scanner.pos, scanner.end)
+
+        with open(self.path, "r+b") as f:
+            f.truncate(scanner.pos)
+        scanner = RecordScanner(self.path)
+        self.assertEqual(len(list(scanner)), 100)
+        self.assertFalse(scanner.torn)
+
+
+if __name__ == "__main__":
+    unittest.main()
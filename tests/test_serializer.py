@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.errors import MissingSerializerError, UnsupportedTypeError
+from src.serializer import (
+    VALUE_BYTES,
+    VALUE_SERIALIZED,
+    VALUE_STR,
+    JSONSerializer,
+    decode_value,
+    encode_value,
+)
+
+
+class SerializerTester(unittest.TestCase):
+    def test_round_trip(self):
+        for value in ("text", "ünïcode", b"\x00\xff", 0, -7, 2**64, 1.5, True, False):
+            tag, data = encode_value(value)
+            decoded = decode_value(tag, memoryview(data))
+            self.assertEqual(decoded, value)
+            self.assertIs(type(decoded), type(value))
+
+    def test_bytes_stored_as_they_are(self):
+        self.assertEqual(encode_value(b"\x00\xff"), (VALUE_BYTES, b"\x00\xff"))
+        self.assertEqual(encode_value(bytearray(b"ab")), (VALUE_BYTES, b"ab"))
+        self.assertEqual(encode_value("é"), (VALUE_STR, "é".encode("utf-8")))
+
+    def test_serializer(self):
+        serializer = JSONSerializer()
+        tag, data = encode_value({"a": [1, 2]}, serializer)
+        self.assertEqual(tag, VALUE_SERIALIZED)
+        self.assertEqual(decode_value(tag, data, serializer), {"a": [1, 2]})
+
+        with self.assertRaises(UnsupportedTypeError):
+            encode_value({"a": [1, 2]})
+        with self.assertRaises(MissingSerializerError):
+            decode_value(tag, data)
+        with self.assertRaises(ValueError):
+            decode_value(7, data)
+
+
+if __name__ == "__main__":
+    unittest.main()
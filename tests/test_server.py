@@ -0,0 +1,254 @@
+import asyncio
+import glob
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.async_store import AsyncKVStore
+from src.client import KVClient
+from src.disk_store import KVStore
+from src.errors import ProtocolError, ResponseError
+from src.format import HEADER_SIZE
+from src.resp import (
+    INCOMPLETE,
+    RespError,
+    RespParser,
+    encode_command,
+    encode_reply,
+)
+from src.server import KVServer
+
+
+class RespTester(unittest.TestCase):
+    def test_round_trip(self):
+        replies = [
+            "OK",
+            "PONG",
+            RespError("ERR nope"),
+            42,
+            b"hello\r\nworld",
+            b"",
+            None,
+            [b"a", None, 1, [b"nested"]],
+        ]
+        data = b"".join(encode_reply(r) for r in replies)
+
+        # fed a byte at a time, as a slow socket would
+        parser = RespParser()
+        parsed = []
+        for i in range(len(data)):
+            parser.feed(data[i : i + 1])
+            parsed.extend(parser.parse_all())
+        self.assertEqual(parsed, replies)
+        self.assertIs(parser.parse(), INCOMPLETE)
+
+    def test_commands(self):
+        parser = RespParser()
+        parser.feed(encode_command("SET", "key", 1) + encode_command(b"GET", b"key"))
+        self.assertEqual(parser.parse_all(), [[b"SET", b"key", b"1"], [b"GET", b"key"]])
+
+    def test_invalid(self):
+        for data in (b"!what\r\n", b"$abc\r\n", b"$3\r\nabcde\r\n", b"*-5\r\n"):
+            parser = RespParser()
+            parser.feed(data)
+            with self.assertRaises(ProtocolError):
+                parser.parse()
+
+
+class KVServerTester(unittest.TestCase):
+    """
+    runs a server on an event loop of its own, on a background thread, and
+    talks to it with the blocking client
+    """
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.store = self.run_async(AsyncKVStore.open(self.path))
+        self.server = KVServer(self.store, port=0)
+        self.run_async(self.server.start())
+        self.client = KVClient(port=self.server.port, timeout=10)
+
+    def tearDown(self):
+        self.client.close()
+        self.run_async(self.server.close())
+        self.run_async(self.store.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        os.remove(self.path)
+        for sidecar in glob.glob(glob.escape(self.path) + ".*"):
+            os.remove(sidecar)
+
+    def run_async(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(10)
+
+    def test_commands(self):
+        kvc = self.client
+        self.assertTrue(kvc.ping())
+        self.assertIsNone(kvc.get("foo"))
+        kvc.set("foo", "bar")
+        self.assertEqual(kvc.get("foo"), b"bar")
+        self.assertTrue(kvc.exists("foo"))
+        self.assertTrue(kvc.delete("foo"))
+        self.assertFalse(kvc.delete("foo"))
+        self.assertIsNone(kvc.get("foo"))
+
+        kvc.set_many({"a": 1, "b": b"\x00\xff", 3: "c"})
+        self.assertEqual(
+            kvc.get_many(["a", "b", 3, "missing"]),
+            {"a": b"1", "b": b"\x00\xff", 3: b"c", "missing": None},
+        )
+        self.assertEqual(len(kvc), 3)
+        self.assertEqual(kvc.delete_many(["a", "b", "missing"]), 2)
+        self.assertEqual(len(kvc), 1)
+
+        kvc.set("short-lived", "value", expiry=100)
+        self.assertIn(kvc.ttl("short-lived"), (99, 100))
+        self.assertTrue(kvc.persist("short-lived"))
+        self.assertEqual(kvc.ttl("short-lived"), -1)
+        self.assertTrue(kvc.expire("short-lived", 50))
+        self.assertEqual(kvc.ttl("missing"), -2)
+
+        with self.assertRaises(ResponseError):
+            kvc._call((b"NOPE",))
+        with self.assertRaises(ResponseError):
+            kvc._call((b"SET", "key"))
+        with self.assertRaises(ResponseError):
+            kvc._call((b"SET", "key", "value", b"EX", b"soon"))
+
+        # the connection is still usable after errors
+        self.assertEqual(kvc.get(3), b"c")
+        self.assertEqual(kvc.pool._open, 1)
+
+        # values set by an embedded store are served as bytes
+        self.run_async(self.store.set("int", 7))
+        self.assertEqual(kvc.get("int"), b"7")
+
+    def test_pipeline(self):
+        with self.client.pipeline() as pipe:
+            pipe.set("foo", "bar")
+            pipe.get("foo")
+            pipe.delete("foo")
+            pipe.get("foo")
+            for i in range(500):
+                pipe.set(f"key-{i}", i)
+            pipe.get_many(["key-0", "key-499"])
+            results = pipe.execute()
+        self.assertEqual(results[:4], [None, b"bar", True, None])
+        self.assertEqual(results[-1], {"key-0": b"0", "key-499": b"499"})
+        self.assertEqual(len(results), 505)
+
+        # the pipelined sets shared write groups
+        self.assertLess(self.store.group_count, 500)
+
+        # an error reply is raised once every reply was read
+        pipe = self.client.pipeline()
+        pipe.set("a", 1)
+        pipe._queue((b"NOPE",))
+        pipe.get("a")
+        with self.assertRaises(ResponseError):
+            pipe.execute()
+        self.assertEqual(self.client.get("a"), b"1")
+
+        # pipelined sets of a key are applied in order, whatever their size
+        with self.client.pipeline() as pipe:
+            pipe.set("k", b"x" * 100_000)
+            pipe.set("k", "small")
+            pipe.get("k")
+            self.assertEqual(pipe.execute()[-1], b"small")
+
+    def test_corrupt_value(self):
+        kvc = self.client
+        kvc.set_many({"good": "value", "bad": "value"})
+        pos = self.store.store.key_dir["bad"].pos
+        with open(self.path, "r+b") as f:
+            f.seek(pos + HEADER_SIZE + len("bad"))
+            f.write(b"V")
+
+        # an error reply, not a value
+        with self.assertRaisesRegex(ResponseError, "corrupted"):
+            kvc.get("bad")
+        with self.assertRaisesRegex(ResponseError, "corrupted"):
+            kvc.get_many(["good", "bad"])
+        self.assertEqual(kvc.get("good"), b"value")
+
+    def test_pipeline_many_nothing(self):
+        kvc = self.client
+        kvc.set("a", 1)
+        with kvc.pipeline() as pipe:
+            pipe.delete_many([])
+            pipe.get_many([])
+            pipe.set_many({})
+            pipe.delete_many(["a", "b"])
+            pipe.delete_many([])
+            self.assertEqual(pipe.execute(), [0, {}, None, 1, 0])
+        self.assertEqual(kvc.delete_many([]), 0)
+        self.assertEqual(kvc.get_many([]), {})
+        self.assertIsNone(kvc.set_many({}))
+        self.assertEqual(kvc.pipeline().delete_many([]).execute(), [0])
+        self.assertEqual(kvc.pipeline().get_many([]).set_many([]).execute(), [{}, None])
+
+    def test_concurrent_clients(self):
+        kvc = KVClient(port=self.server.port, max_connections=4, timeout=10)
+
+        def writer(t: int) -> None:
+            for i in range(50):
+                kvc.set(f"key-{t}-{i}", i)
+
+        threads = [threading.Thread(target=writer, args=(t,)) for t in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # at most max_connections, reused between calls
+        self.assertLessEqual(kvc.pool._open, 4)
+        self.assertEqual(len(kvc), 400)
+        self.assertEqual(kvc.get("key-7-49"), b"49")
+        kvc.close()
+
+        # everything was persisted
+        self.run_async(self.store.sync())
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("key-3-10"), b"10")
+        ds.close()
+
+    def test_raw_socket(self):
+        # a client may split and pipeline commands as it likes
+        with socket.create_connection(("127.0.0.1", self.server.port)) as sock:
+            data = encode_command("SET", "x", "1") + encode_command("GET", "x")
+            sock.sendall(data[:5])
+            time.sleep(0.05)
+            sock.sendall(data[5:] + b"*1\r\n$4\r\nQUIT\r\n")
+            received = b""
+            while chunk := sock.recv(1024):
+                received += chunk
+        self.assertEqual(received, b"+OK\r\n$1\r\n1\r\n+OK\r\n")
+
+        with socket.create_connection(("127.0.0.1", self.server.port)) as sock:
+            sock.sendall(b"!garbage\r\n")
+            self.assertTrue(sock.recv(1024).startswith(b"-ERR Protocol error"))
+
+    def test_unix_socket(self):
+        unix_path = self.path + ".sock"
+        server = KVServer(self.store, unix_path=unix_path)
+        self.run_async(server.start())
+        with KVClient(unix_path=unix_path) as kvc:
+            kvc.set("foo", "bar")
+            self.assertEqual(kvc.get("foo"), b"bar")
+        self.run_async(server.close())
+        self.assertFalse(os.path.exists(unix_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+from src.errors import ShardCountError, UnsupportedTypeError
+from src.sharded import ShardedKVStore, shard_of
+
+
+class ShardedKVStoreTester(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check_store(self, processes: bool):
+        ds = ShardedKVStore(self.dir, shards=3, processes=processes)
+        ds.set("foo", "bar")
+        self.assertEqual(ds.get("foo"), "bar")
+        ds.delete("foo")
+        self.assertEqual(ds.get("foo"), "Key Not Found")
+
+        items = {f"key-{i:03d}": i for i in range(200)}
+        ds.set_many(items)
+        ds.set(7, b"\x00seven")
+        self.assertEqual(len(ds), 201)
+        self.assertEqual(ds.keys(), ["7"] + sorted(items))
+        self.assertEqual(
+            ds.get_many(["key-001", 7, "missing"]),
+            {"key-001": 1, 7: b"\x00seven", "missing": "Key Not Found"},
+        )
+        self.assertEqual(ds.get_many(items), items)
+
+        ds.delete_many(f"key-{i:03d}" for i in range(0, 200, 2))
+        self.assertEqual(len(ds), 101)
+        self.assertFalse(ds.exists("key-000"))
+        self.assertTrue(ds.exists("key-001"))
+
+        ds.set("short-lived", "value", expiry=100)
+        self.assertIn(ds.ttl("short-lived"), (99, 100))
+        self.assertTrue(ds.persist("short-lived"))
+        self.assertEqual(ds.ttl("short-lived"), -1)
+
+        # errors raised by a shard reach the caller
+        with self.assertRaises(UnsupportedTypeError):
+            ds.set("list", [1, 2, 3])
+        with self.assertRaises(UnsupportedTypeError):
+            ds.get([1, 2])
+        ds.sync()
+        ds.compact()
+        ds.close()
+
+        # every shard is a data directory of its own
+        ds = ShardedKVStore(self.dir, processes=processes)
+        self.assertEqual(len(ds.shards), 3)
+        self.assertEqual(ds.get("key-001"), 1)
+        self.assertEqual(ds.get("key-002"), "Key Not Found")
+        ds.close()
+
+    def test_in_process(self):
+        self.check_store(processes=False)
+
+    def test_processes(self):
+        self.check_store(processes=True)
+
+    def test_partitioning(self):
+        ds = ShardedKVStore(self.dir, shards=4)
+        ds.set_many({f"key-{i}": i for i in range(1000)})
+        ds.close()
+
+        for shard_id in range(4):
+            shard = KVStore(os.path.join(self.dir, f"shard-{shard_id:03d}") + os.sep)
+            keys = list(shard.key_dir)
+            self.assertGreater(len(keys), 150)
+            self.assertTrue(all(shard_of(k, 4) == shard_id for k in keys))
+            shard.close()
+
+    def test_shard_count(self):
+        ShardedKVStore(self.dir, shards=2).close()
+        with self.assertRaises(ShardCountError):
+            ShardedKVStore(self.dir, shards=3)
+
+    def check_failed_open(self, processes: bool):
+        # shard-001 can not be opened, it is a file
+        for i in range(4):
+            os.makedirs(os.path.join(self.dir, f"shard-{i:03d}"))
+        os.rmdir(os.path.join(self.dir, "shard-001"))
+        open(os.path.join(self.dir, "shard-001"), "w").close()
+
+        before = set(threading.enumerate())
+        with self.assertRaises(OSError):
+            # every open shard runs a syncer thread
+            ShardedKVStore(
+                self.dir, shards=4, processes=processes, sync_mode="interval"
+            )
+        # the shard opened before it is closed, nothing is left running
+        self.assertEqual(multiprocessing.active_children(), [])
+        deadline = time.time() + 5
+        while set(threading.enumerate()) - before and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(set(threading.enumerate()) - before, set())
+
+        # and can be opened again
+        ds = KVStore(os.path.join(self.dir, "shard-000") + os.sep)
+        ds.close()
+
+    def test_failed_open_in_process(self):
+        self.check_failed_open(processes=False)
+
+    def test_failed_open_processes(self):
+        self.check_failed_open(processes=True)
+
+    def test_failed_start(self):
+        started = []
+        real_start = multiprocessing.context.SpawnProcess.start
+
+        def start(process):
+            if len(started) == 2:
+                raise OSError("can not start a worker")
+            started.append(process)
+            real_start(process)
+
+        with unittest.mock.patch.object(
+            multiprocessing.context.SpawnProcess, "start", start
+        ):
+            with self.assertRaises(OSError):
+                ShardedKVStore(self.dir, shards=4, processes=True)
+        # the workers started are stopped, their shards closed
+        self.assertEqual(multiprocessing.active_children(), [])
+        self.assertEqual([p.exitcode for p in started], [0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+import glob
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+from src.errors import CorruptValueError, UnsupportedTypeError
+from src.format import HEADER_SIZE
+from src.recovery import TORN_RECORD
+from src.stream import iter_chunks
+from tests.test_recovery import CrashingFile, SimulatedCrash, abandon
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        for name in glob.glob(glob.escape(self.path) + "*"):
+            os.remove(name)
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(b"abc")), [b"abc"])
+        self.assertEqual(list(iter_chunks([b"ab", bytearray(b"c")])), [b"ab", b"c"])
+        chunks = [bytes(c) for c in iter_chunks(io.BytesIO(b"abcdefg"), 3)]
+        self.assertEqual(chunks, [b"abc", b"def", b"g"])
+        with self.assertRaises(UnsupportedTypeError):
+            list(iter_chunks(["abc"]))
+
+    def test_round_trip(self):
+        value = os.urandom(100_000)
+        ds = KVStore(self.path)
+        self.assertEqual(ds.set_stream("iterable", [value[:10], value[10:]]), 100_000)
+        ds.set_stream("file", io.BytesIO(value), chunk_size=4096)
+        ds.set_stream("bytes", value)
+        ds.set_stream("empty", [])
+        ds.set("after", "set")
+
+        for key in ("iterable", "file", "bytes"):
+            self.assertEqual(ds.get(key), value)
+            with ds.open_value(key) as reader:
+                self.assertEqual(reader.size, len(value))
+                self.assertEqual(reader.read(), value)
+        self.assertEqual(ds.get("empty"), b"")
+        self.assertEqual(ds.open_value("empty").read(), b"")
+        self.assertEqual(ds.get("after"), "set")
+        self.assertIsNone(ds.open_value("missing"))
+        ds.close()
+
+        # the headers were written again in place, recovery takes them
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("file"), value)
+        self.assertEqual(ds.discarded, [])
+        ds.close()
+
+    def test_open_value_of_set(self):
+        ds = KVStore(self.path, compression="zlib")
+        ds.set("str", "välue")
+        ds.set("compressed", b"x" * 10_000)
+        self.assertEqual(ds.open_value("str").read(), "välue".encode("utf-8"))
+        self.assertEqual(ds.open_value("compressed").read(), b"x" * 10_000)
+        ds.delete("str")
+        self.assertIsNone(ds.open_value("str"))
+        ds.close()
+
+    def test_seek(self):
+        value = bytes(range(256)) * 100
+        ds = KVStore(self.path)
+        ds.set_stream("foo", value)
+        reader = ds.open_value("foo")
+        reader.seek(1000)
+        self.assertEqual(reader.read(10), value[1000:1010])
+        self.assertEqual(reader.tell(), 1010)
+        reader.seek(-5, io.SEEK_END)
+        self.assertEqual(reader.read(), value[-5:])
+        self.assertEqual(reader.read(), b"")
+        reader.seek(0)
+        buffered = io.BufferedReader(reader, 4096)
+        self.assertEqual(buffered.read(300), value[:300])
+        ds.close()
+
+    def test_copy_to(self):
+        value = os.urandom(300_000)
+        ds = KVStore(self.path, verify="never")
+        ds.set_stream("foo", value)
+        with tempfile.TemporaryFile() as out:
+            reader = ds.open_value("foo")
+            reader.seek(7)
+            self.assertEqual(reader.copy_to(out, chunk_size=65536), len(value) - 7)
+            out.seek(0)
+            self.assertEqual(out.read(), value[7:])
+
+        received = []
+        a, b = socket.socketpair()
+        with a, b:
+            drain = threading.Thread(
+                target=lambda: received.extend(iter(lambda: b.recv(65536), b""))
+            )
+            drain.start()
+            ds.open_value("foo").copy_to(a)
+            a.shutdown(socket.SHUT_WR)
+            drain.join()
+        self.assertEqual(b"".join(received), value)
+
+        out = io.BytesIO()
+        ds.open_value("foo").copy_to(out)
+        self.assertEqual(out.getvalue(), value)
+        ds.close()
+
+    def test_corrupt_value(self):
+        ds = KVStore(self.path)
+        ds.set_stream("foo", b"a" * 10_000)
+        pos = ds.key_dir["foo"].pos
+        with open(self.path, "r+b") as f:
+            f.seek(pos + HEADER_SIZE + len("foo") + 5000)
+            f.write(b"b")
+
+        with self.assertRaises(CorruptValueError) as cm:
+            ds.open_value("foo").read()
+        self.assertEqual(cm.exception.key, "foo")
+        with self.assertRaises(CorruptValueError):
+            ds.open_value("foo").copy_to(io.BytesIO())
+        # a seek breaks the order of the reads, the CRC is not checked
+        reader = ds.open_value("foo")
+        reader.seek(1)
+        self.assertEqual(len(reader.read()), 9_999)
+        ds.close()
+
+        ds = KVStore(self.path, verify="never")
+        self.assertEqual(ds.open_value("foo").read().count(b"b"), 1)
+        ds.close()
+
+    def test_failed_stream(self):
+        def chunks():
+            yield b"x" * 1000
+            raise RuntimeError("source went away")
+
+        ds = KVStore(self.path)
+        ds.set("foo", "bar")
+        size = ds.write_pos
+        with self.assertRaises(RuntimeError):
+            ds.set_stream("big", chunks())
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertEqual(ds.get("big"), "Key Not Found")
+        ds.set("baz", "qux")
+        self.assertEqual(ds.get_many(["foo", "baz"]), {"foo": "bar", "baz": "qux"})
+        ds.close()
+
+    def test_crash_mid_stream(self):
+        ds = KVStore(self.path)
+        ds.set("foo", "bar")
+        size = ds.write_pos
+        ds.file = CrashingFile(ds.file, 5000)
+        with self.assertRaises(SimulatedCrash):
+            ds.set_stream("big", [b"x" * 1000] * 10)
+        abandon(ds)
+
+        ds = KVStore(self.path)
+        self.assertEqual(ds.get("foo"), "bar")
+        self.assertEqual(ds.get("big"), "Key Not Found")
+        self.assertEqual(
+            [(d.offset, d.size, d.reason) for d in ds.discarded],
+            [(size, 5000, TORN_RECORD)],
+        )
+        ds.close()
+
+    def test_expiry(self):
+        ds = KVStore(self.path)
+        ds.set_stream("foo", b"bar", expiry=1)
+        self.assertEqual(ds.open_value("foo").read(), b"bar")
+        with unittest.mock.patch("time.time", return_value=time.time() + 2):
+            self.assertIsNone(ds.open_value("foo"))
+        self.assertNotIn("foo", ds.key_dir)
+        ds.close()
+
+
+class TestStreamDataDirectory(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_rotation(self):
+        ds = KVStore(self.dir, max_file_size=4096)
+        ds.set_stream("first", b"a" * 3000)
+        # the size of a stream is not known ahead, it may run past
+        # max_file_size. the next write rotates
+        ds.set_stream("second", b"b" * 10_000)
+        self.assertEqual(len(ds._list_file_ids()), 1)
+        ds.set("small", "value")
+        ds.set_stream("third", b"c" * 100)
+        self.assertEqual(len(ds._list_file_ids()), 2)
+        ds.close()
+
+        for use_mmap in (False, True):
+            ds = KVStore(self.dir, use_mmap=use_mmap)
+            self.assertEqual(ds.open_value("first").read(), b"a" * 3000)
+            self.assertEqual(ds.open_value("second").read(), b"b" * 10_000)
+            self.assertEqual(ds.open_value("third").read(), b"c" * 100)
+            self.assertEqual(ds.get("small"), "value")
+            ds.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import glob
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.disk_store import KVStore
+from src.format import HEADER_SIZE
+from src.verify import CorruptRecord, corrupt_in, read_check_interval
+
+
+class TestVerify(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        for sidecar in glob.glob(glob.escape(self.path) + ".*"):
+            os.remove(sidecar)
+
+    def corrupt(self, ds: KVStore, key: str) -> int:
+        """
+        flips a bit in the value of key on disk, returns the record offset
+        """
+        pos = ds.key_dir[key].pos
+        with open(self.path, "r+b") as f:
+            f.seek(pos + HEADER_SIZE + len(key))
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0x20]))
+        return pos
+
+    def test_read_check_interval(self):
+        self.assertEqual(read_check_interval("always", 100), 1)
+        self.assertEqual(read_check_interval("sampled", 100), 100)
+        self.assertEqual(read_check_interval("scrub", 100), 0)
+        self.assertEqual(read_check_interval("never", 100), 0)
+        with self.assertRaises(ValueError):
+            read_check_interval("sometimes", 100)
+        with self.assertRaises(ValueError):
+            read_check_interval("sampled", 0)
+        with self.assertRaises(ValueError):
+            KVStore(self.path, verify="sometimes")
+
+    def test_read_modes(self):
+        ds = KVStore(self.path)
+        ds.set("foo", "value")
+        self.corrupt(ds, "foo")
+        ds.close()
+
+        ds = KVStore(self.path, verify="always")
+        self.assertEqual(ds.get("foo"), "Invalid/corrupted")
+        self.assertEqual(ds.get_many(["foo"]), {"foo": "Invalid/corrupted"})
+        ds.close()
+
+        # reads trust the bytes, they come back as stored
+        for mode in ("scrub", "never"):
+            ds = KVStore(self.path, verify=mode)
+            self.assertEqual(ds.get("foo"), "Value")
+            ds.close()
+
+        ds = KVStore(self.path, verify="sampled", verify_sample=3)
+        values = [ds.get("foo") for _ in range(9)]
+        self.assertEqual(values.count("Invalid/corrupted"), 3)
+        ds.close()
+
+    def test_scrub(self):
+        ds = KVStore(self.path, verify="scrub", scrub_rate=None)
+        for i in range(20):
+            ds.set(f"key-{i:02d}", f"value-{i}")
+        pos = self.corrupt(ds, "key-07")
+
+        found = ds.scrub()
+        self.assertEqual(found, [CorruptRecord(self.path, pos, b"key-07")])
+        self.assertEqual(ds.corrupt, found)
+        self.assertEqual(ds.scrubber.records_verified, 20)
+        self.assertEqual(ds.scrubber.bytes_verified, ds.write_pos)
+        ds.close()
+
+    def test_scrub_rate(self):
+        ds = KVStore(self.path, sync_mode="none", scrub_rate=100_000)
+        ds.set_many({f"key-{i}": "x" * 100 for i in range(200)})
+        size = ds.write_pos
+
+        start = time.perf_counter()
+        self.assertEqual(ds.scrub(), [])
+        self.assertGreaterEqual(time.perf_counter() - start, size / 100_000 - 0.02)
+        ds.close()
+
+    def test_background_scrubber(self):
+        ds = KVStore(self.path)
+        ds.set("foo", "bar")
+        pos = self.corrupt(ds, "foo")
+        ds.close()
+
+        ds = KVStore(self.path, scrub_interval=0.05, scrub_rate=None)
+        deadline = time.time() + 5
+        while ds.scrubber.passes < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreaterEqual(ds.scrubber.passes, 2)
+        self.assertIn(CorruptRecord(self.path, pos, b"foo"), ds.corrupt)
+        ds.close()
+
+    def test_compaction_reports_corrupt(self):
+        ds = KVStore(self.path)
+        for i in range(10):
+            ds.set(f"key-{i}", f"value-{i}")
+            ds.set(f"key-{i}", f"updated-{i}")
+        pos = self.corrupt(ds, "key-3")
+
+        ds.compact()
+        self.assertEqual(ds.corrupt, [CorruptRecord(self.path, pos, b"key-3")])
+        # copied as it was, reads still catch it
+        self.assertEqual(ds.get("key-3"), "Invalid/corrupted")
+        self.assertEqual(ds.get("key-4"), "updated-4")
+        ds.close()
+
+        ds = KVStore(self.path, verify="never")
+        ds.set("foo", "bar")
+        ds.set("foo", "baz")
+        ds.compact()
+        self.assertEqual(ds.corrupt, [])
+        ds.close()
+
+    def test_corrupt_in(self):
+        ds = KVStore(self.path)
+        ds.set_many({"a": 1, "b": 2, "c": 3})
+        pos = self.corrupt(ds, "b")
+        ds.close()
+        with open(self.path, "rb") as f:
+            self.assertEqual(corrupt_in(f.read(), 100), [100 + pos])
+
+
+if __name__ == "__main__":
+    unittest.main()